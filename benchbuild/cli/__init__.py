@@ -1,5 +1,5 @@
 """The CLI package."""
 __all__ = [
-    "main", "bootstrap", "config", "log", "project", "experiment", "run",
-    "slurm"
+    "main", "bootstrap", "config", "db", "log", "perf", "project", "experiment",
+    "run", "slurm"
 ]
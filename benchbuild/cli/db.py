@@ -0,0 +1,61 @@
+"""Subcommand to maintain the database."""
+import os
+import sys
+
+from plumbum import cli
+
+from benchbuild.settings import CFG
+
+
+class BBDb(cli.Application):
+    """Maintain the benchbuild database."""
+
+    def main(self, *args: str) -> int:
+        del args
+
+        if not self.nested_command:
+            self.help()
+        return 0
+
+
+@BBDb.subcommand("sync")
+class BBDbSync(cli.Application):
+    """Merge spools of offline runs into the database."""
+
+    keep = cli.Flag(["-k", "--keep"],
+                    help="Keep the spools after merging them",
+                    default=False)
+    chunk_size = cli.SwitchAttr(["--chunk-size"],
+                                int,
+                                default=1000,
+                                help="Number of rows we write at once")
+
+    def main(self, *spools: str) -> int:
+        # pylint: disable=import-outside-toplevel
+        import sqlalchemy as sa
+
+        from benchbuild.utils import spool
+
+        if not spools:
+            spools = (spool.default_path(),)
+
+        engine = sa.create_engine(str(CFG["db"]["connect_string"]))
+        failed = False
+        try:
+            for path in spools:
+                try:
+                    counts = spool.sync(path, engine, self.chunk_size)
+                except (OSError, sa.exc.SQLAlchemyError) as ex:
+                    print(f"Could not sync {path}: {ex}", file=sys.stderr)
+                    failed = True
+                    continue
+
+                print(f"Synced {path}:")
+                for table, count in counts.items():
+                    if count:
+                        print(f"  {table}: {count} rows")
+                if not self.keep:
+                    os.replace(path, f"{path}.synced")
+        finally:
+            engine.dispose()
+        return 1 if failed else 0
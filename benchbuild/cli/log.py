@@ -4,6 +4,7 @@
 from plumbum import cli
 
 from benchbuild.cli.main import BenchBuild
+from benchbuild.utils.db import fetch_blob
 
 
 def print_runs(query):
@@ -23,6 +24,12 @@ def print_logs(query, types=None):
     if query is None:
         return
 
+    def output(run, log, name):
+        value = getattr(log, name)
+        if value is None:
+            value = fetch_blob(query.session, run.id, name)
+        return value
+
     for run, log in query:
         print(("{0} @ {1} - {2} id: {3} group: {4} status: {5}".format(
             run.end, run.experiment_name, run.project_name,
@@ -30,10 +37,10 @@ def print_logs(query, types=None):
         print(("command: {0}".format(run.command)))
         if "stderr" in types:
             print("StdErr:")
-            print((log.stderr))
+            print((output(run, log, "stderr")))
         if "stdout" in types:
             print("StdOut:")
-            print((log.stdout))
+            print((output(run, log, "stdout")))
         print()
 
 
@@ -0,0 +1,119 @@
+"""Subcommand to render perf profiles stored in the database."""
+import sys
+import typing as tp
+import uuid
+
+from plumbum import cli
+
+from benchbuild.utils import db, perf
+
+
+def run_ids(session, selector: str) -> tp.List[int]:
+    """
+    Find the runs a selector refers to.
+
+    Args:
+        session: The db transaction we belong to.
+        selector: A run id or the UUID of a run group, e.g., all runs
+            of a project revision.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils.schema import Run
+
+    if selector.isdigit():
+        return [int(selector)]
+    group = uuid.UUID(selector)
+    return [run_id for (run_id,) in session.query(Run.id).filter(
+        Run.run_group == group
+    )]
+
+
+def fetch(session, selector: str, event: tp.Optional[str]) -> perf.FoldedStacks:
+    """Fetch the folded stacks of all runs a selector refers to."""
+    stacks = db.fetch_folded_stacks(session, run_ids(session, selector), event)
+    if not stacks:
+        print(f"No perf profile found for {selector}.", file=sys.stderr)
+    return stacks
+
+
+class BBPerf(cli.Application):
+    """Render perf profiles recorded with RunWithPerf."""
+
+    def main(self, *args: str) -> int:
+        del args
+
+        if not self.nested_command:
+            self.help()
+        return 0
+
+
+class BBPerfRender(cli.Application):
+
+    event = cli.SwitchAttr(["-e", "--event"],
+                           str,
+                           default=None,
+                           help="Only use profiles of this perf event")
+    output = cli.SwitchAttr(["-o", "--output"],
+                            str,
+                            default=None,
+                            help="Write to this file instead of stdout")
+    folded = cli.Flag(["--folded"],
+                      help="Print folded stacks instead of an SVG",
+                      default=False)
+
+    def write(self, text: str) -> None:
+        if self.output is None:
+            sys.stdout.write(text)
+            return
+        with open(self.output, 'w') as out:
+            out.write(text)
+
+
+@BBPerf.subcommand("flamegraph")
+class BBPerfFlamegraph(BBPerfRender):
+    """Render a flamegraph of a run or of all runs of a run group."""
+
+    def main(self, selector: str) -> int:
+        # pylint: disable=import-outside-toplevel
+        from benchbuild.utils.schema import Session
+
+        stacks = fetch(Session(), selector, self.event)
+        if not stacks:
+            return 1
+        if self.folded:
+            self.write(perf.format_folded(stacks))
+        else:
+            self.write(perf.render(stacks, title=f"Flame Graph {selector}"))
+        return 0
+
+
+@BBPerf.subcommand("diff")
+class BBPerfDiff(BBPerfRender):
+    """Render a differential flamegraph: red grew, blue shrank in AFTER."""
+
+    def main(self, before: str, after: str) -> int:
+        # pylint: disable=import-outside-toplevel
+        from benchbuild.utils.schema import Session
+
+        session = Session()
+        stacks_before = fetch(session, before, self.event)
+        stacks_after = fetch(session, after, self.event)
+        if not (stacks_before and stacks_after):
+            return 1
+        if self.folded:
+            self.write(
+                "".join(
+                    f"{stack} {stacks_before.get(stack, 0)} "
+                    f"{stacks_after.get(stack, 0)}\n"
+                    for stack in sorted(set(stacks_before) | set(stacks_after))
+                )
+            )
+        else:
+            self.write(
+                perf.render_diff(
+                    stacks_before,
+                    stacks_after,
+                    title=f"Differential Flame Graph {before} -> {after}"
+                )
+            )
+        return 0
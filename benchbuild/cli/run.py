@@ -14,6 +14,7 @@ from plumbum import cli
 
 from benchbuild import engine, experiment, plugins, project
 from benchbuild.settings import CFG
+from benchbuild.utils import journal
 
 LOG = logging.getLogger(__name__)
 
@@ -51,6 +52,18 @@ class BenchBuildRun(cli.Application):
 
     pretend = cli.Flag(['p', 'pretend'], default=False)
 
+    resume = cli.Flag(["--resume"],
+                      help="Skip project chains that finished in the last, "
+                      "interrupted run",
+                      default=False)
+
+    @cli.switch(["--interleave"],
+                int,
+                help="Run the workloads of all variants of a project in "
+                "turns, this many rounds")
+    def set_interleave(self, rounds):
+        CFG["interleave"]["rounds"] = rounds
+
     def main(self, *projects: str) -> int:
         """Main entry point of benchbuild run."""
         experiment_names = self.experiment_names
@@ -88,8 +101,16 @@ class BenchBuildRun(cli.Application):
             print("Could not find any experiment. Exiting.")
             return -2
 
+        if not self.pretend:
+            journal.start(resume=self.resume)
+
+        interleave = int(CFG["interleave"]["rounds"]) > 0
         ngn = engine.Experimentator(
-            experiments=list(exps.values()), projects=list(prjs.values())
+            experiments=list(exps.values()),
+            projects=list(prjs.values()),
+            resume=self.resume,
+            lazy=not (self.pretend or interleave),
+            interleave=interleave
         )
         num_actions = ngn.num_actions
         ngn.print_plan()
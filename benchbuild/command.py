@@ -12,7 +12,7 @@ from plumbum.commands.base import BoundEnvCommand
 from benchbuild.settings import CFG
 from benchbuild.source.base import primary
 from benchbuild.utils.revision_ranges import RevisionRange
-from benchbuild.utils.run import watch
+from benchbuild.utils.run import watch, watch_async
 from benchbuild.utils.wrapping import wrap
 
 if tp.TYPE_CHECKING:
@@ -580,6 +580,11 @@ class Command:
         cmd_w_output = self.as_plumbum(**kwargs)
         return watch(cmd_w_output)(*args)
 
+    async def run_async(self, *args: tp.Any, **kwargs: tp.Any) -> tp.Any:
+        """Run the command on the running asyncio event loop."""
+        cmd_w_output = self.as_plumbum(**kwargs)
+        return await watch_async(cmd_w_output)(*args)
+
     def rendered_args(self, **kwargs: tp.Any) -> tp.Tuple[str, ...]:
         args: tp.List[str] = []
 
@@ -675,6 +680,7 @@ class ProjectCommand:
     ) -> None:
         self.project = project
         self.command = command
+        self._prepared = False
 
     @property
     def path(self) -> Path:
@@ -690,6 +696,52 @@ class ProjectCommand:
             wrap(str(cmd_path), self.project)
             return self.command.__call__(*args, project=self.project)
 
+    def prepare(self) -> None:
+        """
+        Drop the configuration and wrap the binary, without running it.
+
+        Wrapping rewrites the binary's wrapper in place. When we run many
+        project commands concurrently, we prepare all of them before the
+        first one starts.
+        """
+        if self._prepared:
+            return
+
+        build_dir = self.project.builddir
+        CFG.store(Path(build_dir) / ".benchbuild.yml")
+        with local.cwd(build_dir):
+            wrap(str(self.path), self.project)
+        self._prepared = True
+
+    async def run_async(self, *args: tp.Any) -> tp.Any:
+        """
+        Run the project command on the running asyncio event loop.
+
+        Unlike `__call__`, this does not change `local.cwd`, which is shared
+        by all coroutines. The build directory is attached to the command.
+        """
+        self.prepare()
+        with local.cwd(self.project.builddir):
+            cmd = self.command.as_plumbum(project=self.project)
+        cmd = cmd.with_cwd(self.project.builddir)
+        return await watch_async(cmd)(*args)
+
+    @property
+    def creates(self) -> tp.List[Path]:
+        """All paths this command declares to create, rendered."""
+        return [
+            token.render(project=self.project)
+            for token in self.command.creates
+        ]
+
+    @property
+    def consumes(self) -> tp.List[Path]:
+        """All paths this command declares to consume, rendered."""
+        return [
+            token.render(project=self.project)
+            for token in self.command.consumes
+        ]
+
     def __repr__(self) -> str:
         return f"ProjectCommand({self.project.name}, {self.path})"
 
@@ -701,6 +753,39 @@ def _is_relative_to(p: Path, other: Path) -> bool:
     return p.is_relative_to(other)
 
 
+def _overlaps(first: Path, second: Path) -> bool:
+    return _is_relative_to(first, second) or _is_relative_to(second, first)
+
+
+def conflicts(first: tp.Any, second: tp.Any) -> bool:
+    """
+    Check, if two workloads may not run at the same time.
+
+    Two workloads conflict, if one of them creates a path that the other
+    one creates or consumes. Paths conflict with everything inside them.
+    Workloads that do not declare `creates` and `consumes`, e.g., plain
+    callables, never conflict.
+
+    Args:
+        first: A workload, usually a `ProjectCommand`.
+        second: Another workload.
+    """
+    first_creates = getattr(first, "creates", [])
+    second_creates = getattr(second, "creates", [])
+    first_touches = [*first_creates, *getattr(first, "consumes", [])]
+    second_touches = [*second_creates, *getattr(second, "consumes", [])]
+
+    return any(
+        _overlaps(created, touched)
+        for created in first_creates
+        for touched in second_touches
+    ) or any(
+        _overlaps(created, touched)
+        for created in second_creates
+        for touched in first_touches
+    )
+
+
 def _default_prune(project_command: ProjectCommand) -> None:
     command = project_command.command
     project = project_command.project
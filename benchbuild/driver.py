@@ -2,9 +2,11 @@
 
 from benchbuild.cli.bootstrap import BenchBuildBootstrap
 from benchbuild.cli.config import BBConfig
+from benchbuild.cli.db import BBDb
 from benchbuild.cli.experiment import BBExperiment
 from benchbuild.cli.log import BenchBuildLog
 from benchbuild.cli.main import BenchBuild
+from benchbuild.cli.perf import BBPerf
 from benchbuild.cli.project import BBProject
 from benchbuild.cli.run import BenchBuildRun
 from benchbuild.cli.slurm import Slurm
@@ -17,8 +19,10 @@ def main(*args):
     BenchBuild.subcommand('bootstrap', BenchBuildBootstrap)
     BenchBuild.subcommand('config', BBConfig)
     BenchBuild.subcommand('container', cli.BenchBuildContainer)
+    BenchBuild.subcommand('db', BBDb)
     BenchBuild.subcommand('experiment', BBExperiment)
     BenchBuild.subcommand('log', BenchBuildLog)
+    BenchBuild.subcommand('perf', BBPerf)
     BenchBuild.subcommand('project', BBProject)
     BenchBuild.subcommand('run', BenchBuildRun)
     BenchBuild.subcommand('slurm', Slurm)
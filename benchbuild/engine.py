@@ -20,20 +20,43 @@ StepResults = tp.List[actions.StepResult]
 
 @attr.s
 class Experimentator:
+    """
+    Plan and execute experiments on a set of projects.
+
+    Attributes:
+        experiments: The experiments we execute.
+        projects: The projects we execute the experiments on.
+        resume: Skip everything the journal marks as finished.
+        lazy: Plan the actions of each experiment while we execute the
+            plan. The number of actions is only estimated then.
+        interleave: Run the workloads of all variants of a project in turns
+            (see `tasks.interleave_workloads`). Requires an eager plan.
+    """
     experiments: Experiments = attr.ib()
     projects: Projects = attr.ib()
+    resume: bool = attr.ib(default=False)
+    lazy: bool = attr.ib(default=False)
+    interleave: bool = attr.ib(default=False)
 
     _plan: tp.Sequence[actions.Step] = attr.ib(init=False, default=None)
 
     def plan(self) -> Actions:
         if not self._plan:
-            self._plan = tasks.generate_plan(self.experiments, self.projects)
+            self._plan = tasks.generate_plan(
+                self.experiments, self.projects, lazy=self.lazy
+            )
+            if self.resume:
+                self._plan = tasks.resume_plan(self._plan)
+            if self.interleave:
+                tasks.interleave_workloads(self._plan)
 
         return self._plan
 
     @property
     def num_actions(self) -> int:
         p = self.plan()
+        if self.lazy:
+            return tasks.estimate_num_actions(p)
         return sum([len(child) for child in p])
 
     def start(self) -> StepResults:
@@ -43,5 +66,12 @@ class Experimentator:
 
     def print_plan(self) -> None:
         p = self.plan()
-        print("Number of actions to execute: {}".format(self.num_actions))
+        if self.lazy:
+            print(
+                "Estimated number of actions to execute: {}".format(
+                    self.num_actions
+                )
+            )
+        else:
+            print("Number of actions to execute: {}".format(self.num_actions))
         print(*p)
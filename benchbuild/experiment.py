@@ -86,6 +86,10 @@ class Experiment(metaclass=ExperimentRegistry):
             A uuid encoded as :obj:`str` used to identify this
             instance of experiment. Equivalent to the `experiment_group`
             in the database scheme.
+        CONCURRENT_WORKLOADS (bool): Run the workloads of a project
+            concurrently (see `CFG["workloads"]["jobs"]`), unless they
+            declare conflicting `creates` and `consumes` paths. Only enable
+            this for experiments that do not measure timings.
     """
 
     NAME: tp.ClassVar[str] = ""
@@ -93,6 +97,7 @@ class Experiment(metaclass=ExperimentRegistry):
     REQUIREMENTS: tp.List[Requirement] = []
     CONTAINER: tp.ClassVar[declarative.ContainerImage
                           ] = declarative.ContainerImage()
+    CONCURRENT_WORKLOADS: tp.ClassVar[bool] = False
 
     def __new__(cls, *args, **kwargs):
         """Create a new experiment instance and set some defaults."""
@@ -166,33 +171,70 @@ class Experiment(metaclass=ExperimentRegistry):
         """
         Common setup required to run this experiment on all projects.
         """
-        actions: Actions = []
+        return list(self.iter_actions())
 
-        for prj_cls in self.projects:
-            prj_actions: Actions = []
+    def actions_for_revision(self, prj_cls: ProjectT,
+                             revision: source.Revision) -> actns.RequireAll:
+        """
+        Set up a single revision of a project for this experiment.
 
+        Args:
+            prj_cls: The project type we want to run.
+            revision: The revision of the project we want to run.
+        """
+        version_str = str(revision)
+
+        p = prj_cls(revision)
+        p.builddir = build_dir(self, p)
+        atomic_actions: Actions = [
+            actns.Clean(p),
+            actns.MakeBuildDir(p),
+            actns.Echo(
+                message="Selected {0} with version {1}".
+                format(p.name, version_str)
+            ),
+            actns.ProjectEnvironment(p),
+        ]
+        atomic_actions.extend(self.actions_for_project(p))
+        return actns.RequireAll(actions=atomic_actions)
+
+    def iter_actions(self) -> tp.Iterator[actns.Step]:
+        """
+        Generate the actions of `actions` one project revision at a time.
+
+        Projects are instantiated only when the consumer asks for their
+        actions, so a consumer that executes actions as they come keeps
+        only a few projects in memory at any time.
+        """
+        planned = False
+        for prj_cls in self.projects:
             for revision in self.sample(prj_cls):
-                version_str = str(revision)
-
-                p = prj_cls(revision)
-                p.builddir = build_dir(self, p)
-                atomic_actions: Actions = [
-                    actns.Clean(p),
-                    actns.MakeBuildDir(p),
-                    actns.Echo(
-                        message="Selected {0} with version {1}".
-                        format(p.name, version_str)
-                    ),
-                    actns.ProjectEnvironment(p),
-                ]
-                atomic_actions.extend(self.actions_for_project(p))
-
-                prj_actions.append(actns.RequireAll(actions=atomic_actions))
-            actions.extend(prj_actions)
-
-        if actions:
-            actions.append(actns.CleanExtra())
-        return actions
+                yield self.actions_for_revision(prj_cls, revision)
+                planned = True
+
+        if planned:
+            yield actns.CleanExtra()
+
+    def estimate_num_actions(self) -> int:
+        """
+        Estimate the number of actions without planning all of them.
+
+        We plan the first revision of every project and assume that all
+        other revisions need the same number of actions.
+
+        Returns:
+            The estimated value of `sum(len(a) for a in self.actions())`.
+        """
+        num_actions = 0
+        for prj_cls in self.projects:
+            revisions = self.sample(prj_cls)
+            if revisions:
+                first = self.actions_for_revision(prj_cls, revisions[0])
+                num_actions += len(first) * len(revisions)
+
+        if num_actions:
+            num_actions += len(actns.CleanExtra())
+        return num_actions
 
     @classmethod
     def sample(cls, prj_cls: ProjectT) -> tp.Sequence[source.Revision]:
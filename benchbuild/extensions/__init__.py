@@ -1,4 +1,4 @@
-from . import base, compiler, log, run, time
+from . import base, compiler, log, perf, resources, run, time
 
 Extension = base.Extension
 MissingExtension = base.MissingExtension
@@ -0,0 +1,109 @@
+"""Profile tracked binaries with perf."""
+import logging
+import os
+import subprocess
+import tempfile
+import typing as tp
+
+from benchbuild.extensions import base
+from benchbuild.settings import CFG
+from benchbuild.utils import db
+from benchbuild.utils import perf as folded
+from benchbuild.utils.cmd import perf
+
+LOG = logging.getLogger(__name__)
+
+
+class RunWithPerf(base.Extension):
+    """
+    Profile a command with perf and store the profile in the database.
+
+    There are two modes:
+        * record: `perf record -g` samples the call stacks. We store them
+          as folded stacks (see `benchbuild.utils.perf`) and attach them
+          as the 'perf' payload. Render them with `benchbuild perf`.
+        * stat: `perf stat` only counts events. We store every counter as
+          metric `perf.<event>`.
+
+    If the following extensions execute the binary several times, the
+    profile belongs to the last execution.
+
+    All settings default to `CFG["perf"]`.
+
+    Args:
+        *extensions: The extensions we profile.
+        mode: record or stat.
+        events: Comma-separated perf events, empty for perf's default.
+        frequency: The sampling frequency of perf record in Hz.
+    """
+
+    def __init__(
+        self,
+        *extensions,
+        mode: tp.Optional[str] = None,
+        events: tp.Optional[str] = None,
+        frequency: tp.Optional[int] = None,
+        **kwargs
+    ):
+        super().__init__(*extensions, **kwargs)
+
+        cfg = CFG["perf"]
+        self.mode = str(mode if mode is not None else cfg["mode"])
+        if self.mode not in ("record", "stat"):
+            raise ValueError(f"Unknown perf mode {self.mode}")
+        self.events = str(events if events is not None else cfg["events"])
+        self.frequency = int(
+            frequency if frequency is not None else cfg["frequency"]
+        )
+
+    def __call__(self, binary_command, *args, **kwargs):
+        with tempfile.TemporaryDirectory(prefix="benchbuild-perf-") as tmp:
+            output = os.path.join(tmp, f"perf.{self.mode}")
+            event_args = ["-e", self.events] if self.events else []
+            if self.mode == "record":
+                perf_cmd = perf["record", "-g", "-F",
+                                str(self.frequency), *event_args, "-o",
+                                output, "--", binary_command]
+            else:
+                perf_cmd = perf["stat", "-x,", *event_args, "-o", output,
+                                "--", binary_command]
+
+            res = self.call_next(perf_cmd, *args, **kwargs)
+            if not res:
+                return res
+            if not os.path.exists(output):
+                LOG.warning("perf did not write a profile.")
+                return res
+
+            if self.mode == "record":
+                self.__store_stacks(res[-1], output)
+            else:
+                self.__store_counters(res[-1], output)
+        return res
+
+    def __store_stacks(self, run_info, output: str) -> None:
+        with perf["script", "-i", output].popen(
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        ) as script:
+            stacks = folded.collapse(
+                line.decode(errors="replace") for line in script.stdout
+            )
+        run_info.add_payload("perf", stacks)
+        if CFG["db"]["enabled"]:
+            db.persist_folded_stacks(
+                run_info.db_run, run_info.session, stacks, self.events or
+                "default"
+            )
+
+    def __store_counters(self, run_info, output: str) -> None:
+        with open(output) as stat_file:
+            counters = folded.parse_stat(stat_file)
+        run_info.add_payload("perf", counters)
+        if CFG["db"]["enabled"]:
+            db.persist_metrics(
+                run_info.db_run, run_info.session,
+                {f"perf.{event}": value for event, value in counters.items()}
+            )
+
+    def __str__(self):
+        return f"Profile with perf {self.mode}"
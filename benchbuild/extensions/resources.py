@@ -0,0 +1,57 @@
+"""Sample the resource usage of tracked binaries while they run."""
+import logging
+import typing as tp
+from contextlib import contextmanager
+
+from benchbuild.extensions import base
+from benchbuild.settings import CFG
+from benchbuild.utils import db, run, sampler
+
+LOG = logging.getLogger(__name__)
+
+
+class SampleResources(base.Extension):
+    """
+    Record time series of RSS, CPU, threads and I/O of tracked binaries.
+
+    A background thread samples the process tree of every binary tracked
+    by one of the following extensions (see `benchbuild.utils.sampler`).
+    The series are stored with the run in the database and attached as the
+    'resources' payload to the run info.
+
+    Args:
+        *extensions: The extensions we watch.
+        interval: Seconds between two samples, defaults to
+            `CFG["sampler"]["interval"]`.
+    """
+
+    def __init__(
+        self, *extensions, interval: tp.Optional[float] = None, **kwargs
+    ):
+        super().__init__(*extensions, **kwargs)
+        self.interval = interval
+
+    @contextmanager
+    def sample(self, run_info: run.RunInfo, pid: int) -> tp.Iterator[None]:
+        """Sample a single binary, until we leave the context."""
+        resource_sampler = sampler.ResourceSampler(pid, self.interval)
+        resource_sampler.start()
+        try:
+            yield
+        finally:
+            series = resource_sampler.stop()
+            run_info.add_payload("resources", series)
+            if CFG["db"]["enabled"] and run_info.db_run is not None:
+                db.persist_timeseries(
+                    run_info.db_run, run_info.session, series
+                )
+            LOG.debug(
+                "Took %d samples of pid %d.", len(series["time"]), pid
+            )
+
+    def __call__(self, binary_command, *args, **kwargs):
+        with run.watch_processes(self.sample):
+            return self.call_next(binary_command, *args, **kwargs)
+
+    def __str__(self):
+        return "Sample resource usage"
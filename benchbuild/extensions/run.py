@@ -6,7 +6,7 @@ from plumbum import local
 
 from benchbuild.extensions import base
 from benchbuild.settings import CFG
-from benchbuild.utils import db, run
+from benchbuild.utils import db, jobserver, run
 from benchbuild.utils.settings import get_number_of_jobs
 
 LOG = logging.getLogger(__name__)
@@ -83,6 +83,8 @@ class SetThreadLimit(base.Extension):
 
     This extension uses the 'jobs' settings and controls the environment
     variable OMP_NUM_THREADS.
+    If a job server is active, the limit is lowered to the number of tokens
+    we could take from it. The tokens are held until the binary terminates.
     """
 
     def __call__(self, binary_command, *args, **kwargs):
@@ -94,8 +96,9 @@ class SetThreadLimit(base.Extension):
             jobs = get_number_of_jobs(CFG)
 
         ret = None
-        with local.env(OMP_NUM_THREADS=str(jobs)):
-            ret = self.call_next(binary_command, *args, **kwargs)
+        with jobserver.tokens(jobs) as granted:
+            with local.env(OMP_NUM_THREADS=str(granted)):
+                ret = self.call_next(binary_command, *args, **kwargs)
         return ret
 
     def __str__(self):
@@ -12,42 +12,190 @@ LOG = logging.getLogger(__name__)
 
 
 class RunWithTime(base.Extension):
-    """Wrap a command with time and store the timings in the database."""
+    """
+    Time a command and store the timings in the database.
+
+    There are two backends:
+        * rusage: benchbuild reaps the binary with `os.wait4` and stores
+          its complete resource usage (see `run.ResourceUsage`).
+        * time: The binary is wrapped with GNU time and we parse user,
+          system and wall-clock time from its stderr. Use this, if the
+          binary is not a direct child of benchbuild.
+
+    The binary can be executed several times. Warm-up executions are
+    discarded, they only prepare caches and clock frequencies. Every
+    measured execution stores its own timings. If there is more than one
+    measured execution, outliers of the real time are marked with
+    `time.outlier` and a robust summary of all other executions is stored
+    with the last one (see `benchbuild.statistics.robust_summary`).
+
+    All settings default to `CFG["time"]`.
+
+    Args:
+        *extensions: The extensions we time.
+        warmups: The number of discarded executions.
+        repeats: The number of measured executions.
+        outliers: How to detect outliers: mad, iqr or none.
+        backend: How to measure: rusage or time.
+    """
+
+    def __init__(
+        self,
+        *extensions,
+        warmups: tp.Optional[int] = None,
+        repeats: tp.Optional[int] = None,
+        outliers: tp.Optional[str] = None,
+        backend: tp.Optional[str] = None,
+        **kwargs
+    ):
+        super().__init__(*extensions, **kwargs)
+        cfg = CFG["time"]
+        self.warmups = int(warmups if warmups is not None else cfg["warmups"])
+        self.repeats = max(
+            int(repeats if repeats is not None else cfg["repeats"]), 1
+        )
+        self.outliers = str(
+            outliers if outliers is not None else cfg["outliers"]
+        )
+        self.backend = str(backend if backend is not None else cfg["backend"])
+        if self.backend not in ("rusage", "time"):
+            raise ValueError(f"Unknown timing backend {self.backend}")
 
     def __call__(self, binary_command, *args, may_wrap=True, **kwargs):
         time_tag = "BENCHBUILD: "
-        if may_wrap:
+        use_time = may_wrap and self.backend == "time"
+        run_cmd = binary_command
+        if use_time:
             run_cmd = time["-f", time_tag + "%U-%S-%e", binary_command]
 
-        def handle_timing(run_infos):
-            """Takes care of the formating for the timing statistics."""
-            if not CFG["db"]["enabled"]:
-                return run_infos
-
-            # pylint: disable=import-outside-toplevel
-            from benchbuild.utils import schema as s
-
-            session = s.Session()
-            for run_info in run_infos:
-                if may_wrap:
-                    timings = fetch_time_output(
-                        time_tag, time_tag + "{:g}-{:g}-{:g}",
-                        run_info.stderr.split("\n")
-                    )
-                    if timings:
-                        db.persist_time(run_info.db_run, session, timings)
-                    else:
-                        LOG.warning("No timing information found.")
-            session.commit()
-            return run_infos
-
-        res = self.call_next(run_cmd, *args, **kwargs)
-        return handle_timing(res)
+        for _ in range(self.warmups):
+            warmup_infos = self.call_next(run_cmd, *args, **kwargs)
+            mark_warmup(warmup_infos)
+
+        res = []
+        for _ in range(self.repeats):
+            res.extend(self.call_next(run_cmd, *args, **kwargs))
+
+        if self.backend == "rusage":
+            samples = [(run_info, [run_info.rusage.timing])
+                       for run_info in res
+                       if getattr(run_info, "rusage", None) is not None]
+            if len(samples) < len(res):
+                LOG.warning("No resource usage found.")
+            return handle_timing(res, samples, self.outliers, persist_rusage)
+
+        if not use_time:
+            return res
+
+        samples = []
+        for run_info in res:
+            timings = fetch_time_output(
+                time_tag, time_tag + "{:g}-{:g}-{:g}",
+                str(run_info.stderr).split("\n")
+            )
+            if timings:
+                samples.append((run_info, timings))
+            else:
+                LOG.warning("No timing information found.")
+        return handle_timing(res, samples, self.outliers, persist_time)
 
     def __str__(self):
         return "Time execution of wrapped binary"
 
 
+TIME_METRICS = ("time.user_s", "time.system_s", "time.real_s")
+Timings = tp.Sequence[tp.Sequence[float]]
+TimingSamples = tp.List[tp.Tuple[tp.Any, Timings]]
+PersistFn = tp.Callable[[tp.Any, tp.Any, Timings], None]
+
+
+def persist_time(run_info, session, timings: Timings) -> None:
+    """Store the timings parsed from GNU time."""
+    db.persist_time(run_info.db_run, session, timings)
+
+
+def persist_rusage(run_info, session, timings: Timings) -> None:
+    """Store the complete resource usage of the run."""
+    del timings
+    db.persist_rusage(run_info.db_run, session, run_info.rusage)
+
+
+def mark_warmup(run_infos) -> None:
+    """Mark the runs of warm-up executions, so we can tell them apart."""
+    for run_info in run_infos:
+        run_info.add_payload("warmup", True)
+
+    if not CFG["db"]["enabled"]:
+        return
+
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import schema as s
+
+    session = db.session()
+    for run_info in run_infos:
+        session.add(
+            s.Metric(name="time.warmup", value=1.0, run_id=run_info.db_run.id)
+        )
+    session.commit()
+
+
+def handle_timing(
+    run_infos,
+    samples: TimingSamples,
+    outlier_method: str,
+    persist: PersistFn = persist_time
+):
+    """
+    Store the timings of all measured executions.
+
+    Args:
+        run_infos: All run infos of the measured executions.
+        samples: The runs that produced timings, with their timings as
+            user, system and wall-clock time.
+        outlier_method: How to detect outliers: mad, iqr or none.
+        persist: Stores the measurements of a single run.
+    """
+    summary = None
+    rejected = [False] * len(samples)
+    if len(samples) > 1:
+        # pylint: disable=import-outside-toplevel
+        from benchbuild import statistics
+
+        real = [timings[-1][2] for _, timings in samples]
+        rejected = statistics.outliers(real, outlier_method)
+        kept = [
+            timings[-1]
+            for (_, timings), outlier in zip(samples, rejected)
+            if not outlier
+        ]
+        summary = {
+            name: statistics.robust_summary([timing[idx] for timing in kept])
+            for idx, name in enumerate(TIME_METRICS)
+        }
+        summary["time.outliers"] = sum(rejected)
+        samples[-1][0].add_payload("time", summary)
+
+    if not CFG["db"]["enabled"]:
+        return run_infos
+
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import schema as s
+
+    session = db.session()
+    for (run_info, timings), outlier in zip(samples, rejected):
+        persist(run_info, session, timings)
+        if outlier:
+            session.add(
+                s.Metric(
+                    name="time.outlier", value=1.0, run_id=run_info.db_run.id
+                )
+            )
+    if summary is not None:
+        db.persist_time_summary(samples[-1][0].db_run, session, summary)
+    session.commit()
+    return run_infos
+
+
 def fetch_time_output(marker: str, format_s: str,
                       ins: tp.List[str]) -> tp.List[parse.Match]:
     """
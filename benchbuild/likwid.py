@@ -2,7 +2,21 @@
 Likwid helper functions.
 
 Extract information from likwid's CSV output.
+
+`parse` streams over likwid's output and yields the values of every
+region and metric as NumPy arrays, one value per core. `measurements`
+collects them into typed columns and `db.persist_likwid` bulk-inserts
+them. Like `filters/likwid.csv`, we skip likwid's header rows and empty
+cores or values.
 """
+import typing as tp
+
+import attr
+
+if tp.TYPE_CHECKING:
+    import numpy as np  # pylint: disable=unused-import
+
+SKIPPED_ROWS = frozenset(("1", "Region Info", "Event", "Metric", "CPU clock"))
 
 
 def fetch_cols(fstream, split_char=','):
@@ -152,6 +166,154 @@ def get_measurements(region, core_info, data, extra_offset=0):
     return measurements
 
 
+@attr.s(frozen=True)
+class Block:
+    """
+    The values of a single metric in a single region.
+
+    Attributes:
+        region: The name of the region.
+        metric: The name of the metric, or event.
+        cores: The names of the cores, one per value.
+        values: The values as float64.
+    """
+    region: str = attr.ib()
+    metric: str = attr.ib()
+    cores: "np.ndarray" = attr.ib()
+    values: "np.ndarray" = attr.ib()
+
+
+@attr.s(frozen=True)
+class Measurements:
+    """
+    All measurements of a likwid run, as columns of equal length.
+
+    The label columns share their strings, they hold only references.
+
+    Attributes:
+        regions: The region of every measurement.
+        metrics: The metric of every measurement.
+        cores: The core of every measurement.
+        values: The value of every measurement as float64.
+    """
+    regions: "np.ndarray" = attr.ib()
+    metrics: "np.ndarray" = attr.ib()
+    cores: "np.ndarray" = attr.ib()
+    values: "np.ndarray" = attr.ib()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def names(self) -> tp.List[str]:
+        """Name every measurement like the metrics we store in the db."""
+        return [
+            f"likwid.{region}.{metric}.{core}" for region, metric, core in
+            zip(self.regions, self.metrics, self.cores)
+        ]
+
+
+def _to_matrix(rows: tp.List[tp.List[str]]) -> "np.ndarray":
+    """Convert a table to float64, everything that is no number is NaN."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    try:
+        return np.asarray(rows, dtype=np.float64)
+    except ValueError:
+        pass
+
+    def convert(value: str) -> float:
+        try:
+            return float(value)
+        except ValueError:
+            return np.nan
+
+    return np.asarray([[convert(value) for value in row] for row in rows],
+                      dtype=np.float64)
+
+
+def _blocks(region: str, cores: tp.List[str],
+            rows: tp.List[tp.List[str]]) -> tp.Iterator[Block]:
+    """Convert the rows of a table, i.e., a metric and its values, at once."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    rows = [row for row in rows if row[0] not in SKIPPED_ROWS]
+    if not rows or not cores:
+        return
+    width = len(cores)
+    core_names = np.asarray(cores, dtype=object)
+    matrix = _to_matrix([(row[1:] + [""] * width)[:width] for row in rows])
+    keep = (core_names != "")[np.newaxis, :] & ~np.isnan(matrix)
+
+    if keep.all():
+        for row, values in zip(rows, matrix):
+            yield Block(region, row[0], core_names, values)
+        return
+    for row, values, row_keep in zip(rows, matrix, keep):
+        if row_keep.any():
+            yield Block(region, row[0], core_names[row_keep], values[row_keep])
+
+
+def parse(lines: tp.Iterable[str]) -> tp.Iterator[Block]:
+    """
+    Stream over likwid's CSV output.
+
+    We hold at most a single STRUCT or TABLE in memory and convert all of
+    its values at once. The first STRUCT is likwid's info block, every
+    following STRUCT starts a region. The region's TABLEs follow it.
+
+    Args:
+        lines: The lines of likwid's output.
+
+    Yields:
+        The values of every metric of every region.
+    """
+    # likwid pads all rows with commas to the same width.
+    rows = (line.strip().rstrip(",").split(",") for line in lines)
+    region = ""
+    seen_info = False
+    for row in rows:
+        if row[0] == "STRUCT" and len(row) >= 3:
+            struct_rows = [next(rows, [""]) for _ in range(int(row[2]))]
+            if not seen_info:
+                seen_info = True
+                continue
+            struct = {cols[0]: cols[1:] for cols in struct_rows}
+            region = struct.get("1", ["", ""])[1]
+            yield from _blocks(region, struct.get("Region Info", []),
+                               struct_rows)
+        elif row[0] == "TABLE" and len(row) >= 4:
+            header = next(rows, [""])
+            # Raw tables name the counter of each event in a second column.
+            offset = 1 if header[0] == "Event" else 0
+            table_rows = [
+                cols[:1] + cols[1 + offset:]
+                for cols in (next(rows, [""]) for _ in range(int(row[3])))
+            ]
+            yield from _blocks(region, header[1 + offset:], table_rows)
+
+
+def measurements(blocks: tp.Iterable[Block]) -> Measurements:
+    """Collect all blocks into columns."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    blocks = list(blocks)
+    if not blocks:
+        empty = np.asarray([], dtype=object)
+        return Measurements(empty, empty, empty, np.asarray([], dtype=float))
+
+    sizes = [len(block.values) for block in blocks]
+    return Measurements(
+        regions=np.repeat(
+            np.asarray([b.region for b in blocks], dtype=object), sizes
+        ),
+        metrics=np.repeat(
+            np.asarray([b.metric for b in blocks], dtype=object), sizes
+        ),
+        cores=np.concatenate([block.cores for block in blocks]),
+        values=np.concatenate([block.values for block in blocks])
+    )
+
+
 def perfcounters(infile):
     """
     Get a complete list of all measurements.
@@ -160,26 +322,11 @@ def perfcounters(infile):
         infile: The filestream containing all likwid output.
 
     Returns:
-        A list of all measurements extracted from likwid's file stream.
+        A list of all measurements extracted from likwid's file stream,
+        as (region, metric, core, value) tuples with float values.
     """
-    measurements = []
     with open(infile, 'r') as in_file:
-        read_struct(in_file)
-        for region_struct in read_structs(in_file):
-            region = region_struct["1"][1]
-            core_info = region_struct["Region Info"]
-            measurements += \
-                get_measurements(region, core_info, region_struct)
-
-            for table_struct in read_tables(in_file):
-                core_info = None
-                if "Event" in table_struct:
-                    offset = 1
-                    core_info = table_struct["Event"][offset:]
-                    measurements += get_measurements(region, core_info,
-                                                     table_struct, offset)
-                elif "Metric" in table_struct:
-                    core_info = table_struct["Metric"]
-                    measurements += get_measurements(region, core_info,
-                                                     table_struct)
-    return measurements
+        return [(block.region, block.metric, core, value)
+                for block in parse(in_file)
+                for core, value in zip(block.cores.tolist(),
+                                       block.values.tolist())]
@@ -6,6 +6,7 @@ from plumbum import local
 import benchbuild as bb
 from benchbuild.settings import CFG
 from benchbuild.source import HTTP
+from benchbuild.utils import capture
 from benchbuild.utils.cmd import diff, tar
 
 LOG = logging.getLogger(__name__)
@@ -146,11 +147,12 @@ class PolyBenchGroup(bb.Project):
 
         def filter_stderr(stderr_raw, stderr_filtered):
             """Extract dump_arrays_output from stderr."""
-            with open(stderr_raw, 'r') as stderr:
-                with open(stderr_filtered, 'w') as stderr_filt:
-                    stderr_filt.writelines(
-                        get_dump_arrays_output(stderr.readlines())
+            with open(stderr_filtered, 'w') as stderr_filt:
+                stderr_filt.writelines(
+                    get_dump_arrays_output(
+                        list(capture.read_lines(stderr_raw))
                     )
+                )
 
         polybench_opts = CFG["projects"]["polybench"]
         verify = bool(polybench_opts["verify"])
@@ -144,6 +144,271 @@ CFG["env"] = {
     "desc": "The environment benchbuild's commands should operate in."
 }
 
+CFG["resources"] = {
+    "cores": {
+        "desc":
+            "Number of cores parallel projects may occupy in total. "
+            "0 uses all available cores.",
+        "default": 0
+    },
+    "memory": {
+        "desc":
+            "Amount of memory parallel projects may occupy in total, "
+            "e.g., 64G. Defaults to the total memory of this machine.",
+        "default": None
+    }
+}
+
+CFG["jobserver"] = {
+    "fifo": {
+        "desc":
+            "Path to the fifo of the active job server. This is set by "
+            "benchbuild when it executes projects in parallel.",
+        "default": None
+    }
+}
+
+CFG["journal"] = {
+    "enabled": {
+        "desc":
+            "Record finished project chains, so that benchbuild run --resume "
+            "can skip them.",
+        "default": True
+    },
+    "path": {
+        "desc": "Path to the journal. Defaults to <build_dir>/.benchbuild-journal",
+        "default": None
+    }
+}
+
+CFG["build_cache"] = {
+    "enabled": {
+        "desc":
+            "Restore compiled build directories of identical builds instead "
+            "of compiling them again.",
+        "default": False
+    },
+    "share": {
+        "desc":
+            "Compile identical builds of different experiments only once "
+            "per invocation. A restored build skips the compile() of the "
+            "project, so only projects that keep no state from compile() "
+            "share their builds.",
+        "default": False
+    },
+    "share_lazy": {
+        "desc":
+            "With share, share builds in lazily planned runs, too. Their "
+            "compile steps are unknown in advance, so every compile of "
+            "such a run is copied into the shared cache.",
+        "default": False
+    },
+    "path": {
+        "desc":
+            "Path to the build cache. "
+            "Defaults to <build_dir>/.benchbuild-build-cache",
+        "default": None
+    }
+}
+
+CFG["prefetch"] = {
+    "lookahead": {
+        "desc":
+            "Fetch the sources of this many upcoming projects in the "
+            "background. 0 disables prefetching.",
+        "default": 2
+    },
+    "jobs": {
+        "desc": "Number of concurrent prefetches.",
+        "default": 2
+    }
+}
+
+CFG["workloads"] = {
+    "jobs": {
+        "desc":
+            "Number of workloads run concurrently by experiments that allow "
+            "it. 0 uses all available cores.",
+        "default": 0
+    }
+}
+
+CFG["capture"] = {
+    "compression": {
+        "desc":
+            "Compression of the captured stdout/stderr of tracked binaries: "
+            "none, gzip or zstd.",
+        "default": "gzip"
+    },
+    "head": {
+        "desc": "Bytes of captured output we keep from the start for the db.",
+        "default": 65536
+    },
+    "tail": {
+        "desc": "Bytes of captured output we keep from the end for the db.",
+        "default": 65536
+    },
+    "segment_size": {
+        "desc":
+            "Split captured output into files of this many (uncompressed) "
+            "bytes. 0 writes a single file.",
+        "default": 0
+    },
+    "keep": {
+        "desc": "Keep only the newest segments of captured output, 0 keeps all.",
+        "default": 0
+    }
+}
+
+CFG["blobs"] = {
+    "store": {
+        "desc": "The store for large payloads of runs, e.g., local.",
+        "default": "local"
+    },
+    "location": {
+        "desc":
+            "Where the blob store keeps its blobs. "
+            "Defaults to <build_dir>/.benchbuild-blobs",
+        "default": None
+    },
+    "threshold": {
+        "desc":
+            "Payloads of runs larger than this many bytes are kept in the "
+            "blob store instead of the database.",
+        "default": 4096
+    },
+    "compression": {
+        "desc": "Compression of blobs in the local store: gzip or zstd.",
+        "default": "gzip"
+    },
+    "preview": {
+        "desc": "Characters of a blob the database keeps as a preview.",
+        "default": 256
+    }
+}
+
+CFG["sampler"] = {
+    "interval": {
+        "desc": "Seconds between two samples of the SampleResources extension.",
+        "default": 0.1
+    }
+}
+
+CFG["perf"] = {
+    "mode": {
+        "desc":
+            "How RunWithPerf profiles: record (sampled call stacks) or "
+            "stat (event counters only).",
+        "default": "record"
+    },
+    "events": {
+        "desc":
+            "Comma-separated perf events. Empty uses perf's default for "
+            "record and stat.",
+        "default": ""
+    },
+    "frequency": {
+        "desc": "Sampling frequency of perf record in Hz.",
+        "default": 999
+    }
+}
+
+CFG["interleave"] = {
+    "rounds": {
+        "desc":
+            "Run the workloads of all variants of a project in turns, "
+            "this many times. 0 disables interleaving.",
+        "default": 0
+    },
+    "order": {
+        "desc":
+            "Order of the variants in each round: alternate (ABAB...) or "
+            "random (randomized blocks).",
+        "default": "alternate"
+    },
+    "seed": {
+        "desc": "Seed of the random order. Defaults to a random seed.",
+        "default": None
+    },
+    "core": {
+        "desc":
+            "Pin interleaved executions to this core. -1 disables pinning.",
+        "default": -1
+    },
+    "pair": {
+        "desc":
+            "Pairing tag of the current interleaved execution. This is set "
+            "by benchbuild.",
+        "default": None
+    },
+    "variant": {
+        "desc":
+            "Variant of the current interleaved execution. This is set by "
+            "benchbuild.",
+        "default": None
+    }
+}
+
+CFG["time"] = {
+    "backend": {
+        "desc":
+            "How RunWithTime measures: rusage (os.wait4) or time "
+            "(GNU time wrapper).",
+        "default": "rusage"
+    },
+    "warmups": {
+        "desc": "Number of discarded executions before RunWithTime measures.",
+        "default": 0
+    },
+    "repeats": {
+        "desc": "Number of executions RunWithTime measures.",
+        "default": 1
+    },
+    "outliers": {
+        "desc":
+            "How RunWithTime detects outliers among repeated executions: "
+            "mad, iqr or none.",
+        "default": "mad"
+    }
+}
+
+CFG["statistics"] = {
+    "backend": {
+        "desc":
+            "How the Statistics extension measures: rusage (os.wait4) or "
+            "time (GNU time wrapper).",
+        "default": "rusage"
+    },
+    "metric": {
+        "desc": "Metric the Statistics extension measures: wall, user, maxrss.",
+        "default": "wall"
+    },
+    "confidence": {
+        "desc": "Confidence level of the metric's confidence interval.",
+        "default": 0.95
+    },
+    "rel_width": {
+        "desc":
+            "Stop repeating when the confidence interval is narrower than "
+            "this fraction of the mean.",
+        "default": 0.05
+    },
+    "min_repeats": {
+        "desc": "Minimal number of repetitions.",
+        "default": 3
+    },
+    "max_repeats": {
+        "desc": "Maximal number of repetitions.",
+        "default": 30
+    },
+    "budget": {
+        "desc":
+            "Stop repeating after this many seconds per binary. "
+            "0 means no limit.",
+        "default": 0
+    }
+}
+
 CFG['db'] = {
     "enabled": {
         "desc": "Whether the database is enabled.",
@@ -160,6 +425,38 @@ CFG['db'] = {
     "create_functions": {
         "default": False,
         "desc": "Should we recreate our SQL functions from scratch?"
+    },
+    "write_behind": {
+        "default": True,
+        "desc":
+            "Queue the rows of tracked runs and write them in bulk from a "
+            "background thread."
+    },
+    "batch_size": {
+        "default": 1000,
+        "desc": "Write queued rows as soon as this many are queued."
+    },
+    "flush_interval": {
+        "default": 2.0,
+        "desc": "Write queued rows after this many seconds."
+    },
+    "collector": {
+        "default": None,
+        "desc":
+            "Path to the socket of the active metrics collector. This is set "
+            "by benchbuild while it executes a plan."
+    },
+    "spool": {
+        "default": None,
+        "desc":
+            "Write to this local SQLite file instead of the database. "
+            "Merge it into the database with 'benchbuild db sync'."
+    },
+    "spool_on_failure": {
+        "default": False,
+        "desc":
+            "Spool to a SQLite file in tmp_dir, if we cannot connect to "
+            "the database, instead of aborting."
     }
 }
 
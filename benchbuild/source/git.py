@@ -21,6 +21,15 @@ Remotes = tp.Dict[str, str]
 _fetched_cache: tp.Set['Git'] = set()
 
 
+def mark_fetched(repo: 'Git') -> None:
+    """
+    Remember that the repository is up-to-date for this process.
+
+    Use this, if another process fetched the repository for us.
+    """
+    _fetched_cache.add(repo)
+
+
 class Git(base.FetchableSource):
     """
     Fetch the downloadable source via git.
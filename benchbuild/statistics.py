@@ -1,91 +1,436 @@
 """
-Handle all statsitic related classes and methods.
+Repeat runs until a metric is measured precisely enough.
+
+The `Statistics` extension re-runs the wrapped binary and measures one
+metric per repetition. We read it from the resource usage of the run (see
+`benchbuild.utils.run.ResourceUsage`) or, with the `time` backend, from the
+output of GNU time:
+
+    * wall: The elapsed real time in seconds.
+    * user: The user time in seconds.
+    * maxrss: The maximum resident set size in KiB.
+
+If a repetition consists of several runs, we add up their times and take
+the largest of their resident set sizes, see `AGGREGATES`.
+
+After every repetition we compute the two-sided Student-t confidence
+interval of the metric's mean. We stop as soon as the interval is narrower
+than the configured relative width (relative to the mean), or when we run
+out of repetitions or time. Noisy binaries get more repetitions, stable
+binaries fewer.
+
+The statistics are computed with NumPy. We do not need scipy for the
+quantiles of the t-distribution, see `t_quantile` and `t_cdf`.
+
+This module also provides robust summaries and outlier detection for
+repeated measurements, see `outliers` and `robust_summary`.
 """
 import logging
+import math
+import time
+import typing as tp
+from statistics import NormalDist
 
 from benchbuild.extensions import Extension
-from benchbuild.utils.schema import Session
-
-# The import of scipy and all of its usages are commented out, since its import
-# takes too much time for the buildbot. To use the statistics uncomment the
-# import and the line containing the stats.ttest function of scipy.
-# import scipy
+from benchbuild.extensions.time import fetch_time_output
+from benchbuild.settings import CFG
+from benchbuild.utils import run
+from benchbuild.utils.cmd import time as time_cmd
 
 LOG = logging.getLogger(__name__)
-TIMEOUT = 1
+
+TIME_TAG = "BENCHBUILD-STATISTICS: "
+METRICS = ("wall", "user", "maxrss")
+# How we combine the metrics of all runs of one repetition.
+AGGREGATES: tp.Dict[str, tp.Callable[[tp.List[float]], float]] = {
+    "wall": sum,
+    "user": sum,
+    "maxrss": max
+}
+# From here on, the Cornish-Fisher expansion is precise on its own.
+EXPANSION_DOF = 100
+
+
+def t_cdf(t: float, dof: int) -> float:
+    """
+    Compute the cumulative distribution function of Student's t.
+
+    We use the finite series for integer degrees of freedom, see
+    Abramowitz & Stegun, 26.7.3 and 26.7.4. Its length grows with `dof`.
+
+    Args:
+        t: The value.
+        dof: The degrees of freedom, at least 1.
+    """
+    theta = math.atan2(t, math.sqrt(dof))
+    cos2 = math.cos(theta)**2
+    if dof % 2:
+        term = total = math.cos(theta) if dof > 1 else 0.0
+        first = 3
+    else:
+        term = total = 1.0
+        first = 2
+    for k in range(first, dof, 2):
+        term *= cos2 * (k - 1) / k
+        total += term
+
+    if dof % 2:
+        area = 2 / math.pi * (theta + math.sin(theta) * total)
+    else:
+        area = math.sin(theta) * total
+    return (1 + area) / 2
+
+
+def t_pdf(t: float, dof: int) -> float:
+    """Compute the probability density function of Student's t."""
+    n = float(dof)
+    return math.exp(
+        math.lgamma((n + 1) / 2) - math.lgamma(n / 2) -
+        math.log(n * math.pi) / 2 - (n + 1) / 2 * math.log1p(t * t / n)
+    )
+
+
+def t_quantile(p: float, dof: int) -> float:
+    """
+    Compute the p-quantile of Student's t-distribution.
+
+    We use the exact solutions for 1 and 2 degrees of freedom and the
+    Cornish-Fisher expansion around the normal quantile otherwise. The
+    expansion is off by up to 5e-2 for 3 degrees of freedom and extreme
+    quantiles, so we refine it with Newton's method on `t_cdf` for fewer
+    than `EXPANSION_DOF` degrees of freedom. Beyond, the expansion alone is
+    accurate to 1e-6 for p between 0.0005 and 0.9995.
+
+    Args:
+        p: The probability, 0 < p < 1.
+        dof: The degrees of freedom, at least 1.
+    """
+    if dof < 1:
+        raise ValueError("t-distribution needs at least 1 degree of freedom")
+    if dof == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if dof == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+
+    z = NormalDist().inv_cdf(p)
+    n = float(dof)
+    g1 = (z**3 + z) / 4
+    g2 = (5 * z**5 + 16 * z**3 + 3 * z) / 96
+    g3 = (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / 384
+    g4 = (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / 92160
+    quantile = z + g1 / n + g2 / n**2 + g3 / n**3 + g4 / n**4
+    if dof >= EXPANSION_DOF:
+        return quantile
+
+    for _ in range(20):
+        step = (t_cdf(quantile, dof) - p) / t_pdf(quantile, dof)
+        quantile -= step
+        if abs(step) <= 1e-12 * max(1.0, abs(quantile)):
+            break
+    return quantile
+
+
+def confidence_interval(samples: tp.Sequence[float],
+                        confidence: float) -> tp.Tuple[float, float]:
+    """
+    Compute the confidence interval of the mean of the samples.
+
+    Args:
+        samples: At least two measurements.
+        confidence: The confidence level, e.g., 0.95.
+
+    Returns:
+        The mean and the half-width of the interval.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    values = np.asarray(samples, dtype=float)
+    if values.size < 2:
+        return float(values.mean()) if values.size else math.nan, math.inf
+
+    mean = float(values.mean())
+    sem = float(values.std(ddof=1)) / math.sqrt(values.size)
+    return mean, t_quantile((1 + confidence) / 2, values.size - 1) * sem
+
+
+def relative_width(samples: tp.Sequence[float], confidence: float) -> float:
+    """
+    Compute the width of the confidence interval relative to the mean.
+
+    Args:
+        samples: The measurements.
+        confidence: The confidence level, e.g., 0.95.
+    """
+    mean, half_width = confidence_interval(samples, confidence)
+    if half_width == 0:
+        return 0.0
+    if mean == 0 or math.isnan(mean):
+        return math.inf
+    return 2 * half_width / abs(mean)
+
+
+def trimmed_mean(samples: tp.Sequence[float], cut: float = 0.1) -> float:
+    """
+    Compute the mean without the lowest and highest fraction of samples.
+
+    Args:
+        samples: The measurements.
+        cut: The fraction we cut off at each end.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    values = np.sort(np.asarray(samples, dtype=float))
+    trim = int(cut * values.size)
+    return float(values[trim:values.size - trim].mean())
+
+
+def median_absolute_deviation(samples: tp.Sequence[float]) -> float:
+    """Compute the median absolute deviation from the median."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    values = np.asarray(samples, dtype=float)
+    return float(np.median(np.abs(values - np.median(values))))
+
+
+def outliers(samples: tp.Sequence[float], method: str) -> tp.List[bool]:
+    """
+    Mark the outliers among the samples.
+
+    Args:
+        samples: The measurements.
+        method: One of
+            * "mad": More than 3.5 (scaled) median absolute deviations
+              away from the median (Iglewicz & Hoaglin).
+            * "iqr": More than 1.5 interquartile ranges outside of the
+              quartiles (Tukey's fences).
+            * "none": Nothing is an outlier.
+
+    Returns:
+        For every sample, True if it is an outlier.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    values = np.asarray(samples, dtype=float)
+    if method == "none" or values.size < 3:
+        return [False] * values.size
+
+    if method == "mad":
+        mad = median_absolute_deviation(values)
+        if mad == 0:
+            return [False] * values.size
+        scores = np.abs(values - np.median(values)) / (1.4826 * mad)
+        return [bool(score > 3.5) for score in scores]
+
+    if method == "iqr":
+        lower, upper = np.percentile(values, [25, 75])
+        fence = 1.5 * (upper - lower)
+        return [
+            bool(value < lower - fence or value > upper + fence)
+            for value in values
+        ]
+
+    raise ValueError(f"Unknown outlier method {method}, use mad, iqr or none")
+
+
+def robust_summary(samples: tp.Sequence[float]) -> tp.Dict[str, float]:
+    """
+    Summarize the samples with statistics that tolerate outliers.
+
+    Returns:
+        The median, the 10% trimmed mean and the median absolute deviation.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    return {
+        "median": float(np.median(np.asarray(samples, dtype=float))),
+        "trimmed_mean": trimmed_mean(samples),
+        "mad": median_absolute_deviation(samples)
+    }
+
+
+def rusage_metrics(usage) -> tp.Optional[tp.Dict[str, float]]:
+    """
+    Read all metrics from the resource usage of a run.
+
+    Args:
+        usage: The `ResourceUsage` of a run, or None.
+
+    Returns:
+        All metrics, or None.
+    """
+    if usage is None:
+        return None
+    return {
+        "wall": usage.real_s,
+        "user": usage.user_s,
+        "maxrss": float(usage.maxrss_kb)
+    }
+
+
+def parse_metrics(stderr: str) -> tp.Optional[tp.Dict[str, float]]:
+    """
+    Parse the output of our GNU time wrapper.
+
+    Args:
+        stderr: The stderr of a single repetition.
+
+    Returns:
+        All metrics of the last measurement found, or None.
+    """
+    timings = fetch_time_output(
+        TIME_TAG, TIME_TAG + "{:g} {:g} {:g}", stderr.split("\n")
+    )
+    if not timings:
+        return None
+    return dict(zip(METRICS, (float(value) for value in timings[-1])))
 
 
 class Statistics(Extension):
     """
-    Extend a run to be repeated until it reaches a statistically significance
-    specified by the user.
+    Repeat a run until the chosen metric has a narrow confidence interval.
 
-    An example on how to use this extension can be found in the Pollytest
-    Experiment.
+    All settings default to `CFG["statistics"]`.
+
+    Args:
+        project: The project we run.
+        experiment: The experiment we run for.
+        *extensions: The extensions we repeat.
+        config: The configuration of this extension.
+        metric: One of `METRICS`.
+        confidence: The confidence level of the interval.
+        rel_width: Stop when the interval is narrower than this fraction of
+            the mean.
+        min_repeats: Never stop earlier than this.
+        max_repeats: Never repeat more often than this.
+        budget: Stop after this many seconds. 0 means no limit.
+        backend: How to measure: rusage or time.
     """
 
-    def __init__(self, project, experiment, *extensions, config=None):
+    def __init__(
+        self,
+        project,
+        experiment,
+        *extensions,
+        config=None,
+        metric: tp.Optional[str] = None,
+        confidence: tp.Optional[float] = None,
+        rel_width: tp.Optional[float] = None,
+        min_repeats: tp.Optional[int] = None,
+        max_repeats: tp.Optional[int] = None,
+        budget: tp.Optional[float] = None,
+        backend: tp.Optional[str] = None
+    ):
         self.project = project
         self.experiment = experiment
 
+        cfg = CFG["statistics"]
+        self.backend = str(backend if backend is not None else cfg["backend"])
+        if self.backend not in ("rusage", "time"):
+            raise ValueError(f"Unknown measuring backend {self.backend}")
+        self.metric = str(metric if metric is not None else cfg["metric"])
+        if self.metric not in METRICS:
+            raise ValueError(f"Unknown metric {self.metric}, use {METRICS}")
+        self.confidence = float(
+            confidence if confidence is not None else cfg["confidence"]
+        )
+        self.rel_width = float(
+            rel_width if rel_width is not None else cfg["rel_width"]
+        )
+        self.min_repeats = max(
+            int(min_repeats if min_repeats is not None else cfg["min_repeats"]),
+            2
+        )
+        self.max_repeats = max(
+            int(max_repeats if max_repeats is not None else cfg["max_repeats"]),
+            1
+        )
+        self.budget = float(budget if budget is not None else cfg["budget"])
+
         super().__init__(*extensions, config=config)
 
-    def t_test(self, *results, significance=0.95):
+    def is_precise(self, samples: tp.Sequence[float]) -> bool:
+        """Check, if we measured the metric precisely enough."""
+        if len(samples) < self.min_repeats:
+            return False
+        return relative_width(samples, self.confidence) <= self.rel_width
+
+    def sample(
+        self, measure: tp.Callable[[], tp.Optional[float]]
+    ) -> tp.List[float]:
         """
-        Runs a t-test on a given set of results.
+        Call `measure` until the samples are precise enough.
+
+        Args:
+            measure: Run one repetition and return the metric, or None if
+                the repetition did not produce a measurement.
 
         Returns:
-            True if the null hypothesis that the result was not significant
-            was rejected, False otherwise.
+            All samples we collected.
         """
-        for result in results:
-            del result  # Unused temporarily
-            t_statistic = 0
-            p_value = 0
-            #t_statistic, p_value = scipy.stats.ttest_1samp(result, TRUE_MU)
-            LOG.debug("t-statistic = %f, pvalue = %f", t_statistic, p_value)
-        return p_value >= 1 - significance
-
-    def __call__(self, *args, timeout=TIMEOUT, **kwargs):
+        samples: tp.List[float] = []
+        start = time.monotonic()
+        while len(samples) < self.max_repeats:
+            value = measure()
+            if value is None:
+                LOG.warning("No %s measured, stop repeating.", self.metric)
+                break
+            samples.append(value)
+
+            if self.is_precise(samples):
+                LOG.info(
+                    "%s is precise enough after %d repetitions.", self.metric,
+                    len(samples)
+                )
+                break
+            if self.budget > 0 and time.monotonic() - start >= self.budget:
+                LOG.warning("Time budget exhausted, stop repeating.")
+                break
+        else:
+            LOG.warning("%s is still imprecise after %d repetitions.",
+                        self.metric, len(samples))
+        return samples
+
+    def __call__(self, binary_command, *args, **kwargs):
         """
-        The call of this extension runs the following extensions until the
-        timeout was reached or a run was significant enough to withdraw the
-        nullhypothesis.
+        Repeat the following extensions until the metric is precise enough.
 
-        Kwargs:
-            timeout: The amount of trys the user wants to give the experiment
-                     before it gets interrupted.
         Returns:
-            The run info object after executing the
-            afterwards following extensions.
+            The run info objects of all repetitions.
         """
-        iterator = 0
-        session = Session()
-
-        while iterator < timeout:
-            #get an run_info object after executing the run with its extensions
-            ri_object = self.call_next(*args, **kwargs)
-
-            #check if the experiment defines the result function
-            if hasattr(self.experiment, 'res_func'):
-                results = self.experiment.res_func(ri_object)
-                if self.t_test(results):
-                    LOG.info("The run was significant.")
-                    break
-
-                #check if this was the last iteration
-                if iterator == (timeout - 1):
-                    LOG.warning(
-                        "No significant run happened before the timeout!"
-                    )
-                iterator += 1
-
-            # no need to repeat the run without a result function
-            else:
-                break
+        run_cmd = binary_command
+        if self.backend == "time":
+            run_cmd = time_cmd["-f", TIME_TAG + "%e %U %M", binary_command]
+        run_infos: tp.List[run.RunInfo] = []
+
+        def metrics_of(run_info) -> tp.Optional[tp.Dict[str, float]]:
+            if self.backend == "time":
+                return parse_metrics(str(run_info.stderr))
+            return rusage_metrics(getattr(run_info, "rusage", None))
+
+        def measure() -> tp.Optional[float]:
+            results = self.call_next(run_cmd, *args, **kwargs)
+            run_infos.extend(results)
+            values = [
+                metrics[self.metric]
+                for metrics in (metrics_of(ri) for ri in results)
+                if metrics is not None
+            ]
+            return AGGREGATES[self.metric](values) if values else None
+
+        samples = self.sample(measure)
 
-        #Commit the database session containing all runs
-        session.commit()
+        mean, half_width = confidence_interval(samples, self.confidence)
+        summary = {
+            "metric": self.metric,
+            "repetitions": len(samples),
+            "mean": mean,
+            "ci_half_width": half_width,
+            "confidence": self.confidence
+        }
+        LOG.info("Statistics: %s", summary)
+        if run_infos:
+            run_infos[-1].add_payload("statistics", summary)
+        return run_infos
 
-        LOG.info("Overall one command was executed %s times.", iterator)
-        return ri_object
+    def __str__(self):
+        return f"Repeat until {self.metric} is precise"
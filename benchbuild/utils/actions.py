@@ -14,22 +14,26 @@ TODO
 from __future__ import annotations
 
 import abc
+import asyncio
 import enum
 import functools as ft
 import itertools
 import logging
 import os
+import random
 import sys
 import textwrap
 import traceback
 import typing as tp
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
 
 from plumbum import ProcessExecutionError
 
 from benchbuild import command, signals, source
 from benchbuild.settings import CFG
-from benchbuild.utils import db, run
+from benchbuild.utils import build_cache, db, journal, prefetch, run
 from benchbuild.utils.cmd import mkdir, rm, rmdir
 
 LOG = logging.getLogger(__name__)
@@ -70,6 +74,28 @@ def step_has_failed(
     return result in error_status
 
 
+def project_of(step: "Step") -> tp.Optional["benchbuild.project.Project"]:
+    """
+    Find the project a step operates on.
+
+    Multi steps are searched depth-first for the first project step.
+
+    Args:
+        step: The step we want the project of.
+
+    Returns:
+        The project, or None, if the step does not operate on a project.
+    """
+    if isinstance(step, ProjectStep):
+        return step.project
+
+    if isinstance(step, MultiStep):
+        for child in step.actions:
+            if (project := project_of(child)) is not None:
+                return project
+    return None
+
+
 def prepend_status(func: DecoratedFunction[str]) -> DecoratedFunction[str]:
     """Prepends the output of `func` with the status."""
 
@@ -306,12 +332,62 @@ class MakeBuildDir(ProjectStep):
 
 
 class Compile(ProjectStep):
+    """
+    Compile the project.
+
+    Args:
+        project: The project we compile.
+        shared_builds: A build cache shared with other compile steps of the
+            same plan. The first step that compiles a build stores it there,
+            all others wait for it and restore it. Builds that are not
+            portable (see `build_cache.is_portable`) are compiled by every
+            step on its own.
+    """
     NAME = "COMPILE"
     DESCRIPTION = "Compile the project"
 
+    shared_builds: tp.Optional[str]
+
+    def __init__(
+        self,
+        project: "benchbuild.project.Project",
+        shared_builds: tp.Optional[str] = None
+    ) -> None:
+        super().__init__(project)
+        self.shared_builds = shared_builds
+
+    def __compile(self) -> bool:
+        """Compile or restore the project, True if the build is portable."""
+        if build_cache.restore(self.project):
+            return True
+        if not (build_cache.is_enabled() or self.shared_builds):
+            self.project.compile()
+            return True
+
+        state = build_cache.instance_state(self.project)
+        self.project.compile()
+        if not build_cache.is_portable(self.project, state):
+            return False
+        build_cache.store(self.project)
+        return True
+
     def __call__(self) -> StepResult:
         try:
-            self.project.compile()
+            if self.shared_builds:
+                with build_cache.locked(self.shared_builds, self.project):
+                    if not build_cache.restore_from(
+                        self.shared_builds, self.project
+                    ):
+                        if self.__compile():
+                            build_cache.store_in(
+                                self.shared_builds, self.project
+                            )
+                        else:
+                            build_cache.exclude_from(
+                                self.shared_builds, self.project
+                            )
+            else:
+                self.__compile()
 
         except ProcessExecutionError:
             self.status = StepResult.ERROR
@@ -321,7 +397,10 @@ class Compile(ProjectStep):
         return self.status
 
     def __str__(self, indent: int = 0) -> str:
-        return textwrap.indent(f"* {self.project.name}: Compile", indent * " ")
+        shared = " (shared build)" if self.shared_builds else ""
+        return textwrap.indent(
+            f"* {self.project.name}: Compile{shared}", indent * " "
+        )
 
 
 class Run(ProjectStep):
@@ -424,26 +503,75 @@ class Any(MultiStep):
 
 
 class Experiment(Any):
+    """
+    Run all actions of an experiment, wrapped in a db transaction.
+
+    The actions may be given as an iterator. Such a lazy experiment plans its
+    children on demand: executors `pull` one child after another, without
+    keeping them in `actions`. `expand` plans all remaining children at once.
+
+    Args:
+        experiment: The experiment we execute.
+        actions: The children of this experiment.
+
+    Attributes:
+        pending: The children that have not been planned yet, if lazy.
+    """
     NAME = "EXPERIMENT"
     DESCRIPTION = "Run a experiment, wrapped in a db transaction"
 
     experiment: "benchbuild.experiment.Experiment"
+    transaction: tp.Optional[tp.Tuple["benchbuild.utils.schema.Experiment",
+                                      tp.Any]]
+    pending: tp.Optional[tp.Iterator[Step]]
 
     def __init__(
         self,
         experiment: "benchbuild.experiment.Experiment",
-        actions: tp.Optional[tp.MutableSequence[Step]],
+        actions: tp.Optional[tp.Iterable[Step]],
     ) -> None:
         _actions: tp.MutableSequence[Step] = [
             Echo(message=f"Start experiment: {experiment.name}")
         ]
-        _actions.extend(actions if actions else [])
+        self.pending = None
+        if isinstance(actions, tp.Iterator):
+            self.pending = actions
+        else:
+            _actions.extend(actions if actions else [])
         _actions.extend([
             Echo(message=f"Completed experiment: {experiment.name}")
         ])
 
         super().__init__(_actions)
         self.experiment = experiment
+        self.transaction = None
+
+    @property
+    def is_lazy(self) -> bool:
+        """Check, if some of our children have not been planned yet."""
+        return self.pending is not None
+
+    def pull(self) -> tp.Optional[Step]:
+        """
+        Plan the next child of a lazy experiment.
+
+        Returns:
+            The next child, or None, if all children have been planned.
+        """
+        if self.pending is None:
+            return None
+        try:
+            return next(self.pending)
+        except StopIteration:
+            self.pending = None
+        return None
+
+    def expand(self) -> None:
+        """Plan all remaining children and keep them in `actions`."""
+        closing = self.actions.pop()
+        while (child := self.pull()) is not None:
+            self.actions.append(child)
+        self.actions.append(closing)
 
     def begin_transaction(
         self,
@@ -502,22 +630,51 @@ class Experiment(Any):
             results.append(StepResult.ERROR)
         return results
 
+    def begin(self) -> None:
+        """
+        Enter the experiment.
+
+        Opens the database transaction of this experiment, if the database
+        is enabled. Executors that schedule our children on their own have
+        to call this before the first child runs.
+        """
+        if CFG["db"]["enabled"]:
+            self.transaction = self.begin_transaction()
+
+    def end(self, results: tp.Sequence[StepResult]) -> StepResult:
+        """
+        Leave the experiment.
+
+        Closes the database transaction opened by `begin` and derives our
+        status from the results of all children.
+
+        Args:
+            results: The results of all children that have been executed.
+        """
+        if self.transaction is not None:
+            self.end_transaction(*self.transaction)
+            signals.handlers.deregister(self.end_transaction)
+            self.transaction = None
+        self.status = max(results) if results else StepResult.OK
+        return self.status
+
     def __call__(self) -> StepResult:
         results = []
-        session = None
-        if CFG["db"]["enabled"]:
-            experiment, session = self.begin_transaction()
+        self.expand()
+        self.begin()
         try:
             results = self.__run_children(int(CFG["parallel_processes"]))
         finally:
-            if CFG["db"]["enabled"]:
-                self.end_transaction(experiment, session)
-                signals.handlers.deregister(self.end_transaction)
-        self.status = max(results) if results else StepResult.OK
+            self.end(results)
         return self.status
 
     def __str__(self, indent: int = 0) -> str:
         sub_actns = "\n".join([a.__str__(indent + 1) for a in self.actions])
+        if self.is_lazy:
+            sub_actns += textwrap.indent(
+                "\n* Remaining actions are planned on demand.",
+                (indent + 1) * " "
+            )
         return textwrap.indent(
             f"\nExperiment: {self.experiment.name}\n{sub_actns}", indent * " "
         )
@@ -614,6 +771,27 @@ class RunWorkload(ProjectStep):
             raise
         return self.status
 
+    async def run_async(self) -> StepResult:
+        """
+        Run the workload on the running asyncio event loop.
+
+        Workloads without a `run_async` method block the event loop.
+        """
+        run_workload = getattr(self.workload_ref, "run_async", None)
+        try:
+            if run_workload is None:
+                self.workload_ref()
+            else:
+                await run_workload()
+            self.status = StepResult.OK
+        except (ProcessExecutionError, asyncio.CancelledError):
+            self.status = StepResult.ERROR
+            raise
+        except KeyboardInterrupt:
+            self.status = StepResult.ERROR
+            raise
+        return self.status
+
     def __str__(self, indent: int = 0) -> str:
         return textwrap.indent(f"* Run: {str(self.workload_ref)}", indent * " ")
 
@@ -651,8 +829,11 @@ class RunWorkloads(MultiStep):
             group, session = run.begin_run_group(self.project, self.experiment)
             signals.handlers.register(run.fail_run_group, group, session)
         try:
-            self.status = max([workload() for workload in self.actions],
-                              default=StepResult.OK)
+            if self.jobs > 1:
+                self.status = self.__run_concurrently()
+            else:
+                results = [self.__run_workload(w) for w in self.actions]
+                self.status = max(results, default=StepResult.OK)
             if CFG["db"]["enabled"]:
                 run.end_run_group(group, session)
         except ProcessExecutionError:
@@ -671,6 +852,74 @@ class RunWorkloads(MultiStep):
 
         return self.status
 
+    @property
+    def jobs(self) -> int:
+        """The number of workloads we run at the same time."""
+        if not getattr(self.experiment, "CONCURRENT_WORKLOADS", False):
+            return 1
+        jobs = int(CFG["workloads"]["jobs"])
+        return jobs if jobs > 0 else (os.cpu_count() or 1)
+
+    def __is_completed(self, workload: RunWorkload) -> bool:
+        workload_str = str(workload.workload_ref)
+        if journal.is_completed(self.experiment, self.project, workload_str):
+            LOG.info("Skipping finished workload: %s", workload_str)
+            return True
+        return False
+
+    def __run_concurrently(self) -> StepResult:
+        """
+        Run all workloads concurrently, up to `jobs` at a time.
+
+        Workloads that create or consume the same paths (see
+        `benchbuild.command.conflicts`) still run in the order they have
+        been declared in.
+        """
+        pending = [w for w in self.actions if not self.__is_completed(w)]
+        for workload in pending:
+            if (prepare := getattr(workload.workload_ref, "prepare", None)):
+                prepare()
+
+        refs = [w.workload_ref for w in pending]
+        after = [[
+            earlier for earlier in range(idx)
+            if command.conflicts(refs[earlier], ref)
+        ] for idx, ref in enumerate(refs)]
+        results = run.run_concurrently([w.run_async for w in pending],
+                                       limit=self.jobs,
+                                       after=after)
+
+        status = StepResult.OK
+        for workload, result in zip(pending, results):
+            if isinstance(result, BaseException):
+                result = StepResult.ERROR
+            journal.record(
+                self.experiment,
+                self.project,
+                result,
+                workload=str(workload.workload_ref)
+            )
+            status = max(status, result)
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return status
+
+    def __run_workload(self, workload: RunWorkload) -> StepResult:
+        if self.__is_completed(workload):
+            return StepResult.OK
+        workload_str = str(workload.workload_ref)
+
+        result = StepResult.ERROR
+        try:
+            result = workload()
+        finally:
+            journal.record(
+                self.experiment, self.project, result, workload=workload_str
+            )
+        return result
+
     def __str__(self, indent: int = 0) -> str:
         sub_actns = "\n".join([a.__str__(indent + 1) for a in self.actions])
         return textwrap.indent(
@@ -679,6 +928,209 @@ class RunWorkloads(MultiStep):
         )
 
 
+class InterleavedWorkloads(MultiStep):
+    """
+    Run the same workloads of several variants of a project in turns.
+
+    Variants are the `RunWorkloads` of the same project under different
+    experiments or revisions. Instead of running all workloads of one
+    variant after another, we run every workload once per variant and
+    repeat that for a number of rounds. Machine drift, e.g., thermal or
+    frequency changes, affects all variants alike then.
+
+    Every execution is tagged with `CFG["interleave"]["pair"]`, which is
+    the same for all variants of a workload in a round, and with
+    `CFG["interleave"]["variant"]`. The tags are stored with each run
+    (see `benchbuild.utils.run.RunInfo`) for paired comparisons.
+
+    A variant whose workload fails is not run any further.
+
+    Like `RunWorkloads`, we skip the workloads the journal of a resumed run
+    marks as finished, and journal every workload once all of its rounds
+    are done. The project chains the variants were taken from are
+    journaled by us, too, when the interleaving is done.
+
+    All settings default to `CFG["interleave"]`.
+
+    Args:
+        variants: The `RunWorkloads` we interleave.
+        chains: The project chain each variant was taken from.
+        rounds: How often we run every workload of every variant.
+        order: Order of the variants in a round: "alternate" keeps the
+            same order in every round (ABAB...), "random" shuffles the
+            variants for every workload (randomized blocks).
+        seed: The seed of the "random" order.
+        core: Pin all executions to this core, -1 disables pinning.
+    """
+    NAME = "INTERLEAVE"
+    DESCRIPTION = "Run the workloads of several variants in turns"
+
+    actions: tp.MutableSequence[RunWorkloads]
+
+    def __init__(
+        self,
+        variants: tp.Sequence[RunWorkloads],
+        chains: tp.Optional[tp.Sequence["RequireAll"]] = None,
+        rounds: tp.Optional[int] = None,
+        order: tp.Optional[str] = None,
+        seed: tp.Optional[int] = None,
+        core: tp.Optional[int] = None
+    ) -> None:
+        super().__init__(list(variants))
+        self.chains = list(chains) if chains else []
+
+        cfg = CFG["interleave"]
+        self.rounds = int(rounds if rounds is not None else cfg["rounds"])
+        self.order = str(order if order is not None else cfg["order"])
+        if self.order not in ("alternate", "random"):
+            raise ValueError(f"Unknown order {self.order}")
+        self.seed = seed if seed is not None else cfg["seed"].value
+        self.core = int(core if core is not None else cfg["core"])
+        self.pair_id = uuid.uuid4()
+
+    @staticmethod
+    def label(variant: RunWorkloads) -> str:
+        """A human readable name of a variant."""
+        return f"{variant.experiment.name}/{variant.project.id}"
+
+    def schedule(
+        self,
+        failed: tp.Container[int] = ()
+    ) -> tp.Iterator[tp.Tuple[int, str, int, RunWorkload]]:
+        """
+        Generate the order of all executions.
+
+        Args:
+            failed: Indices of variants we skip from now on.
+
+        Yields:
+            The round, the workload, the index of the variant and the
+            variant's `RunWorkload`.
+        """
+        by_variant = [{str(w.workload_ref): w
+                       for w in variant.actions}
+                      for variant in self.actions]
+        workloads = list(dict.fromkeys(itertools.chain(*by_variant)))
+        rng = random.Random(self.seed)
+
+        for rnd in range(self.rounds):
+            for workload in workloads:
+                indices = [
+                    idx for idx, variant in enumerate(by_variant)
+                    if workload in variant
+                ]
+                if self.order == "random":
+                    rng.shuffle(indices)
+                for idx in indices:
+                    if idx not in failed:
+                        yield rnd, workload, idx, by_variant[idx][workload]
+
+    @contextmanager
+    def pinned(self) -> tp.Iterator[None]:
+        """Pin this process and its children to the configured core."""
+        if self.core < 0:
+            yield
+            return
+
+        affinity = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, {self.core})
+        try:
+            yield
+        finally:
+            os.sched_setaffinity(0, affinity)
+
+    def __call__(self) -> StepResult:
+        groups = []
+        if CFG["db"]["enabled"]:
+            groups = [
+                run.begin_run_group(v.project, v.experiment)
+                for v in self.actions
+            ]
+            for group, session in groups:
+                signals.handlers.register(run.fail_run_group, group, session)
+
+        failed: tp.Set[int] = set()
+        finished = {(idx, str(w.workload_ref))
+                    for idx, variant in enumerate(self.actions)
+                    for w in variant.actions
+                    if self.__is_completed(variant, str(w.workload_ref))}
+        ran: tp.Dict[tp.Tuple[int, str], None] = {}
+        try:
+            with self.pinned():
+                for rnd, workload, idx, step in self.schedule(failed):
+                    if (idx, workload) in finished:
+                        continue
+                    variant = self.actions[idx]
+                    CFG["interleave"]["pair"] = \
+                        f"{self.pair_id}/{workload}/{rnd}"
+                    CFG["interleave"]["variant"] = self.label(variant)
+                    ran[(idx, workload)] = None
+                    try:
+                        step()
+                    except ProcessExecutionError:
+                        LOG.error(
+                            "%s failed, dropping it from the interleaving",
+                            self.label(variant)
+                        )
+                        failed.add(idx)
+                        journal.record(
+                            variant.experiment,
+                            variant.project,
+                            StepResult.ERROR,
+                            workload=workload
+                        )
+            for idx, workload in ran:
+                if idx not in failed:
+                    variant = self.actions[idx]
+                    journal.record(
+                        variant.experiment,
+                        variant.project,
+                        StepResult.OK,
+                        workload=workload
+                    )
+        except KeyboardInterrupt:
+            failed.update(range(len(self.actions)))
+            raise
+        finally:
+            CFG["interleave"]["pair"] = None
+            CFG["interleave"]["variant"] = None
+            for idx, (group, session) in enumerate(groups):
+                if idx in failed:
+                    run.fail_run_group(group, session)
+                else:
+                    run.end_run_group(group, session)
+            if groups:
+                signals.handlers.deregister(run.fail_run_group)
+
+        for idx, variant in enumerate(self.actions):
+            variant.status = StepResult.ERROR if idx in failed \
+                else StepResult.OK
+        for variant, chain in zip(self.actions, self.chains):
+            journal.record(
+                variant.experiment, variant.project,
+                max(variant.status, chain.status)
+            )
+        self.status = StepResult.ERROR if failed else StepResult.OK
+        return self.status
+
+    @staticmethod
+    def __is_completed(variant: RunWorkloads, workload: str) -> bool:
+        if journal.is_completed(variant.experiment, variant.project, workload):
+            LOG.info("Skipping finished workload: %s", workload)
+            return True
+        return False
+
+    def __str__(self, indent: int = 0) -> str:
+        variants = "\n".join(
+            textwrap.indent(f"* {self.label(v)}", (indent + 1) * " ")
+            for v in self.actions
+        )
+        return textwrap.indent(
+            f"* Interleave {self.rounds} rounds ({self.order}) of:\n"
+            f"{variants}", indent * " "
+        )
+
+
 class CleanExtra(Step):
     NAME = "CLEAN EXTRA"
     DESCRIPTION = "Cleans the extra directories."
@@ -708,9 +1160,18 @@ class CleanExtra(Step):
 
 
 class ProjectEnvironment(ProjectStep):
+    """
+    Fetch and check out all sources of the project.
+
+    Attributes:
+        prefetched: All sources of the project have been fetched in the
+            background already (see `benchbuild.utils.prefetch`).
+    """
     NAME = "ENV"
     DESCRIPTION = "Prepare the project environment."
 
+    prefetched: bool = False
+
     def __call__(self) -> StepResult:
         project = self.project
         project.clear_paths()
@@ -721,7 +1182,10 @@ class ProjectEnvironment(ProjectStep):
             name = variant.name()
             LOG.info("Fetching %s @ %s", str(name), variant.version)
             src = variant.source()
-            src.version(project.builddir, str(variant))
+            if self.prefetched:
+                prefetch.mark_fetched(src)
+            with prefetch.locked(src):
+                src.version(project.builddir, str(variant))
 
         self.status = StepResult.OK
         return self.status
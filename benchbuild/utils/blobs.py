@@ -0,0 +1,188 @@
+"""
+Store large payloads of runs outside of the database.
+
+Logs, flamegraphs and dumps can be megabytes large. Stored inline, every
+query that touches their rows drags them along. Payloads larger than
+`CFG["blobs"]["threshold"]` are therefore written to a content-addressed
+blob store. The database keeps only their digest, size and a short preview
+(see `schema.Blob` and `db.offload`) and fetches the body lazily, when
+someone asks for it (see `db.fetch_blob`).
+
+The default store is a local directory, in which every blob is stored once,
+compressed with gzip or, with the optional `zstandard` package, zstd:
+
+    <location>/ab/ab3f...e1.gz
+
+Without `CFG["blobs"]["location"]`, the store lives in the build directory.
+
+Other stores can be plugged in by adding a `BlobStore` to `STORES` and
+selecting it with `CFG["blobs"]["store"]`.
+"""
+import abc
+import functools
+import gzip
+import hashlib
+import importlib.util
+import logging
+import os
+import tempfile
+import typing as tp
+
+from benchbuild.settings import CFG
+
+LOG = logging.getLogger(__name__)
+
+EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def digest(data: bytes) -> str:
+    """The content address of a blob."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        import zstandard  # pylint: disable=import-outside-toplevel
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        import zstandard  # pylint: disable=import-outside-toplevel
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _compression(name: str) -> str:
+    if name not in EXTENSIONS:
+        raise ValueError(f"Unknown compression {name}, use gzip or zstd")
+    if name == "zstd" and importlib.util.find_spec("zstandard") is None:
+        LOG.warning("zstandard is not installed, falling back to gzip.")
+        return "gzip"
+    return name
+
+
+class BlobStore(abc.ABC):
+    """
+    A content-addressed store for blobs.
+
+    Args:
+        location: Where the store keeps its blobs.
+    """
+
+    def __init__(self, location: str) -> None:
+        self.location = location
+
+    @abc.abstractmethod
+    def put(self, data: bytes) -> str:
+        """
+        Store a blob, unless it is stored already.
+
+        Returns:
+            The digest of the blob.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def get(self, blob_digest: str) -> bytes:
+        """
+        Fetch a blob.
+
+        Raises:
+            KeyError: If the store does not hold the blob.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def __contains__(self, blob_digest: str) -> bool:
+        raise NotImplementedError()
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Store blobs as compressed files in a local directory.
+
+    Args:
+        location: The directory of the store.
+        compression: gzip or zstd, defaults to `CFG["blobs"]["compression"]`.
+    """
+
+    def __init__(
+        self, location: str, compression: tp.Optional[str] = None
+    ) -> None:
+        super().__init__(location)
+        if compression is None:
+            compression = str(CFG["blobs"]["compression"])
+        self.compression = _compression(compression)
+
+    def _path(self, blob_digest: str, compression: str) -> str:
+        return os.path.join(
+            self.location, blob_digest[:2],
+            blob_digest + EXTENSIONS[compression]
+        )
+
+    def _find(self, blob_digest: str) -> tp.Optional[tp.Tuple[str, str]]:
+        for compression in EXTENSIONS:
+            path = self._path(blob_digest, compression)
+            if os.path.exists(path):
+                return path, compression
+        return None
+
+    def put(self, data: bytes) -> str:
+        blob_digest = digest(data)
+        if blob_digest in self:
+            return blob_digest
+
+        path = self._path(blob_digest, self.compression)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent writers of the same blob write the same content, so
+        # the last rename wins without harm.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(_compress(data, self.compression))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return blob_digest
+
+    def get(self, blob_digest: str) -> bytes:
+        found = self._find(blob_digest)
+        if found is None:
+            raise KeyError(blob_digest)
+
+        path, compression = found
+        with open(path, "rb") as blob_file:
+            return _decompress(blob_file.read(), compression)
+
+    def __contains__(self, blob_digest: str) -> bool:
+        return self._find(blob_digest) is not None
+
+
+STORES: tp.Dict[str, tp.Callable[[str], BlobStore]] = {
+    "local": LocalBlobStore
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _store(name: str, location: str) -> BlobStore:
+    return STORES[name](location)
+
+
+def location() -> str:
+    """Return the location of the blob store."""
+    if (blob_location := CFG["blobs"]["location"].value):
+        return str(blob_location)
+    return os.path.join(str(CFG["build_dir"]), ".benchbuild-blobs")
+
+
+def store() -> BlobStore:
+    """The blob store configured in `CFG["blobs"]`."""
+    name = str(CFG["blobs"]["store"])
+    if name not in STORES:
+        raise ValueError(
+            f"Unknown blob store {name}, use one of: {', '.join(STORES)}"
+        )
+    return _store(name, location())
@@ -0,0 +1,297 @@
+"""
+A content-addressed cache of compiled build directories.
+
+Many experiments differ only in their runtime extensions. They compile the
+same project revision with the same compiler and the same flags over and
+over again. The build cache stores a snapshot of the build directory right
+after `Project.compile()` and restores it, if another project instance asks
+for the same build.
+
+A build is identified by:
+    * the project class,
+    * the project revision,
+    * the identity of the configured C/C++ compilers,
+    * the project's cflags and ldflags,
+    * the chain of compiler extensions.
+
+Snapshots are copied with `cp --reflink=auto`. On file systems with reflink
+support (btrfs, xfs) this is almost free, everywhere else we fall back to a
+full copy. We avoid hardlinks on purpose: workloads are free to modify files
+inside their build directory and must never write through to the cache.
+
+The persistent cache is disabled by default, because a cache hit skips the
+compiler extensions of the hitting project. Enable it with
+`BB_BUILD_CACHE_ENABLED` for experiments that do not measure anything at
+compile time.
+
+Independent of the persistent cache, `benchbuild.utils.tasks` lets the
+experiments of a single invocation share identical builds through a
+temporary cache (see `locked`), if `BB_BUILD_CACHE_SHARE` is set.
+
+Not every build can be restored for another project instance. If
+`compile()` leaves state in the project instance, e.g., the compilers it
+created, or pickles the project into its build directory, e.g., for the
+wrappers of `benchbuild.utils.wrapping`, we never store it (see
+`is_portable`). Such builds are excluded from shared caches, so everyone
+compiles them on their own.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import typing as tp
+from contextlib import contextmanager
+
+from plumbum import local
+
+from benchbuild.settings import CFG
+from benchbuild.utils.cmd import cp, rm
+
+if tp.TYPE_CHECKING:
+    import benchbuild.project.Project  # pylint: disable=unused-import
+
+LOG = logging.getLogger(__name__)
+
+
+def path() -> str:
+    """Return the root directory of the build cache."""
+    if (cache_path := CFG["build_cache"]["path"].value):
+        return str(cache_path)
+    return os.path.join(str(CFG["build_dir"]), ".benchbuild-build-cache")
+
+
+def is_enabled() -> bool:
+    return bool(CFG["build_cache"]["enabled"])
+
+
+def _compiler_identity(name: str) -> tp.Dict[str, tp.Any]:
+    env_path = CFG["env"].value.get("PATH", [])
+    search_path = os.pathsep.join(env_path + [os.environ.get("PATH", "")])
+    compiler_path = shutil.which(name, path=search_path)
+    if compiler_path is None:
+        return {"name": name}
+
+    compiler_path = os.path.realpath(compiler_path)
+    stat = os.stat(compiler_path)
+    return {
+        "name": name,
+        "path": compiler_path,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns
+    }
+
+
+def _extension_identity(extension: tp.Any) -> tp.Any:
+    if extension is None:
+        return None
+
+    ext_type = type(extension)
+    return {
+        "type": f"{ext_type.__module__}.{ext_type.__qualname__}",
+        "config": getattr(extension, "config", None),
+        "next": [
+            _extension_identity(ext)
+            for ext in getattr(extension, "next_extensions", [])
+        ]
+    }
+
+
+def key_of(project: "benchbuild.project.Project") -> tp.Dict[str, tp.Any]:
+    """
+    Collect everything that identifies the build of a project.
+
+    Args:
+        project: The project we want to build.
+
+    Returns:
+        A JSON-serializable description of the build.
+    """
+    prj_type = type(project)
+    return {
+        "project": f"{prj_type.__module__}.{prj_type.__qualname__}",
+        "revision": str(project.revision),
+        "cc": _compiler_identity(str(CFG["compiler"]["c"])),
+        "cxx": _compiler_identity(str(CFG["compiler"]["cxx"])),
+        "cflags": list(project.cflags),
+        "ldflags": list(project.ldflags),
+        "compiler_extension": _extension_identity(project.compiler_extension)
+    }
+
+
+def digest_of(project: "benchbuild.project.Project") -> str:
+    """Return the cache address of the project's build."""
+    key = json.dumps(key_of(project), sort_keys=True, default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _copy_tree(src: str, dst: str) -> None:
+    cp("-a", "--reflink=auto", "-T", src, dst)
+
+
+def instance_state(
+    project: "benchbuild.project.Project"
+) -> tp.Dict[str, tp.Any]:
+    """Take a shallow snapshot of the project's attributes."""
+    return dict(vars(project))
+
+
+def is_portable(
+    project: "benchbuild.project.Project", state: tp.Dict[str, tp.Any]
+) -> bool:
+    """
+    Check, if the build of a project can be restored for other projects.
+
+    Args:
+        project: The project we just built.
+        state: The `instance_state` of the project before we built it.
+
+    Returns:
+        False, if the build changed the project's attributes or pickled the
+        project into its build directory, else True.
+    """
+    changed = sorted(
+        name for name, value in vars(project).items()
+        if name not in state or state[name] is not value
+    )
+    if changed:
+        LOG.info(
+            "Not caching the build of %s, compile() sets %s", project.id,
+            ", ".join(changed)
+        )
+        return False
+
+    pickled = f"{project.run_uuid}.project"
+    for _, _, files in os.walk(str(local.path(project.builddir))):
+        if pickled in files:
+            LOG.info(
+                "Not caching the build of %s, it contains wrappers of it.",
+                project.id
+            )
+            return False
+    return True
+
+
+def _excluded(cache_root: str, project: "benchbuild.project.Project") -> str:
+    return os.path.join(cache_root, f"{digest_of(project)}.excluded")
+
+
+def exclude_from(
+    cache_root: str, project: "benchbuild.project.Project"
+) -> None:
+    """
+    Never store or restore the build of a project in the given cache.
+
+    Args:
+        cache_root: The cache we exclude the build from.
+        project: The project with a build that is not portable.
+    """
+    os.makedirs(cache_root, exist_ok=True)
+    with open(_excluded(cache_root, project), 'w'):
+        pass
+
+
+def restore_from(
+    cache_root: str, project: "benchbuild.project.Project"
+) -> bool:
+    """
+    Restore the build directory of a project from the given cache.
+
+    Args:
+        cache_root: The cache we look into.
+        project: The project we want to build.
+
+    Returns:
+        True, if we found a snapshot of the build, else False.
+    """
+    snapshot = os.path.join(cache_root, digest_of(project))
+    if not os.path.isdir(snapshot) or \
+            os.path.exists(_excluded(cache_root, project)):
+        return False
+
+    builddir = str(local.path(project.builddir))
+    LOG.info("Restoring build of %s from %s", project.id, snapshot)
+    rm("-rf", builddir)
+    _copy_tree(snapshot, builddir)
+    return True
+
+
+def store_in(cache_root: str, project: "benchbuild.project.Project") -> None:
+    """
+    Store a snapshot of the project's build directory in the given cache.
+
+    Concurrent writers of the same snapshot do not interfere: Every writer
+    copies into a private directory first and the first rename wins.
+
+    Args:
+        cache_root: The cache we store the snapshot in.
+        project: The project we just built.
+    """
+    digest = digest_of(project)
+    snapshot = os.path.join(cache_root, digest)
+    if os.path.isdir(snapshot) or \
+            os.path.exists(_excluded(cache_root, project)):
+        return
+
+    os.makedirs(cache_root, exist_ok=True)
+    staging = os.path.join(cache_root, f".{digest}.{os.getpid()}")
+    _copy_tree(str(local.path(project.builddir)), staging)
+    with open(os.path.join(cache_root, f"{digest}.json"), 'w') as key_file:
+        json.dump(key_of(project), key_file, indent=2, default=str)
+
+    try:
+        os.rename(staging, snapshot)
+        LOG.info("Stored build of %s in %s", project.id, snapshot)
+    except OSError:
+        LOG.debug("Build of %s already stored by someone else.", project.id)
+        rm("-rf", staging)
+
+
+def restore(project: "benchbuild.project.Project") -> bool:
+    """
+    Restore the build directory of a project from the build cache.
+
+    Args:
+        project: The project we want to build.
+
+    Returns:
+        True, if we found a snapshot of the build, else False.
+    """
+    if not is_enabled():
+        return False
+    return restore_from(path(), project)
+
+
+def store(project: "benchbuild.project.Project") -> None:
+    """
+    Store a snapshot of the project's build directory in the build cache.
+
+    Args:
+        project: The project we just built.
+    """
+    if is_enabled():
+        store_in(path(), project)
+
+
+@contextmanager
+def locked(cache_root: str,
+           project: "benchbuild.project.Project") -> tp.Iterator[None]:
+    """
+    Hold an exclusive lock on the project's build in the given cache.
+
+    The first process that takes the lock builds, everyone else waits for
+    the lock and restores the result.
+
+    Args:
+        cache_root: The cache that holds the build.
+        project: The project we want to build.
+    """
+    os.makedirs(cache_root, exist_ok=True)
+    lock_path = os.path.join(cache_root, f"{digest_of(project)}.lock")
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,250 @@
+"""
+Stream the output of tracked binaries to (compressed) files.
+
+Some binaries print gigabytes to stdout or stderr. Instead of buffering
+everything in memory, `StreamCapture` writes the output to disk while the
+binary runs and keeps only the first and the last few bytes in memory.
+That is all we store in the database (see `CapturedOutput.__str__`).
+
+The files are compressed with gzip or, if the optional `zstandard` package
+is installed, with zstd. Large outputs can be split into segments of a
+fixed (uncompressed) size, of which only the newest ones are kept:
+
+    <binary>.stderr.gz, <binary>.stderr.1.gz, <binary>.stderr.2.gz, ...
+
+Use `read_lines` to read a captured stream back, regardless of its
+compression and segmentation.
+"""
+import codecs
+import collections
+import glob
+import gzip
+import importlib.util
+import logging
+import os
+import re
+import typing as tp
+
+import attr
+
+from benchbuild.settings import CFG
+
+LOG = logging.getLogger(__name__)
+
+EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def _open(path: str, mode: str) -> tp.IO[bytes]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=6)
+    if path.endswith(".zst"):
+        import zstandard  # pylint: disable=import-outside-toplevel
+        return zstandard.open(path, mode)
+    return open(path, mode)
+
+
+def _compression(name: str) -> str:
+    if name not in EXTENSIONS:
+        raise ValueError(f"Unknown compression {name}, use none, gzip, zstd")
+    if name == "zstd" and importlib.util.find_spec("zstandard") is None:
+        LOG.warning("zstandard is not installed, falling back to gzip.")
+        return "gzip"
+    return name
+
+
+def segments(path: str) -> tp.List[str]:
+    """
+    Find all segments of a captured stream on disk, oldest first.
+
+    Args:
+        path: The path of the stream without segment number and extension.
+    """
+    pattern = re.compile(
+        re.escape(path) + r"(?:\.(\d+))?(?:\.gz|\.zst)?$"
+    )
+    found = []
+    for candidate in glob.glob(glob.escape(path) + "*"):
+        if (match := pattern.match(candidate)):
+            found.append((int(match.group(1) or 0), candidate))
+    return [candidate for _, candidate in sorted(found)]
+
+
+def read_lines(path: str) -> tp.Iterator[str]:
+    """
+    Read a captured stream line by line.
+
+    Args:
+        path: The path of the stream without segment number and extension,
+            e.g., `<binary>.stderr`.
+    """
+    partial = b""
+    for segment in segments(path):
+        with _open(segment, "rb") as stream:
+            for line in stream:
+                # Segments are cut at a fixed size, not at line ends.
+                if not line.endswith(b"\n"):
+                    partial += line
+                    continue
+                yield (partial + line).decode(errors="replace")
+                partial = b""
+    if partial:
+        yield partial.decode(errors="replace")
+
+
+@attr.s(frozen=True)
+class CapturedOutput:
+    """
+    The output of a binary, stored on disk.
+
+    Attributes:
+        path: The path of the stream on disk, None if it lives in memory.
+        head: The first bytes of the output.
+        tail: The last bytes of the output that are not part of `head`.
+        size: The total number of bytes of the output.
+    """
+    path: tp.Optional[str] = attr.ib()
+    head: bytes = attr.ib(repr=False)
+    tail: bytes = attr.ib(repr=False)
+    size: int = attr.ib()
+
+    @property
+    def truncated(self) -> bool:
+        """Check, if we did not keep all of the output in memory."""
+        return self.size > len(self.head) + len(self.tail)
+
+    def lines(self) -> tp.Iterator[str]:
+        """Read the complete output line by line."""
+        if self.path is None:
+            yield from str(self).splitlines(keepends=True)
+        else:
+            yield from read_lines(self.path)
+
+    def __str__(self) -> str:
+        head = self.head.decode(errors="replace")
+        tail = self.tail.decode(errors="replace")
+        if not self.truncated:
+            return head + tail
+        omitted = self.size - len(self.head) - len(self.tail)
+        if self.path is None:
+            marker = f"[... {omitted} bytes omitted ...]"
+        else:
+            marker = f"[... {omitted} bytes omitted, see {self.path} ...]"
+        return f"{head}\n{marker}\n{tail}"
+
+
+class StreamCapture:
+    """
+    Capture a stream in bounded memory.
+
+    All settings default to `CFG["capture"]`.
+
+    Args:
+        path: Write the stream to this path (plus segment number and
+            extension). Without a path, we keep only the head and the tail.
+        echo: Also write the stream to this text stream.
+        head: The number of bytes we keep from the start.
+        tail: The number of bytes we keep from the end.
+        compression: none, gzip or zstd.
+        segment_size: Start a new segment after this many bytes,
+            0 writes a single file.
+        keep: Keep only this many segments, 0 keeps all of them.
+    """
+
+    def __init__(
+        self,
+        path: tp.Optional[str] = None,
+        echo: tp.Optional[tp.TextIO] = None,
+        head: tp.Optional[int] = None,
+        tail: tp.Optional[int] = None,
+        compression: tp.Optional[str] = None,
+        segment_size: tp.Optional[int] = None,
+        keep: tp.Optional[int] = None
+    ) -> None:
+        cfg = CFG["capture"]
+        self.path = path
+        self.echo = echo
+        self.head_size = int(head if head is not None else cfg["head"])
+        self.tail_size = int(tail if tail is not None else cfg["tail"])
+        if compression is None:
+            compression = str(cfg["compression"])
+        self.extension = EXTENSIONS[_compression(compression)]
+        self.segment_size = int(
+            segment_size if segment_size is not None else cfg["segment_size"]
+        )
+        self.keep = int(keep if keep is not None else cfg["keep"])
+
+        # Reads may split multibyte characters, the decoder joins them.
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._size = 0
+        self._segments: tp.Deque[str] = collections.deque()
+        self._file: tp.Optional[tp.IO[bytes]] = None
+        self._number = 0
+        self._written = 0
+
+        if path is not None:
+            for stale in segments(path):
+                os.remove(stale)
+            self._next_segment()
+
+    def _next_segment(self) -> None:
+        assert self.path is not None
+        if self._file is not None:
+            self._file.close()
+
+        number = self._number
+        self._number += 1
+        name = self.path if number == 0 else f"{self.path}.{number}"
+        segment = name + self.extension
+        self._segments.append(segment)
+        self._file = _open(segment, "wb")
+        self._written = 0
+
+        while self.keep > 0 and len(self._segments) > self.keep:
+            os.remove(self._segments.popleft())
+
+    def write(self, data: bytes) -> None:
+        """Add a chunk of the stream."""
+        if self.echo is not None:
+            self.echo.write(self._decoder.decode(data))
+            self.echo.flush()
+
+        self._size += len(data)
+        missing = self.head_size - len(self._head)
+        if missing > 0:
+            self._head.extend(data[:missing])
+            rest = data[missing:]
+        else:
+            rest = data
+        self._tail.extend(rest)
+        if len(self._tail) > self.tail_size:
+            del self._tail[:len(self._tail) - self.tail_size]
+        if self.path is None:
+            return
+
+        while data:
+            if self.segment_size > 0 and self._written >= self.segment_size:
+                self._next_segment()
+            chunk = data
+            if self.segment_size > 0:
+                chunk = data[:self.segment_size - self._written]
+            assert self._file is not None
+            self._file.write(chunk)
+            self._written += len(chunk)
+            data = data[len(chunk):]
+
+    def close(self) -> CapturedOutput:
+        """Finish the capture."""
+        if self.echo is not None:
+            self.echo.write(self._decoder.decode(b"", final=True))
+            self.echo.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return CapturedOutput(
+            path=self.path,
+            head=bytes(self._head),
+            tail=bytes(self._tail),
+            size=self._size
+        )
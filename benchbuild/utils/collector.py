@@ -0,0 +1,307 @@
+"""
+A single writer for all processes of a benchbuild invocation.
+
+Every compiler wrapper and every wrapped binary is a process of its own.
+Without help, each of them connects to the database, probes the schema and
+writes its few rows on a connection of its own. A parallel build of a large
+project thereby opens one connection per translation unit.
+
+While benchbuild executes a plan, it serves a collector on a Unix domain
+socket instead. Wrappers send their rows to the collector and the
+collector writes them with the `writer.BatchWriter` of the benchbuild
+process, i.e., on its pooled connection.
+
+The path of the active collector is published as `CFG["db"]["collector"]`
+(BB_DB_COLLECTOR). Without an active collector, processes connect to the
+database themselves.
+
+Messages are pickled and prefixed with their length. The socket lives in
+a directory that only we can access.
+
+Example:
+```python
+with collector.serve():
+    ...
+```
+"""
+import atexit
+import errno
+import logging
+import os
+import pickle
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import typing as tp
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+
+from benchbuild.settings import CFG
+from benchbuild.utils import writer
+
+LOG = logging.getLogger(__name__)
+
+HEADER = struct.Struct("!I")
+
+
+def _send(sock: socket.socket, message: tp.Any) -> None:
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _read(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("Connection closed by peer.")
+        data += chunk
+    return bytes(data)
+
+
+def _receive(sock: socket.socket) -> tp.Any:
+    size, = HEADER.unpack(_read(sock, HEADER.size))
+    return pickle.loads(_read(sock, size))
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Answer the requests of a single client, until it disconnects."""
+
+    def handle(self) -> None:
+        while True:
+            try:
+                operation, args = _receive(self.request)
+            except EOFError:
+                return
+
+            try:
+                reply = ("ok", self.server.dispatch(operation, *args))
+            except Exception as ex:  # pylint: disable=broad-except
+                LOG.error("Collector failed on '%s': %s", operation, ex)
+                reply = ("error", f"{type(ex).__name__}: {ex}")
+            _send(self.request, reply)
+
+
+class Collector(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Write the rows of our clients to the database.
+
+    Args:
+        path: Path of the socket we listen on.
+        batch: The writer we queue all rows in.
+    """
+    daemon_threads = True
+
+    def __init__(self, path: str, batch: writer.BatchWriter) -> None:
+        super().__init__(path, _Handler)
+        self.batch = batch
+        self.operations: tp.Dict[str, tp.Callable[..., tp.Any]] = {
+            "insert": self.insert,
+            "write": self.write,
+            "flush": batch.flush,
+            "persist_project": self.persist_project
+        }
+
+    def dispatch(self, operation: str, *args: tp.Any) -> tp.Any:
+        if operation not in self.operations:
+            raise ValueError(f"Unknown operation: {operation}")
+        return self.operations[operation](*args)
+
+    def _table(self, name: str) -> sa.Table:
+        # pylint: disable=import-outside-toplevel
+        from benchbuild.utils import schema
+        return schema.BASE.metadata.tables[name]
+
+    def insert(self, table: str, row: writer.Row) -> tp.Tuple[tp.Any, ...]:
+        """Write a row right away and return its primary key."""
+        with self.batch.connection() as connection:
+            result = connection.execute(self._table(table).insert(), row)
+        return tuple(result.inserted_primary_key)
+
+    def write(
+        self, inserts: tp.Dict[str, tp.List[writer.Row]],
+        updates: tp.List[tp.Tuple[str, writer.Row]]
+    ) -> None:
+        """Queue the rows a client collected."""
+        self.batch.put({
+            self._table(table): rows for table, rows in inserts.items()
+        }, [(self._table(table), row) for table, row in updates])
+
+    def persist_project(self, values: writer.Row) -> None:
+        """Insert or update a project, see `db.persist_project`."""
+        # pylint: disable=import-outside-toplevel
+        from sqlalchemy.orm import Session
+
+        from benchbuild.utils import db
+
+        with self.batch.connection() as connection:
+            db.store_project(Session(bind=connection), values)
+
+
+class Client:
+    """
+    Client of a collector.
+
+    Args:
+        path: Path of the socket the collector listens on.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.connect(path)
+        except OSError:
+            self._sock.close()
+            raise
+        self._lock = threading.Lock()
+
+    def call(self, operation: str, *args: tp.Any) -> tp.Any:
+        """
+        Run an operation of the collector and wait for its result.
+
+        Raises:
+            RuntimeError: If the collector failed to run the operation.
+        """
+        with self._lock:
+            _send(self._sock, (operation, args))
+            status, result = _receive(self._sock)
+        if status != "ok":
+            raise RuntimeError(f"Collector failed: {result}")
+        return result
+
+    def insert(self, obj: tp.Any) -> tp.Tuple[tp.Any, ...]:
+        """Write a new ORM object right away and return its primary key."""
+        table = sa.inspect(obj).mapper.local_table
+        return self.call("insert", table.name, writer.values(obj))
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+class RemoteWriter(writer.BatchWriter):
+    """
+    A `writer.BatchWriter` that hands its rows to a collector.
+
+    Rows are sent when flushed, at the latest when the process exits.
+    Flushing also makes the collector write them, so that the database
+    holds them afterwards.
+
+    Args:
+        client: The client of the collector.
+    """
+
+    def __init__(self, client: Client) -> None:
+        super().__init__(None, threaded=False)
+        self.client = client
+
+    def _send(
+        self, inserts: tp.Dict[sa.Table, tp.List[writer.Row]],
+        updates: tp.List[tp.Tuple[sa.Table, writer.Row]]
+    ) -> None:
+        self.client.call(
+            "write", {table.name: rows for table, rows in inserts.items()},
+            [(table.name, row) for table, row in updates]
+        )
+
+    def flush(self) -> None:
+        super().flush()
+        self.client.call("flush")
+
+
+_SERVING: tp.Dict[str, int] = {}
+_CLIENTS: tp.Dict[str, tp.Optional[Client]] = {}
+_WRITERS: tp.Dict[str, RemoteWriter] = {}
+
+
+def current() -> tp.Optional[Client]:
+    """
+    Get a client for the collector configured for this process.
+
+    Returns:
+        The client, or None, if no collector is active or this process
+        serves it itself.
+    """
+    path = CFG["db"]["collector"].value
+    if not path:
+        return None
+
+    path = str(path)
+    if _SERVING.get(path) == os.getpid():
+        return None
+    if path not in _CLIENTS:
+        try:
+            _CLIENTS[path] = Client(path)
+        except OSError as err:
+            if err.errno not in (errno.ENOENT, errno.ECONNREFUSED):
+                raise
+            LOG.warning(
+                "Collector %s vanished, connecting to the database.", path
+            )
+            _CLIENTS[path] = None
+    return _CLIENTS[path]
+
+
+def remote_writer() -> RemoteWriter:
+    """The writer of this process for the active collector."""
+    client = current()
+    if client is None:
+        raise RuntimeError("No collector is active.")
+    if client.path not in _WRITERS:
+        _WRITERS[client.path] = RemoteWriter(client)
+        atexit.register(_WRITERS[client.path].close)
+    return _WRITERS[client.path]
+
+
+@contextmanager
+def serve() -> tp.Iterator[tp.Optional[str]]:
+    """
+    Collect the rows of all processes we start within this context.
+
+    If a collector is already active, e.g., because we have been started
+    by a parent benchbuild, we reuse it. Databases other processes cannot
+    reach, i.e., in-memory or rolled back ones, are not served.
+
+    Yields:
+        The path of the socket of the collector, or None.
+    """
+    if not CFG["db"]["enabled"]:
+        yield None
+        return
+
+    if current() is not None:
+        yield str(CFG["db"]["collector"])
+        return
+
+    batch = writer.writer()
+    if not batch.threaded:
+        yield None
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix="benchbuild-collector-")
+    path = os.path.join(tmp_dir, "socket")
+    server = Collector(path, batch)
+    thread = threading.Thread(
+        target=server.serve_forever, name="db-collector", daemon=True
+    )
+    thread.start()
+
+    _SERVING[path] = os.getpid()
+    CFG["db"]["collector"] = path
+    os.environ["BB_DB_COLLECTOR"] = path
+    LOG.debug("Collecting database rows on %s", path)
+    try:
+        yield path
+    finally:
+        CFG["db"]["collector"] = None
+        os.environ.pop("BB_DB_COLLECTOR", None)
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        del _SERVING[path]
+        os.unlink(path)
+        os.rmdir(tmp_dir)
+        batch.flush()
@@ -15,6 +15,9 @@ to the real clang/clang++ given the additional cflags&ldflags.
 The wrapper-script generated for both functions can be found inside:
     * wrap_cc()
 
+While the real compiler runs, the wrapper holds a token of the active
+job server (see `benchbuild.utils.jobserver`).
+
 Are just convencience methods that can be used when interacting with the
 configured llvm/clang source directories.
 """
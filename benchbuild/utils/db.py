@@ -1,10 +1,35 @@
 """Database support module for the benchbuild study."""
+import collections
+import datetime
+import hashlib
 import logging
+import typing as tp
+import weakref
 
 from benchbuild.settings import CFG
 
 LOG = logging.getLogger(__name__)
 
+#: Settings that describe this process, not the configuration of a run.
+#: The tags of interleaved executions are stored with each run, too.
+VOLATILE_CONFIG = frozenset((
+    "BB_DB_RUN_ID", "BB_DB_COLLECTOR", "BB_DB_SPOOL", "BB_JOBSERVER_FIFO",
+    "BB_INTERLEAVE_PAIR", "BB_INTERLEAVE_VARIANT"
+))
+
+#: Metrics that mark runs whose measurements do not count, e.g., warm-ups.
+RUN_MARKS = ("time.warmup", "time.outlier")
+
+#: Statistics `persist_time_summary` derives from the runs of a group.
+TIME_SUMMARIES = ("median", "trimmed_mean", "mad")
+
+# The rows of projects and experiments this process stored, by primary key.
+_PERSISTED: tp.Dict[tp.Tuple[tp.Any, ...], tp.Dict[str, tp.Any]] = {}
+
+# The configuration snapshots we stored, per session.
+_SNAPSHOTS: tp.MutableMapping[tp.Any, tp.Set[str]] = \
+    weakref.WeakKeyDictionary()
+
 
 def validate(func):
 
@@ -18,6 +43,28 @@ def validate(func):
     return validate_run_func
 
 
+def session():
+    """
+    The session tracked runs write their results to.
+
+    Within an active collector, this is a writer that sends all rows to
+    the collector. With `CFG["db"]["write_behind"]`, this is the
+    `writer.BatchWriter` of this process, otherwise the shared
+    `schema.Session`.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import collector
+    if collector.current() is not None:
+        return collector.remote_writer()
+
+    if CFG["db"]["write_behind"]:
+        from benchbuild.utils import writer
+        return writer.writer()
+
+    from benchbuild.utils import schema as s
+    return s.Session()
+
+
 def create_run(cmd, project, exp, grp):
     """
     Create a new 'run' in the database.
@@ -33,26 +80,51 @@ def create_run(cmd, project, exp, grp):
         exp: The experiment this run belongs to.
         grp: The run_group (uuid) we blong to.
 
+    The run is written right away, because we need its id. Everything
+    else goes through `session()`. Within an active collector, the
+    collector writes the run for us.
+
     Returns:
         The inserted tuple representing the run and the session opened with
         the new run. Don't forget to commit it at some point.
     """
     # pylint: disable=import-outside-toplevel
+    from sqlalchemy.orm import make_transient_to_detached
+
+    from benchbuild.utils import collector
     from benchbuild.utils import schema as s
 
-    session = s.Session()
     run = s.Run(
         command=str(cmd),
         project_name=project.name,
         project_group=project.group,
         experiment_name=exp.name,
         run_group=str(grp),
-        experiment_group=exp.id
+        experiment_group=exp.id,
+        begin=datetime.datetime.now(),
+        status='running'
     )
-    session.add(run)
-    session.commit()
+    client = collector.current()
+    if client is not None:
+        run.id, = client.insert(run)
+        make_transient_to_detached(run)
+        return (run, session())
+
+    db_session = s.Session()
+    db_session.add(run)
+    # We just wrote all values of the run, no need to load them again.
+    expire_on_commit, db_session.expire_on_commit = \
+        db_session.expire_on_commit, False
+    try:
+        db_session.commit()
+    finally:
+        db_session.expire_on_commit = expire_on_commit
 
-    return (run, session)
+    if CFG["db"]["write_behind"]:
+        # The writer stores all changes of the run from now on.
+        db_session.expunge(run)
+        return (run, session())
+    return (run, db_session)
 
 
 def create_run_group(prj, experiment):
@@ -76,57 +148,120 @@ def create_run_group(prj, experiment):
     from benchbuild.utils import schema as s
 
     session = s.Session()
-    group = s.RunGroup(id=prj.run_uuid, experiment=experiment.id)
+    group = s.RunGroup(
+        id=prj.run_uuid,
+        experiment=experiment.id,
+        begin=datetime.datetime.now(),
+        status='running'
+    )
     session.add(group)
     session.commit()
 
     return (group, session)
 
 
-def persist_project(project):
+def project_values(project):
     """
-    Persist this project in the benchbuild database.
+    The row of the project table for this project.
 
     Args:
         project: The project we want to persist.
     """
-    from benchbuild.utils.schema import Project, Session
-    session = Session()
-    projects = session.query(Project) \
-        .filter(Project.name == project.name) \
-        .filter(Project.group_name == project.group)
-
-    name = project.name
-    desc = project.__doc__
-    domain = str(project.domain)
-    group_name = str(project.group)
-    version = str(project.revision)
     try:
         src_url = project.src_uri
     except AttributeError:
         src_url = 'unknown'
 
-    if projects.count() == 0:
-        newp = Project()
-        newp.name = name
-        newp.description = desc
-        newp.src_url = src_url
-        newp.domain = domain
-        newp.group_name = group_name
-        newp.version = version
-        session.add(newp)
-    else:
-        newp_value = {
-            "name": name,
-            "description": desc,
-            "src_url": src_url,
-            "domain": domain,
-            "group_name": group_name,
-            "version": version
-        }
-        projects.update(newp_value)
+    return {
+        "name": project.name,
+        "description": project.__doc__,
+        "src_url": src_url,
+        "domain": str(project.domain),
+        "group_name": str(project.group),
+        "version": str(project.revision)
+    }
+
+
+def _upsert(session, model, values):
+    """Insert a row of a model, or update it, if it exists already."""
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import schema as s
 
+    stmt = s.upsert(model.__table__, session.get_bind().dialect, values)
+    if stmt is None:
+        session.merge(model(**values))
+    else:
+        session.execute(stmt, values)
     session.commit()
+
+
+def _persisted_key(table, values):
+    return (table.name,) + tuple(
+        values[column.name] for column in table.primary_key
+    )
+
+
+def _is_persisted(table, values):
+    """Did this process store exactly these values already?"""
+    return _PERSISTED.get(_persisted_key(table, values)) == values
+
+
+def _mark_persisted(table, values):
+    _PERSISTED[_persisted_key(table, values)] = dict(values)
+
+
+def store_project(session, values):
+    """
+    Insert or update a row of the project table.
+
+    Args:
+        session: The db transaction we belong to.
+        values: The row, see `project_values`.
+
+    Returns:
+        The query for the stored project.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils.schema import Project
+
+    _upsert(session, Project, values)
+    return session.query(Project) \
+        .filter(Project.name == values["name"]) \
+        .filter(Project.group_name == values["group_name"])
+
+
+def persist_project(project):
+    """
+    Persist this project in the benchbuild database.
+
+    Within an active collector, the collector stores the project for us.
+    Projects this process persisted already are not stored again, unless
+    they changed.
+
+    Args:
+        project: The project we want to persist.
+
+    Returns:
+        The query for the stored project and the session, or (None, None),
+        if the collector stored it or it was stored already.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import collector
+    from benchbuild.utils.schema import Project, Session
+
+    values = project_values(project)
+    if _is_persisted(Project.__table__, values):
+        return (None, None)
+
+    client = collector.current()
+    if client is not None:
+        client.call("persist_project", values)
+        _mark_persisted(Project.__table__, values)
+        return (None, None)
+
+    session = Session()
+    projects = store_project(session, values)
+    _mark_persisted(Project.__table__, values)
     return (projects, session)
 
 
@@ -134,40 +269,31 @@ def persist_experiment(experiment):
     """
     Persist this experiment in the benchbuild database.
 
+    Experiments this process persisted already are not stored again,
+    unless they changed.
+
     Args:
         experiment: The experiment we want to persist.
+
+    Returns:
+        The stored experiment and the session.
     """
     # pylint: disable=import-outside-toplevel
-    from sqlalchemy.exc import IntegrityError
-
     from benchbuild.utils.schema import Experiment, Session
 
     session = Session()
 
-    cfg_exp = experiment.id
-    LOG.debug("Using experiment ID stored in config: %s", cfg_exp)
-    exps = session.query(Experiment).filter(Experiment.id == cfg_exp)
-    desc = str(CFG["experiment_description"])
-    name = experiment.name
-
-    if exps.count() == 0:
-        newe = Experiment()
-        newe.id = cfg_exp
-        newe.name = name
-        newe.description = desc
-        session.add(newe)
-        ret = newe
-    else:
-        exps.update({'name': name, 'description': desc})
-        ret = exps.first()
-
-    try:
-        session.commit()
-    except IntegrityError:
-        session.rollback()
-        persist_experiment(experiment)
+    LOG.debug("Using experiment ID stored in config: %s", experiment.id)
+    values = {
+        "id": experiment.id,
+        "name": experiment.name,
+        "description": str(CFG["experiment_description"])
+    }
+    if not _is_persisted(Experiment.__table__, values):
+        _upsert(session, Experiment, values)
+        _mark_persisted(Experiment.__table__, values)
 
-    return (ret, session)
+    return (session.get(Experiment, experiment.id), session)
 
 
 @validate
@@ -195,6 +321,76 @@ def persist_time(run, session, timings):
         )
 
 
+def persist_rusage(run, session, rusage):
+    """
+    Persist the resource usage of a run in the database.
+
+    All values are added in a single batch.
+
+    Args:
+        run: The run we attach the resource usage to.
+        session: The db transaction we belong to.
+        rusage: The `benchbuild.utils.run.ResourceUsage` of the run.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import schema as s
+
+    session.add_all([
+        s.Metric(name=name, value=value, run_id=run.id)
+        for name, value in rusage.as_metrics().items()
+    ])
+
+
+def persist_timeseries(run, session, series):
+    """
+    Persist sampled time series of a run in the database.
+
+    Args:
+        run: The run we attach the series to.
+        session: The db transaction we belong to.
+        series: Maps the name of a series to its samples, see
+            `benchbuild.utils.sampler.ResourceSampler`.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import sampler
+    from benchbuild.utils import schema as s
+
+    session.add_all([
+        s.TimeSeries(
+            run_id=run.id,
+            name=name,
+            unit=sampler.UNITS.get(name),
+            samples=len(values),
+            data=sampler.encode(values)
+        ) for name, values in series.items()
+    ])
+
+
+def persist_time_summary(run, session, summary):
+    """
+    Persist a robust summary of repeated timings in the database.
+
+    Args:
+        run: The run we attach the summary to.
+        session: The db transaction we belong to.
+        summary: For every time metric, a mapping of statistic to value,
+            and the number of outliers as `time.outliers`.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import schema as s
+
+    for metric, statistics in summary.items():
+        if not isinstance(statistics, dict):
+            session.add(s.Metric(name=metric, value=statistics, run_id=run.id))
+            continue
+        for statistic, value in statistics.items():
+            session.add(
+                s.Metric(
+                    name=f"{metric}.{statistic}", value=value, run_id=run.id
+                )
+            )
+
+
 def persist_perf(run, session, svg_path):
     """
     Persist the flamegraph in the database.
@@ -213,8 +409,247 @@ def persist_perf(run, session, svg_path):
     with open(svg_path, 'r') as svg_file:
         svg_data = svg_file.read()
         session.add(
-            s.Metadata(name="perf.flamegraph", value=svg_data, run_id=run.id)
+            s.Metadata(
+                name="perf.flamegraph",
+                value=offload(run, session, "perf.flamegraph", svg_data),
+                run_id=run.id
+            )
+        )
+
+
+def persist_metrics(run, session, metrics):
+    """
+    Persist named metrics of a run in the database.
+
+    Args:
+        run: The run we attach the metrics to.
+        session: The db transaction we belong to.
+        metrics: Maps the name of a metric to its value.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import schema as s
+
+    session.add_all([
+        s.Metric(name=name, value=value, run_id=run.id)
+        for name, value in metrics.items()
+    ])
+
+
+def persist_likwid(run, session, measurements):
+    """
+    Persist likwid's measurements in the database.
+
+    All measurements are inserted with a single bulk INSERT.
+
+    Args:
+        run: The run we attach the measurements to.
+        session: The db transaction we belong to.
+        measurements: The `benchbuild.likwid.Measurements` of the run.
+    """
+    # pylint: disable=import-outside-toplevel
+    import sqlalchemy as sa
+
+    from benchbuild.utils import schema as s
+
+    if not len(measurements):
+        return
+    session.execute(
+        sa.insert(s.Metric), [{
+            "name": name,
+            "value": value,
+            "run_id": run.id
+        } for name, value in zip(
+            measurements.names(), measurements.values.tolist()
+        )]
+    )
+
+
+def metric_statistics(names, values):
+    """
+    Compute the statistics of each metric in bulk.
+
+    Args:
+        names: The name of the metric of each value.
+        values: The values.
+
+    Returns:
+        Maps the name of each metric to its count, min, max, mean, median
+        and sample standard deviation. The latter is None for single values.
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    values = np.asarray(values, dtype=float)
+    if not values.size:
+        return {}
+
+    keys, groups = np.unique(np.asarray(names, dtype=object),
+                             return_inverse=True)
+    order = np.lexsort((values, groups))
+    values, groups = values[order], groups[order]
+
+    counts = np.bincount(groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ends = starts + counts - 1
+    means = np.bincount(groups, weights=values) / counts
+    squares = np.bincount(groups, weights=(values - means[groups])**2)
+    medians = (values[starts + (counts - 1) // 2] +
+               values[starts + counts // 2]) / 2
+    stddevs = np.sqrt(squares / np.maximum(counts - 1, 1))
+
+    return {
+        str(name): {
+            "count": int(counts[i]),
+            "min": float(values[starts[i]]),
+            "max": float(values[ends[i]]),
+            "mean": float(means[i]),
+            "median": float(medians[i]),
+            "stddev": float(stddevs[i]) if counts[i] > 1 else None
+        } for i, name in enumerate(keys)
+    }
+
+
+def _is_time_summary(name: str) -> bool:
+    if name == "time.outliers":
+        return True
+    metric, _, statistic = name.rpartition(".")
+    return metric.startswith("time.") and statistic in TIME_SUMMARIES
+
+
+def summarize_run_group(session, run_group):
+    """
+    Store the statistics of all metrics of a run group.
+
+    Existing statistics of the run group are replaced, see
+    `schema.MetricSummary`. Runs marked with one of `RUN_MARKS`, e.g.,
+    warm-ups and outliers, do not count. Neither do the marks themselves
+    and the summaries of `persist_time_summary`.
+
+    Args:
+        session: The db transaction we belong to.
+        run_group: The id of the run group.
+
+    Returns:
+        The rows we stored.
+    """
+    # pylint: disable=import-outside-toplevel
+    import sqlalchemy as sa
+    from sqlalchemy.orm import aliased
+
+    from benchbuild.utils import schema as s
+
+    marks = aliased(s.Metric)
+    rows = session.execute(
+        sa.select(
+            s.Run.experiment_group, s.Run.project_name, s.Run.project_group,
+            s.Metric.name, s.Metric.value
+        ).join(s.Metric, s.Metric.run_id == s.Run.id).where(
+            s.Run.run_group == run_group, s.Metric.value.isnot(None),
+            ~sa.exists().where(
+                marks.run_id == s.Run.id, marks.name.in_(RUN_MARKS)
+            )
         )
+    ).all()
+    rows = [row for row in rows if not _is_time_summary(row.name)]
+
+    session.execute(
+        sa.delete(s.MetricSummary).where(
+            s.MetricSummary.run_group == run_group
+        )
+    )
+    if not rows:
+        return []
+
+    experiment_group, project_name, project_group = rows[0][:3]
+    statistics = metric_statistics([row.name for row in rows],
+                                   [row.value for row in rows])
+    summaries = [{
+        "run_group": run_group,
+        "name": name,
+        "experiment_group": experiment_group,
+        "project_name": project_name,
+        "project_group": project_group,
+        **stats
+    } for name, stats in statistics.items()]
+    session.execute(sa.insert(s.MetricSummary), summaries)
+    return summaries
+
+
+def persist_folded_stacks(run, session, stacks, event):
+    """
+    Persist a perf profile as folded stacks.
+
+    Stacks that are already known are not stored again.
+
+    Args:
+        run: The run we attach the profile to.
+        session: The db transaction we belong to.
+        stacks: The number of samples per folded stack.
+        event: The event perf sampled.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import perf
+    from benchbuild.utils import schema as s
+
+    counts = {perf.stack_id(stack): count for stack, count in stacks.items()}
+    frames = {perf.stack_id(stack): stack for stack in stacks}
+    known: tp.Set[int] = set()
+    ids = list(frames)
+    for i in range(0, len(ids), 500):
+        known.update(
+            stack_id for (stack_id,) in session.query(s.PerfStack.id).
+            filter(s.PerfStack.id.in_(ids[i:i + 500]))
+        )
+    session.add_all([
+        s.PerfStack(id=stack_id, frames=frames[stack_id])
+        for stack_id in ids
+        if stack_id not in known
+    ])
+    session.add(
+        s.PerfProfile(
+            run_id=run.id,
+            event=event,
+            samples=sum(counts.values()),
+            data=perf.pack(counts)
+        )
+    )
+
+
+def fetch_folded_stacks(session, run_ids, event=None):
+    """
+    Fetch the perf profiles of runs as folded stacks.
+
+    The profiles of all runs are added up.
+
+    Args:
+        session: The db transaction we belong to.
+        run_ids: The runs we fetch the profiles of.
+        event: Only fetch profiles of this event.
+
+    Returns:
+        The number of samples per folded stack.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import perf
+    from benchbuild.utils import schema as s
+
+    query = session.query(s.PerfProfile).filter(
+        s.PerfProfile.run_id.in_(list(run_ids))
+    )
+    if event is not None:
+        query = query.filter(s.PerfProfile.event == event)
+
+    counts: tp.Counter[int] = collections.Counter()
+    for profile in query:
+        counts.update(perf.unpack(profile.data))
+
+    stacks = {}
+    ids = list(counts)
+    for i in range(0, len(ids), 500):
+        for stack in session.query(s.PerfStack).filter(
+            s.PerfStack.id.in_(ids[i:i + 500])
+        ):
+            stacks[stack.frames] = counts[stack.id]
+    return stacks
 
 
 def persist_compilestats(run, session, stats):
@@ -241,7 +676,185 @@ def persist_config(run, session, cfg):
         cfg: The configuration we want to persist.
     """
     # pylint: disable=import-outside-toplevel
+    import sqlalchemy as sa
+
+    from benchbuild.utils import schema as s
+
+    if not cfg:
+        return
+    session.execute(
+        sa.insert(s.Config), [{
+            "name": name,
+            "value": cfg[name],
+            "run_id": run.id
+        } for name in cfg]
+    )
+
+
+def _insert(session, table, rows):
+    """Bulk INSERT that skips existing rows of write-once tables."""
+    # pylint: disable=import-outside-toplevel
+    import sqlalchemy as sa
+
+    from benchbuild.utils import schema as s
+    from benchbuild.utils import writer
+
+    if isinstance(session, writer.BatchWriter):
+        # The writer knows about write-once tables itself.
+        session.execute(sa.insert(table), rows)
+    else:
+        session.execute(s.insert(table, session.get_bind().dialect), rows)
+
+
+def offload(run, session, name, value):
+    """
+    Move a large payload of a run to the blob store.
+
+    Payloads up to `CFG["blobs"]["threshold"]` bytes stay in the database.
+    Of larger ones, the database keeps only digest, size and a preview.
+
+    Args:
+        run: The run the payload belongs to.
+        session: The db transaction we belong to.
+        name: The name of the payload, e.g., stdout.
+        value: The payload.
+
+    Returns:
+        The value we store in the database: the payload, if it is small,
+        else None. Use `fetch_blob` to get the payload back.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import blobs
+    from benchbuild.utils import schema as s
+
+    if value is None:
+        return None
+
+    data = value.encode("utf-8", errors="replace")
+    if len(data) <= int(CFG["blobs"]["threshold"]):
+        return value
+
+    blob_digest = blobs.store().put(data)
+    _insert(
+        session, s.Blob.__table__, [{
+            "digest": blob_digest,
+            "size": len(data),
+            "preview": value[:int(CFG["blobs"]["preview"])]
+        }]
+    )
+    session.add(s.RunBlob(run_id=run.id, name=name, digest=blob_digest))
+    return None
+
+
+def fetch_blob(session, run_id, name):
+    """
+    Fetch a payload of a run from the blob store.
+
+    Args:
+        session: The db transaction we belong to.
+        run_id: The id of the run.
+        name: The name of the payload, e.g., stdout.
+
+    Returns:
+        The payload, or None, if it is not in the blob store.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import blobs
+    from benchbuild.utils import schema as s
+
+    blob_digest = session.query(s.RunBlob.digest).filter(
+        s.RunBlob.run_id == run_id, s.RunBlob.name == name
+    ).scalar()
+    if blob_digest is None:
+        return None
+    return blobs.store().get(blob_digest).decode("utf-8", errors="replace")
+
+
+def config_snapshot(cfg=CFG):
+    """
+    Take a snapshot of a configuration.
+
+    The snapshot holds the YAML value of every exported setting, except the
+    ones in `VOLATILE_CONFIG`. Its id is the SHA-256 of these values, so
+    identical configurations share a snapshot.
+
+    Args:
+        cfg: The configuration we take a snapshot of.
+
+    Returns:
+        The id of the snapshot and its values by name.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils.settings import to_yaml
+
+    entries = {
+        name: to_yaml(value)
+        for name, value in sorted(cfg.to_env_dict().items())
+        if name not in VOLATILE_CONFIG
+    }
+    digest = hashlib.sha256()
+    for name, value in entries.items():
+        digest.update(f"{name}\0{value}\0".encode())
+    return digest.hexdigest(), entries
+
+
+def persist_config_snapshot(run, session, cfg=CFG):
+    """
+    Persist the configuration a run was executed with.
+
+    The snapshot of the configuration is stored only once, every run just
+    refers to it.
+
+    Args:
+        run: The run we attach the config to.
+        session: The db transaction we belong to.
+        cfg: The configuration we want to persist.
+
+    Returns:
+        The id of the snapshot.
+    """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import schema as s
+
+    snapshot_id, entries = config_snapshot(cfg)
+    stored = _SNAPSHOTS.setdefault(session, set())
+    if snapshot_id not in stored:
+        _insert(
+            session, s.ConfigSnapshot.__table__, [{
+                "id": snapshot_id,
+                "name": name,
+                "value": value
+            } for name, value in entries.items()]
+        )
+        stored.add(snapshot_id)
+    session.add(s.RunConfig(run_id=run.id, snapshot_id=snapshot_id))
+    return snapshot_id
+
+
+def diff_config_snapshots(session, before, after):
+    """
+    Compare two configuration snapshots.
+
+    Args:
+        session: The db transaction we belong to.
+        before: The id of the first snapshot.
+        after: The id of the second snapshot.
+
+    Returns:
+        The values of both snapshots for every setting that differs, sorted
+        by name. A setting missing in a snapshot has the value None.
+    """
+    # pylint: disable=import-outside-toplevel
     from benchbuild.utils import schema as s
 
-    for cfg_elem in cfg:
-        session.add(s.Config(name=cfg_elem, value=cfg[cfg_elem], run_id=run.id))
+    values = {before: {}, after: {}}
+    for snapshot_id, name, value in session.query(
+        s.ConfigSnapshot.id, s.ConfigSnapshot.name, s.ConfigSnapshot.value
+    ).filter(s.ConfigSnapshot.id.in_([before, after])):
+        values[snapshot_id][name] = value
+
+    return {
+        name: (values[before].get(name), values[after].get(name))
+        for name in sorted(values[before].keys() | values[after].keys())
+        if values[before].get(name) != values[after].get(name)
+    }
@@ -0,0 +1,201 @@
+"""
+A machine-wide pool of CPU tokens.
+
+When benchbuild executes several projects in parallel, every project still
+assumes that it owns all cores of the machine. The job server limits the
+total amount of CPU-heavy work across all of them.
+
+The pool follows the semantics of GNU make's jobserver in fifo mode: a
+named pipe holds one byte per free slot. A client reads a byte to acquire
+a slot and writes the very same byte back to release it. Any process that
+knows the path of the fifo can participate, which includes our compiler
+wrappers and wrapped binaries.
+
+The path of the active job server is published as
+`CFG["jobserver"]["fifo"]` (BB_JOBSERVER_FIFO). Without an active job
+server all functions in this module grant every request immediately.
+
+Example:
+```python
+with jobserver.serve(4):
+    with jobserver.token():
+        ...
+```
+"""
+import errno
+import logging
+import os
+import select
+import tempfile
+import typing as tp
+from contextlib import contextmanager
+
+from benchbuild.settings import CFG
+
+LOG = logging.getLogger(__name__)
+
+TOKEN = b"+"
+
+
+class JobServer:
+    """
+    Client of a fifo based token pool.
+
+    Args:
+        path: Path to the fifo that holds the tokens.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        self._held: tp.List[bytes] = []
+
+    def acquire(
+        self, block: bool = True, timeout: tp.Optional[float] = None
+    ) -> bool:
+        """
+        Take a token from the pool.
+
+        Args:
+            block: Wait until a token becomes available.
+            timeout: Give up waiting after this many seconds.
+
+        Returns:
+            True, if we got a token, else False.
+        """
+        while True:
+            try:
+                token = os.read(self._fd, 1)
+                if token:
+                    self._held.append(token)
+                    return True
+            except BlockingIOError:
+                pass
+            except InterruptedError:
+                continue
+
+            if not block:
+                return False
+
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+            if not readable and timeout is not None:
+                return False
+
+    def release(self) -> None:
+        """Return a token to the pool."""
+        token = self._held.pop() if self._held else TOKEN
+        os.write(self._fd, token)
+
+    @property
+    def held(self) -> int:
+        """Number of tokens this client holds right now."""
+        return len(self._held)
+
+    def close(self) -> None:
+        while self._held:
+            self.release()
+        os.close(self._fd)
+
+
+_CLIENTS: tp.Dict[str, JobServer] = {}
+
+
+def current() -> tp.Optional[JobServer]:
+    """
+    Get a client for the job server configured for this process.
+
+    Returns:
+        The client, or None, if no job server is active.
+    """
+    path = CFG["jobserver"]["fifo"].value
+    if not path:
+        return None
+
+    path = str(path)
+    if path not in _CLIENTS:
+        try:
+            _CLIENTS[path] = JobServer(path)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+            LOG.warning("Job server %s vanished, running unlimited.", path)
+            return None
+    return _CLIENTS[path]
+
+
+@contextmanager
+def tokens(wanted: int) -> tp.Iterator[int]:
+    """
+    Hold up to `wanted` tokens of the active job server.
+
+    We wait for the first token and take as many additional tokens as are
+    available right now.
+
+    Args:
+        wanted: The number of tokens we would like to hold.
+
+    Yields:
+        The number of tokens we got.
+    """
+    server = current()
+    if server is None:
+        yield wanted
+        return
+
+    granted = 0
+    try:
+        server.acquire()
+        granted = 1
+        while granted < wanted and server.acquire(block=False):
+            granted += 1
+        yield granted
+    finally:
+        for _ in range(granted):
+            server.release()
+
+
+@contextmanager
+def token() -> tp.Iterator[None]:
+    """Hold a single token of the active job server."""
+    with tokens(1):
+        yield
+
+
+@contextmanager
+def serve(slots: int) -> tp.Iterator[tp.Optional[str]]:
+    """
+    Provide a job server with the given number of slots.
+
+    If a job server is already active, e.g., because we have been started
+    by a parent benchbuild, we reuse it.
+
+    Args:
+        slots: The number of tokens in the pool.
+
+    Yields:
+        The path of the fifo that holds the tokens.
+    """
+    if current() is not None:
+        yield str(CFG["jobserver"]["fifo"])
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix="benchbuild-jobserver-")
+    path = os.path.join(tmp_dir, "fifo")
+    os.mkfifo(path, 0o600)
+
+    server = JobServer(path)
+    for _ in range(max(slots, 1)):
+        server.release()
+    _CLIENTS[path] = server
+
+    CFG["jobserver"]["fifo"] = path
+    os.environ["BB_JOBSERVER_FIFO"] = path
+    LOG.debug("Serving %d tokens on %s", slots, path)
+    try:
+        yield path
+    finally:
+        CFG["jobserver"]["fifo"] = None
+        os.environ.pop("BB_JOBSERVER_FIFO", None)
+        _CLIENTS.pop(path).close()
+        os.unlink(path)
+        os.rmdir(tmp_dir)
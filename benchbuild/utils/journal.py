@@ -0,0 +1,171 @@
+"""
+A persistent journal of finished project chains and workloads.
+
+`benchbuild run` records the result of every `RequireAll` chain and every
+workload in a small append-only file. If a run gets interrupted, e.g., by
+the batch system, `benchbuild run --resume` reads the journal back and
+skips everything that finished successfully.
+
+Entries are JSON lines keyed by the experiment's id, the project's id and
+(for workloads) the workload's string representation. Later entries win.
+The journal also remembers the experiment ids, so a resumed run keeps
+writing into the same experiment.
+"""
+import fcntl
+import json
+import logging
+import os
+import typing as tp
+import uuid
+
+from benchbuild.settings import CFG
+
+if tp.TYPE_CHECKING:
+    import benchbuild.experiment.Experiment  # pylint: disable=unused-import
+    import benchbuild.project.Project  # pylint: disable=unused-import
+
+LOG = logging.getLogger(__name__)
+
+JournalKey = tp.Tuple[str, str, tp.Optional[str]]
+
+_ACTIVE = False
+_COMPLETED: tp.Set[JournalKey] = set()
+
+
+def path() -> str:
+    """Return the path of the journal file."""
+    if (journal_path := CFG["journal"]["path"].value):
+        return str(journal_path)
+    return os.path.join(str(CFG["build_dir"]), ".benchbuild-journal")
+
+
+def read() -> tp.List[tp.Dict[str, tp.Any]]:
+    """
+    Read all entries from the journal.
+
+    Broken lines, e.g., from a process that was killed while writing,
+    are skipped.
+    """
+    journal_path = path()
+    if not os.path.exists(journal_path):
+        return []
+
+    entries = []
+    with open(journal_path, 'r') as journal:
+        for line in journal:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                LOG.debug("Skipping broken journal entry: %s", line)
+    return entries
+
+
+def start(resume: bool = False) -> None:
+    """
+    Start journaling for this process and all of its children.
+
+    Args:
+        resume: Continue the journal of the last run. We restore the
+            experiment ids found in the journal and remember all finished
+            entries. Otherwise the journal is truncated.
+    """
+    global _ACTIVE  # pylint: disable=global-statement
+    _COMPLETED.clear()
+
+    if not CFG["journal"]["enabled"]:
+        _ACTIVE = False
+        return
+
+    journal_path = path()
+    os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+    if resume:
+        results: tp.Dict[JournalKey, str] = {}
+        cfg_exps = CFG["experiments"].value
+        for entry in read():
+            exp_id = entry["experiment"]
+            results[(exp_id, entry["project"], entry["workload"])] = \
+                entry["result"]
+            cfg_exps[entry["experiment_name"]] = uuid.UUID(exp_id)
+        CFG["experiments"] = cfg_exps
+        _COMPLETED.update(k for k, v in results.items() if v == "OK")
+        LOG.info("Resuming: %d entries finished before", len(_COMPLETED))
+    else:
+        with open(journal_path, 'w'):
+            pass
+
+    _ACTIVE = True
+
+
+def stop() -> None:
+    """Stop journaling for this process."""
+    global _ACTIVE  # pylint: disable=global-statement
+    _ACTIVE = False
+    _COMPLETED.clear()
+
+
+def is_active() -> bool:
+    """Check, if this process writes to the journal."""
+    return _ACTIVE
+
+
+def _key(
+    experiment: "benchbuild.experiment.Experiment",
+    project: "benchbuild.project.Project",
+    workload: tp.Optional[str] = None
+) -> JournalKey:
+    return (str(experiment.id), str(project.id), workload)
+
+
+def is_completed(
+    experiment: "benchbuild.experiment.Experiment",
+    project: "benchbuild.project.Project",
+    workload: tp.Optional[str] = None
+) -> bool:
+    """
+    Check, if the journal of the resumed run marks an entry as finished.
+
+    Args:
+        experiment: The experiment the entry belongs to.
+        project: The project the entry belongs to.
+        workload: The workload, if we ask for a single workload.
+    """
+    return _key(experiment, project, workload) in _COMPLETED
+
+
+def record(
+    experiment: "benchbuild.experiment.Experiment",
+    project: "benchbuild.project.Project",
+    result: tp.Any,
+    workload: tp.Optional[str] = None
+) -> None:
+    """
+    Append a result to the journal.
+
+    The journal is shared between all processes of a run, so every write
+    holds an exclusive lock on the file.
+
+    Args:
+        experiment: The experiment the entry belongs to.
+        project: The project the entry belongs to.
+        result: The `StepResult` we want to record.
+        workload: The workload, if we record a single workload.
+    """
+    if not _ACTIVE:
+        return
+
+    exp_id, prj_id, _ = _key(experiment, project)
+    entry = {
+        "experiment": exp_id,
+        "experiment_name": experiment.name,
+        "project": prj_id,
+        "workload": workload,
+        "result": result.name,
+    }
+    line = json.dumps(entry) + "\n"
+    with open(path(), 'a') as journal:
+        fcntl.flock(journal, fcntl.LOCK_EX)
+        try:
+            journal.write(line)
+            journal.flush()
+        finally:
+            fcntl.flock(journal, fcntl.LOCK_UN)
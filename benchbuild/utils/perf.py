@@ -0,0 +1,254 @@
+"""
+Folded stacks of perf profiles and flamegraphs.
+
+`perf record -g` samples call stacks. We collapse the output of `perf script`
+into folded stacks, the format of Brendan Gregg's FlameGraph tools, i.e.,
+one line per unique stack, root first, with the number of samples:
+
+    binary;main;compute;kernel 1234
+
+A profile is stored as sample counts per stack id, while the stacks are
+stored only once and shared by all profiles (see `stack_id` and `pack`).
+Flamegraphs are rendered on demand from folded stacks, see `render` and
+`render_diff`.
+"""
+import array
+import collections
+import hashlib
+import html
+import re
+import sys
+import typing as tp
+import zlib
+
+import attr
+
+FoldedStacks = tp.Dict[str, int]
+
+_OFFSET = re.compile(r"\+0x[0-9a-fA-F]+$")
+_COMM = re.compile(r"^(\S.*?)\s+\d+(?:/\d+)?\s")
+
+
+def _frame(line: str) -> str:
+    """Extract the symbol from a stack line of `perf script`."""
+    parts = line.strip().split(maxsplit=1)
+    if len(parts) < 2:
+        return "[unknown]"
+    symbol, dso = parts[1], ""
+    if symbol.endswith(")") and " (" in symbol:
+        symbol, dso = symbol[:-1].rsplit(" (", 1)
+    symbol = _OFFSET.sub("", symbol)
+    if symbol == "[unknown]" and dso and dso != "[unknown]":
+        return "[" + dso.rsplit("/", 1)[-1] + "]"
+    return symbol
+
+
+def collapse(lines: tp.Iterable[str]) -> FoldedStacks:
+    """
+    Collapse the output of `perf script` into folded stacks.
+
+    Args:
+        lines: The lines printed by `perf script`.
+
+    Returns:
+        The number of samples of every stack.
+    """
+    stacks: tp.Counter[str] = collections.Counter()
+    comm: tp.Optional[str] = None
+    frames: tp.List[str] = []
+
+    def finish() -> None:
+        if comm is not None:
+            stacks[";".join([comm] + frames[::-1])] += 1
+
+    for line in lines:
+        if not line.strip():
+            finish()
+            comm, frames = None, []
+        elif line[0].isspace():
+            frames.append(_frame(line))
+        elif not line.startswith("#"):
+            finish()
+            match = _COMM.match(line)
+            comm, frames = (match.group(1) if match else line.split()[0]), []
+    finish()
+    return dict(stacks)
+
+
+def parse_folded(lines: tp.Iterable[str]) -> FoldedStacks:
+    """Read folded stacks, as written by `format_folded`."""
+    stacks: tp.Counter[str] = collections.Counter()
+    for line in lines:
+        stack, _, count = line.rstrip("\n").rpartition(" ")
+        if stack:
+            stacks[stack] += int(count)
+    return dict(stacks)
+
+
+def format_folded(stacks: FoldedStacks) -> str:
+    """Write folded stacks, one stack per line."""
+    return "".join(
+        f"{stack} {count}\n" for stack, count in sorted(stacks.items())
+    )
+
+
+def parse_stat(lines: tp.Iterable[str]) -> tp.Dict[str, float]:
+    """
+    Parse the CSV output of `perf stat -x,`.
+
+    Events perf could not count are skipped.
+
+    Returns:
+        The counter value of every event.
+    """
+    counters = {}
+    for line in lines:
+        if not line.strip() or line.startswith("#"):
+            continue
+        fields = line.rstrip("\n").split(",")
+        if len(fields) < 3:
+            continue
+        try:
+            counters[fields[2]] = float(fields[0])
+        except ValueError:
+            continue
+    return counters
+
+
+def stack_id(stack: str) -> int:
+    """A stable 64-bit id of a folded stack."""
+    digest = hashlib.blake2b(stack.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def pack(counts: tp.Mapping[int, int]) -> bytes:
+    """Compress the sample counts per stack id of a profile."""
+    values = array.array("q")
+    for stack, count in sorted(counts.items()):
+        values.extend((stack, count))
+    if sys.byteorder != "little":
+        values.byteswap()
+    return zlib.compress(values.tobytes())
+
+
+def unpack(data: bytes) -> tp.Dict[int, int]:
+    """Restore the sample counts produced by `pack`."""
+    values = array.array("q")
+    values.frombytes(zlib.decompress(data))
+    if sys.byteorder != "little":
+        values.byteswap()
+    return dict(zip(values[::2], values[1::2]))
+
+
+@attr.s(eq=False)
+class _Node:
+    name: str = attr.ib()
+    value: int = attr.ib(default=0)
+    delta: float = attr.ib(default=0.0)
+    children: tp.Dict[str, "_Node"] = attr.ib(factory=dict)
+
+    def add(self, frames: tp.Sequence[str], value: int, delta: float) -> None:
+        node = self
+        node.value += value
+        node.delta += delta
+        for frame in frames:
+            node = node.children.setdefault(frame, _Node(frame))
+            node.value += value
+            node.delta += delta
+
+    def depth(self) -> int:
+        return 1 + max((c.depth() for c in self.children.values()), default=0)
+
+
+WIDTH = 1200
+FRAME_HEIGHT = 16
+MIN_WIDTH = 0.1
+
+
+def _warm(name: str) -> str:
+    shade = int(hashlib.md5(name.encode()).hexdigest()[:4], 16) / 0xFFFF
+    return f"rgb(230,{int(80 + 120 * shade)},{int(50 * shade)})"
+
+
+def _svg(root: _Node, title: str, color: tp.Callable[[_Node], str]) -> str:
+    depth = root.depth()
+    height = (depth + 2) * FRAME_HEIGHT
+    scale = WIDTH / root.value if root.value else 0
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" '
+        f'height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="{WIDTH / 2}" y="{FRAME_HEIGHT - 4}" '
+        f'text-anchor="middle">{html.escape(title)}</text>'
+    ]
+
+    def draw(node: _Node, x: float, level: int) -> None:
+        width = node.value * scale
+        if width < MIN_WIDTH:
+            return
+        y = height - (level + 1) * FRAME_HEIGHT
+        share = 100 * node.value / root.value
+        name = html.escape(node.name)
+        out.append(
+            f'<g><title>{name} ({node.value} samples, {share:.2f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" '
+            f'height="{FRAME_HEIGHT - 1}" fill="{color(node)}"/>'
+        )
+        chars = int(width / 7)
+        if chars >= 3:
+            label = node.name if len(node.name) <= chars else \
+                node.name[:chars - 2] + ".."
+            out.append(
+                f'<text x="{x + 3:.1f}" y="{y + FRAME_HEIGHT - 4}">'
+                f'{html.escape(label)}</text>'
+            )
+        out.append('</g>')
+        for child in sorted(node.children.values(), key=lambda c: c.name):
+            draw(child, x, level + 1)
+            x += child.value * scale
+
+    draw(root, 0.0, 0)
+    out.append('</svg>\n')
+    return "\n".join(out)
+
+
+def render(stacks: FoldedStacks, title: str = "Flame Graph") -> str:
+    """Render folded stacks as a flamegraph (SVG)."""
+    root = _Node("all")
+    for stack, count in stacks.items():
+        root.add(stack.split(";"), count, 0.0)
+    return _svg(root, title, lambda node: _warm(node.name))
+
+
+def render_diff(
+    before: FoldedStacks,
+    after: FoldedStacks,
+    title: str = "Differential Flame Graph"
+) -> str:
+    """
+    Render a differential flamegraph of two profiles.
+
+    The frames are as wide as in `after`. Frames that take a larger share
+    of the samples than in `before` are red, smaller ones are blue. Both
+    profiles are normalized to the same number of samples first.
+    """
+    total_before = sum(before.values())
+    total_after = sum(after.values())
+    ratio = total_after / total_before if total_before else 0.0
+
+    root = _Node("all")
+    for stack in set(before) | set(after):
+        count = after.get(stack, 0)
+        root.add(
+            stack.split(";"), count, count - before.get(stack, 0) * ratio
+        )
+
+    def color(node: _Node) -> str:
+        if not node.value:
+            return "rgb(200,200,200)"
+        intensity = min(abs(node.delta) / node.value, 1.0)
+        fade = int(255 * (1 - intensity))
+        if node.delta > 0:
+            return f"rgb(255,{fade},{fade})"
+        return f"rgb({fade},{fade},255)"
+
+    return _svg(root, title, color)
@@ -0,0 +1,197 @@
+"""
+Fetch the sources of upcoming projects while the current project builds.
+
+`ProjectEnvironment` fetches all variants of a project right before it
+compiles, so network I/O and compilation never overlap. The `Prefetcher`
+walks ahead in the plan and fetches the sources of the next projects into
+`CFG["tmp_dir"]` in the background.
+
+Fetching changes the working directory of the fetching process (plumbum's
+`local.cwd`), so we fetch in separate worker processes instead of threads.
+Prefetches and `ProjectEnvironment` serialize on a per-source file lock,
+which prevents two processes from cloning into the same directory.
+
+Example:
+```python
+with Prefetcher(projects, lookahead=2) as prefetcher:
+    for project in projects:
+        prefetcher.advance(project)
+        ...
+```
+"""
+import collections
+import concurrent.futures as cf
+import fcntl
+import itertools
+import logging
+import os
+import typing as tp
+from contextlib import contextmanager
+
+from benchbuild.settings import CFG
+from benchbuild.source import base, git
+
+if tp.TYPE_CHECKING:
+    import benchbuild.project.Project  # pylint: disable=unused-import
+
+LOG = logging.getLogger(__name__)
+
+SourceVersion = tp.Tuple[base.FetchableSource, str]
+
+
+@contextmanager
+def locked(source: base.FetchableSource) -> tp.Iterator[None]:
+    """
+    Hold an exclusive lock on the download location of a source.
+
+    Args:
+        source: The source we want to fetch.
+    """
+    if isinstance(source, base.NoSource):
+        yield
+        return
+
+    prefix = base.target_prefix()
+    os.makedirs(prefix, exist_ok=True)
+    flat_local = source.local.replace(os.sep, '-')
+    lock_path = os.path.join(prefix, f".{flat_local}.lock")
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def mark_fetched(source: base.FetchableSource) -> None:
+    """
+    Tell the source that a prefetch brought it up-to-date.
+
+    Args:
+        source: The source that has been fetched by someone else.
+    """
+    if isinstance(source, git.Git):
+        git.mark_fetched(source)
+
+
+def sources_of(
+    project: "benchbuild.project.Project"
+) -> tp.List[SourceVersion]:
+    """
+    Collect all sources the project's `ProjectEnvironment` will fetch.
+
+    Args:
+        project: The project we want to prefetch.
+
+    Returns:
+        Pairs of source and version, without sources that have nothing to
+        fetch.
+    """
+    return [(variant.source(), variant.version)
+            for variant in project.revision.variants
+            if not isinstance(variant.source(), base.NoSource)]
+
+
+def fetch(sources: tp.List[SourceVersion]) -> None:
+    """
+    Fetch the given sources into benchbuild's cache.
+
+    Args:
+        sources: Pairs of source and version we want to fetch.
+    """
+    for source, version in sources:
+        with locked(source):
+            LOG.debug("Prefetching %s @ %s", source.local, version)
+            if (fetch_version := getattr(source, "fetch_version", None)):
+                fetch_version(version)
+            else:
+                source.fetch()
+
+
+class Prefetcher:
+    """
+    Fetch the sources of the next projects in the background.
+
+    Args:
+        projects: The projects of the plan, in plan order. More projects
+            can be added with `add`, while the plan is executed.
+        lookahead: The number of projects we fetch ahead of the last
+            project that started.
+        jobs: The number of concurrent fetches.
+    """
+
+    def __init__(
+        self,
+        projects: tp.Iterable["benchbuild.project.Project"] = (),
+        lookahead: tp.Optional[int] = None,
+        jobs: tp.Optional[int] = None
+    ) -> None:
+        if lookahead is None:
+            lookahead = int(CFG["prefetch"]["lookahead"])
+        if jobs is None:
+            jobs = int(CFG["prefetch"]["jobs"])
+
+        self.lookahead = lookahead
+        self.jobs = max(jobs, 1)
+        self._upcoming: tp.Deque["benchbuild.project.Project"] = \
+            collections.deque()
+        self._futures: tp.Dict[int, cf.Future] = {}
+        self._executor: tp.Optional[cf.Executor] = None
+
+        for project in projects:
+            self.add(project)
+
+    def __enter__(self) -> 'Prefetcher':
+        return self
+
+    def __exit__(self, *args: tp.Any) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def add(self, project: "benchbuild.project.Project") -> None:
+        """
+        Add a project to the end of the plan.
+
+        Args:
+            project: The project that has been planned.
+        """
+        if self.lookahead > 0 and sources_of(project):
+            self._upcoming.append(project)
+
+    def advance(self, project: "benchbuild.project.Project") -> None:
+        """
+        Note that a project starts and fetch ahead of it.
+
+        Args:
+            project: The project that starts right now.
+        """
+        self._futures.pop(id(project), None)
+        for i, upcoming in enumerate(self._upcoming):
+            if upcoming is project:
+                del self._upcoming[i]
+                break
+
+        for upcoming in itertools.islice(self._upcoming, self.lookahead):
+            if id(upcoming) in self._futures:
+                continue
+            if self._executor is None:
+                self._executor = cf.ProcessPoolExecutor(max_workers=self.jobs)
+            self._futures[id(upcoming)] = self._executor.submit(
+                fetch, sources_of(upcoming)
+            )
+
+    def is_fetched(self, project: "benchbuild.project.Project") -> bool:
+        """
+        Check, if the prefetch of a project finished successfully.
+
+        Args:
+            project: The project we ask for.
+        """
+        future = self._futures.get(id(project))
+        if future is None or not future.done() or future.cancelled():
+            return False
+        if (error := future.exception()) is not None:
+            LOG.debug("Prefetch of %s failed: %s", project.id, str(error))
+            return False
+        return True
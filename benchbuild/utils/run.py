@@ -1,19 +1,26 @@
 """Experiment helpers."""
+import codecs
+import contextvars
 import datetime
 import functools
+import json
 import logging
+import os
 import sys
 import typing as t
-from contextlib import contextmanager
+from contextlib import ExitStack, contextmanager
 from typing import Protocol
 
 import attr
-from plumbum import TEE, local
+from plumbum import local
 from plumbum.commands import ProcessExecutionError
 from plumbum.commands.base import BaseCommand
 
 from benchbuild import settings, signals
 
+if t.TYPE_CHECKING:
+    from benchbuild.utils import capture  # pylint: disable=unused-import
+
 CommandResult = t.Tuple[int, str, str]
 
 
@@ -23,9 +30,194 @@ class WatchableCommand(Protocol):
         ...
 
 
+class AsyncWatchableCommand(Protocol):
+
+    async def __call__(self, *args: t.Any, **kwargs: t.Any) -> CommandResult:
+        ...
+
+
+ReturnType = t.TypeVar("ReturnType")
+
+
 CFG = settings.CFG
 LOG = logging.getLogger(__name__)
 
+ProcessWatcher = t.Callable[["RunInfo", int], t.ContextManager[t.Any]]
+_WATCHERS: contextvars.ContextVar[t.Tuple[ProcessWatcher, ...]] = \
+    contextvars.ContextVar("process_watchers", default=())
+
+
+@contextmanager
+def watch_processes(watcher: ProcessWatcher) -> t.Iterator[None]:
+    """
+    Watch all tracked binaries we start inside this context.
+
+    For every tracked binary, the watcher is called with the `RunInfo` and
+    the pid of the binary as soon as it started. The returned context is
+    left after the binary was reaped.
+
+    Args:
+        watcher: The watcher, e.g., a resource sampler.
+    """
+    token = _WATCHERS.set(_WATCHERS.get() + (watcher,))
+    try:
+        yield
+    finally:
+        _WATCHERS.reset(token)
+
+
+@attr.s(frozen=True)
+class ResourceUsage:
+    """
+    Resources used by a child process, as reported by `os.wait4`.
+
+    Attributes:
+        real_s: The wall-clock time in seconds.
+        user_s: The user time in seconds.
+        system_s: The system time in seconds.
+        maxrss_kb: The maximum resident set size in KiB.
+        minflt: The number of minor page faults.
+        majflt: The number of major page faults.
+        nvcsw: The number of voluntary context switches.
+        nivcsw: The number of involuntary context switches.
+        inblock: The number of block input operations.
+        oublock: The number of block output operations.
+    """
+    real_s: float = attr.ib()
+    user_s: float = attr.ib()
+    system_s: float = attr.ib()
+    maxrss_kb: int = attr.ib()
+    minflt: int = attr.ib()
+    majflt: int = attr.ib()
+    nvcsw: int = attr.ib()
+    nivcsw: int = attr.ib()
+    inblock: int = attr.ib()
+    oublock: int = attr.ib()
+
+    @classmethod
+    def from_rusage(cls, rusage: t.Any, wall_ns: int) -> 'ResourceUsage':
+        return cls(
+            real_s=wall_ns / 1e9,
+            user_s=rusage.ru_utime,
+            system_s=rusage.ru_stime,
+            maxrss_kb=rusage.ru_maxrss,
+            minflt=rusage.ru_minflt,
+            majflt=rusage.ru_majflt,
+            nvcsw=rusage.ru_nvcsw,
+            nivcsw=rusage.ru_nivcsw,
+            inblock=rusage.ru_inblock,
+            oublock=rusage.ru_oublock
+        )
+
+    @property
+    def timing(self) -> t.Tuple[float, float, float]:
+        """User, system and wall-clock time, like GNU time's %U-%S-%e."""
+        return self.user_s, self.system_s, self.real_s
+
+    def as_metrics(self) -> t.Dict[str, float]:
+        """Name all values like the metrics we store in the database."""
+        metrics = {
+            "time.user_s": self.user_s,
+            "time.system_s": self.system_s,
+            "time.real_s": self.real_s
+        }
+        for name in ("maxrss_kb", "minflt", "majflt", "nvcsw", "nivcsw",
+                     "inblock", "oublock"):
+            metrics[f"rusage.{name}"] = float(getattr(self, name))
+        return metrics
+
+
+def _tee_pipes(
+    proc: t.Any, stdout: "capture.StreamCapture",
+    stderr: "capture.StreamCapture"
+) -> None:
+    """Feed the output of a process into our captures while it runs."""
+    # pylint: disable=import-outside-toplevel
+    import selectors
+
+    sinks = {proc.stdout.fileno(): stdout, proc.stderr.fileno(): stderr}
+    with selectors.DefaultSelector() as selector:
+        for fd in sinks:
+            selector.register(fd, selectors.EVENT_READ)
+        while sinks:
+            for key, _ in selector.select():
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(key.fd)
+                    del sinks[key.fd]
+                    continue
+                sinks[key.fd].write(data)
+
+
+def tee_rusage(
+    command: BaseCommand,
+    retcode: t.Optional[int] = 0,
+    capture_to: t.Optional[str] = None,
+    watchers: t.Sequence[t.Callable[[int], t.ContextManager[t.Any]]] = ()
+) -> t.Tuple[int, "capture.CapturedOutput", "capture.CapturedOutput",
+             ResourceUsage]:
+    """
+    Run a command like `command & TEE` and measure its resource usage.
+
+    We reap the child with `os.wait4` ourselves, which gives us its rusage
+    without wrapping it in another process. The wall-clock time is taken
+    with `time.perf_counter_ns` around the child's lifetime.
+
+    Args:
+        command: The plumbum command we execute.
+        retcode: The expected return code, None accepts every return code.
+        capture_to: Stream stdout and stderr to `<capture_to>.stdout` and
+            `<capture_to>.stderr`. Either way, only their head and tail
+            stay in memory (see `benchbuild.utils.capture`).
+        watchers: Called with the pid of the child after it started. We
+            leave the returned contexts after the child was reaped.
+
+    Returns:
+        The return code, stdout, stderr and the resources used.
+    """
+    # pylint: disable=import-outside-toplevel
+    import subprocess
+    import time
+
+    from benchbuild.utils import capture
+
+    out_path = err_path = None
+    if capture_to is not None:
+        out_path, err_path = f"{capture_to}.stdout", f"{capture_to}.stderr"
+    out_capture = capture.StreamCapture(out_path, echo=sys.stdout)
+    err_capture = capture.StreamCapture(err_path, echo=sys.stderr)
+
+    start = time.perf_counter_ns()
+    # Like `command & TEE`, the child reads our stdin.
+    proc = command.popen(
+        stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    try:
+        with ExitStack() as stack:
+            for watcher in watchers:
+                stack.enter_context(watcher(proc.pid))
+            _tee_pipes(proc, out_capture, err_capture)
+            _, status, rusage = os.wait4(proc.pid, 0)
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+        stdout, stderr = out_capture.close(), err_capture.close()
+    wall_ns = time.perf_counter_ns() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    if retcode is not None and proc.returncode != retcode:
+        raise ProcessExecutionError(
+            command.formulate(), proc.returncode, stdout, stderr
+        )
+    return (
+        proc.returncode, stdout, stderr,
+        ResourceUsage.from_rusage(rusage, wall_ns)
+    )
+
 
 @attr.s(eq=False)
 class RunInfo:
@@ -42,10 +234,12 @@ class RunInfo:
         project ():
         experiment ():
         retcode ():
-        stdout ():
-        stderr ():
+        stdout (CapturedOutput): A handle to the captured stdout.
+        stderr (CapturedOutput): A handle to the captured stderr.
         db_run ():
-        session ():
+        session (): The session we write to, see `db.session`.
+        log (RunLog): The log entry we write when the run ends.
+        rusage (ResourceUsage): The resources used by the command.
     """
 
     def __begin(self, command: BaseCommand, project, experiment, group):
@@ -66,18 +260,23 @@ class RunInfo:
             return
 
         # pylint: disable=import-outside-toplevel
+        from benchbuild.utils import db
         from benchbuild.utils import schema as s
-        from benchbuild.utils.db import create_run
-
-        db_run, session = create_run(command, project, experiment, group)
-        db_run.begin = datetime.datetime.now()
-        db_run.status = 'running'
-        log = s.RunLog()
-        log.run_id = db_run.id
-        log.begin = datetime.datetime.now()
-        log.config = repr(CFG)
-        session.add(log)
-        session.add(db_run)
+
+        db_run, session = db.create_run(command, project, experiment, group)
+        self.log = s.RunLog(run_id=db_run.id, begin=datetime.datetime.now())
+        db.persist_config_snapshot(db_run, session)
+        if (pair := CFG["interleave"]["pair"].value):
+            session.add(
+                s.Metadata(
+                    run_id=db_run.id,
+                    name="interleave",
+                    value=json.dumps({
+                        "pair": str(pair),
+                        "variant": str(CFG["interleave"]["variant"])
+                    })
+                )
+            )
 
         self.db_run = db_run
         self.session = session
@@ -99,13 +298,11 @@ class RunInfo:
             return
 
         # pylint: disable=import-outside-toplevel
-        from benchbuild.utils.schema import RunLog
+        from benchbuild.utils import db
 
-        run_id = self.db_run.id
-
-        log = self.session.query(RunLog).filter(RunLog.run_id == run_id).one()
-        log.stderr = stderr
-        log.stdout = stdout
+        log = self.log
+        log.stderr = db.offload(self.db_run, self.session, "stderr", stderr)
+        log.stdout = db.offload(self.db_run, self.session, "stdout", stdout)
         log.status = 0
         log.end = datetime.datetime.now()
 
@@ -132,12 +329,11 @@ class RunInfo:
             return
 
         # pylint: disable=import-outside-toplevel
-        from benchbuild.utils.schema import RunLog
-        run_id = self.db_run.id
+        from benchbuild.utils import db
 
-        log = self.session.query(RunLog).filter(RunLog.run_id == run_id).one()
-        log.stderr = stderr
-        log.stdout = stdout
+        log = self.log
+        log.stderr = db.offload(self.db_run, self.session, "stderr", stderr)
+        log.stdout = db.offload(self.db_run, self.session, "stdout", stdout)
         log.status = retcode
         log.end = datetime.datetime.now()
 
@@ -157,7 +353,9 @@ class RunInfo:
 
     db_run = attr.ib(init=False, default=None)
     session = attr.ib(init=False, default=None, repr=False)
+    log = attr.ib(init=False, default=None, repr=False)
     payload = attr.ib(init=False, default=None, repr=False)
+    rusage = attr.ib(init=False, default=None, repr=False)
 
     def __attrs_post_init__(self):
         self.__begin(
@@ -188,22 +386,22 @@ class RunInfo:
         with local.env(**cmd_env):
             try:
                 bin_name = sys.argv[0]
-                retcode, stdout, stderr = \
-                    self.cmd & TEE(retcode=expected_retcode)
-                f_stdout = bin_name + ".stdout"
-                f_stderr = bin_name + ".stderr"
-                with open(f_stdout, 'w') as fd_stdout:
-                    fd_stdout.write(stdout)
-
-                with open(f_stderr, 'w') as fd_stderr:
-                    fd_stderr.write(stderr)
+                retcode, stdout, stderr, self.rusage = tee_rusage(
+                    self.cmd,
+                    retcode=expected_retcode,
+                    capture_to=bin_name,
+                    watchers=[
+                        functools.partial(watcher, self)
+                        for watcher in _WATCHERS.get()
+                    ]
+                )
 
                 self.retcode = retcode
                 self.stdout = stdout
                 self.stderr = stderr
                 self.__end(str(stdout), str(stderr))
             except ProcessExecutionError as ex:
-                self.__fail(ex.retcode, ex.stderr, ex.stdout)
+                self.__fail(ex.retcode, str(ex.stdout), str(ex.stderr))
                 self.retcode = ex.retcode
                 self.stdout = ex.stdout
                 self.stderr = ex.stderr
@@ -244,24 +442,34 @@ def begin_run_group(project, experiment):
     # pylint: disable=import-outside-toplevel
     from benchbuild.utils.db import create_run_group
 
-    group, session = create_run_group(project, experiment)
-    group.begin = datetime.datetime.now()
-    group.status = 'running'
+    return create_run_group(project, experiment)
 
-    session.commit()
-    return group, session
+
+def _flush_runs() -> None:
+    """Write everything the runs of a run group queued."""
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import db
+    db.session().flush()
 
 
 def end_run_group(group, session):
     """
     End the run_group successfully.
 
+    We store the statistics of its metrics along with it, see
+    `db.summarize_run_group`.
+
     Args:
         group: The run_group we want to complete.
         session: The database transaction we will finish.
     """
+    # pylint: disable=import-outside-toplevel
+    from benchbuild.utils import db
+
+    _flush_runs()
     group.end = datetime.datetime.now()
     group.status = 'completed'
+    db.summarize_run_group(session, group.id)
     session.commit()
 
 
@@ -273,6 +481,7 @@ def fail_run_group(group, session):
         group: The run_group we want to complete.
         session: The database transaction we will finish.
     """
+    _flush_runs()
     group.end = datetime.datetime.now()
     group.status = 'failed'
     session.commit()
@@ -345,6 +554,136 @@ def watch(command: BaseCommand) -> WatchableCommand:
     return f
 
 
+def _env_and_cwd(command: BaseCommand) -> t.Tuple[t.Dict[str, str], str]:
+    """
+    Collect the environment and working directory of a plumbum command.
+
+    Outer environment variables and working directories override inner ones,
+    just like plumbum does it when it spawns the command.
+    """
+    # pylint: disable=import-outside-toplevel
+    from plumbum.commands.base import BoundCommand, BoundEnvCommand
+
+    envvars: t.Dict[str, str] = {}
+    cwd = None
+    while isinstance(command, (BoundCommand, BoundEnvCommand)):
+        if isinstance(command, BoundEnvCommand):
+            for key, value in command.env.items():
+                envvars.setdefault(key, str(value))
+            if cwd is None and command.cwd is not None:
+                cwd = str(command.cwd)
+        command = command.cmd
+
+    env = local.env.getdict()
+    env.update(envvars)
+    return env, cwd if cwd is not None else str(local.cwd)
+
+
+async def _tee(stream: "asyncio.StreamReader", sink: t.TextIO) -> str:
+    # Chunks, not lines: readline fails on lines longer than the limit of
+    # the stream. The decoder keeps characters split across chunks intact.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    chunks = []
+    while chunk := await stream.read(65536):
+        text = decoder.decode(chunk)
+        sink.write(text)
+        chunks.append(text)
+    chunks.append(decoder.decode(b"", final=True))
+    sink.write(chunks[-1])
+    sink.flush()
+    return "".join(chunks)
+
+
+def watch_async(command: BaseCommand) -> AsyncWatchableCommand:
+    """
+    Execute a plumbum command on the running asyncio event loop.
+
+    This is the asynchronous variant of `watch`. The command's output is
+    streamed to our stdout/stderr as it arrives and captured at the same
+    time, so many short commands can run concurrently on a single thread.
+    Whatever ends the coroutine early, e.g., cancellation, kills the command.
+
+    The working directory is taken from the command (see
+    `plumbum.commands.base.BaseCommand.with_cwd`), not from `local.cwd`,
+    because the latter is shared by all coroutines.
+
+    Args:
+        command: The plumbumb command to execute.
+    """
+
+    async def f(*args: t.Any, retcode: t.Optional[int] = 0) -> CommandResult:
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        final_command = command[args]
+        argv = final_command.formulate()
+        env, cwd = _env_and_cwd(final_command)
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            cwd=cwd,
+            env=env,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.gather(
+                _tee(proc.stdout, sys.stdout), _tee(proc.stderr, sys.stderr)
+            )
+            returncode = await proc.wait()
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+        if retcode is not None and returncode != retcode:
+            raise ProcessExecutionError(argv, returncode, stdout, stderr)
+        return returncode, stdout, stderr
+
+    return f
+
+
+def run_concurrently(
+    jobs: t.Sequence[t.Callable[[], t.Awaitable[ReturnType]]],
+    limit: int,
+    after: t.Optional[t.Sequence[t.Iterable[int]]] = None
+) -> t.List[t.Union[ReturnType, BaseException]]:
+    """
+    Run coroutines on a fresh event loop, at most `limit` at a time.
+
+    Args:
+        jobs: Factories for the coroutines we want to run.
+        limit: The maximal number of coroutines that run at the same time.
+        after: For every job, the indices of the jobs that have to finish
+            before it may start. A job starts even if one of them failed.
+
+    Returns:
+        The results of all jobs in the order of `jobs`. Exceptions raised
+        by a job are returned in place of its result.
+    """
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    async def limited(
+        idx: int, semaphore: asyncio.Semaphore, done: t.List[asyncio.Event]
+    ) -> ReturnType:
+        try:
+            for required in (after[idx] if after else ()):
+                await done[required].wait()
+            async with semaphore:
+                return await jobs[idx]()
+        finally:
+            done[idx].set()
+
+    async def run_all() -> t.List[t.Union[ReturnType, BaseException]]:
+        semaphore = asyncio.Semaphore(max(limit, 1))
+        done = [asyncio.Event() for _ in jobs]
+        return await asyncio.gather(
+            *[limited(idx, semaphore, done) for idx in range(len(jobs))],
+            return_exceptions=True
+        )
+
+    return asyncio.run(run_all())
+
+
 def with_env_recursive(cmd: BaseCommand, **envvars: str) -> BaseCommand:
     """
     Recursively updates the environment of cmd and all its subcommands.
@@ -0,0 +1,215 @@
+"""
+Sample the resource usage of a process tree while it runs.
+
+`ResourceSampler` polls `/proc` from a background thread and records, for
+the whole process tree below a pid:
+
+    * time: The time since the sampler started (ms).
+    * rss: The resident set size (KiB).
+    * cpu: The CPU utilization since the last sample (percent of one core).
+    * threads: The number of threads.
+    * read_bytes: The bytes read from storage.
+    * write_bytes: The bytes written to storage.
+
+Every series is a list of integers. We store it delta-encoded as 64-bit
+integers and compressed with zlib (see `encode` and `decode`). Slowly
+changing series, like the time axis or the RSS, compress very well that way.
+"""
+import array
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import typing as tp
+import zlib
+
+import attr
+
+from benchbuild.settings import CFG
+
+LOG = logging.getLogger(__name__)
+
+UNITS = {
+    "time": "ms",
+    "rss": "KiB",
+    "cpu": "percent",
+    "threads": "count",
+    "read_bytes": "bytes",
+    "write_bytes": "bytes"
+}
+
+Series = tp.Dict[str, tp.List[int]]
+
+
+def encode(values: tp.Sequence[int]) -> bytes:
+    """Delta-encode and compress a series of integers."""
+    deltas = array.array(
+        "q", (cur - prev for prev, cur in zip(itertools.chain([0], values),
+                                              values))
+    )
+    if sys.byteorder != "little":
+        deltas.byteswap()
+    return zlib.compress(deltas.tobytes())
+
+
+def decode(data: bytes) -> tp.List[int]:
+    """Restore a series of integers produced by `encode`."""
+    deltas = array.array("q")
+    deltas.frombytes(zlib.decompress(data))
+    if sys.byteorder != "little":
+        deltas.byteswap()
+    return list(itertools.accumulate(deltas))
+
+
+@attr.s(frozen=True)
+class ProcessStat:
+    """The counters of a single process we care about."""
+    ppid: int = attr.ib()
+    cpu_ticks: int = attr.ib()
+    threads: int = attr.ib()
+    rss_pages: int = attr.ib()
+
+
+def read_stat(pid: int) -> tp.Optional[ProcessStat]:
+    """Read `/proc/<pid>/stat`, None if the process is gone."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as stat_file:
+            stat = stat_file.read()
+    except OSError:
+        return None
+    # The command name is in parentheses and may contain anything.
+    fields = stat[stat.rfind(b")") + 2:].split()
+    return ProcessStat(
+        ppid=int(fields[1]),
+        cpu_ticks=int(fields[11]) + int(fields[12]),
+        threads=int(fields[17]),
+        rss_pages=int(fields[21])
+    )
+
+
+def read_io(pid: int) -> tp.Tuple[int, int]:
+    """Read the storage I/O of a process, (0, 0) if we are not allowed to."""
+    read_bytes = write_bytes = 0
+    try:
+        with open(f"/proc/{pid}/io", "rb") as io_file:
+            for line in io_file:
+                if line.startswith(b"read_bytes:"):
+                    read_bytes = int(line.split()[1])
+                elif line.startswith(b"write_bytes:"):
+                    write_bytes = int(line.split()[1])
+    except OSError:
+        pass
+    return read_bytes, write_bytes
+
+
+def _children(pid: int) -> tp.List[int]:
+    children: tp.List[int] = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children", "rb") as child_file:
+                children.extend(int(child) for child in child_file.read().split())
+        except OSError:
+            continue
+    return children
+
+
+def process_tree(pid: int) -> tp.List[int]:
+    """Find a process and all of its descendants."""
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(_children(current))
+    return tree
+
+
+class ResourceSampler:
+    """
+    Sample a process tree from a background thread.
+
+    Args:
+        pid: The root of the process tree.
+        interval: Seconds between two samples, defaults to
+            `CFG["sampler"]["interval"]`.
+    """
+
+    def __init__(self, pid: int, interval: tp.Optional[float] = None) -> None:
+        self.pid = pid
+        self.interval = float(
+            interval if interval is not None else CFG["sampler"]["interval"]
+        )
+        self.series: Series = {name: [] for name in UNITS}
+
+        self._ticks_per_s = os.sysconf("SC_CLK_TCK")
+        self._kib_per_page = os.sysconf("SC_PAGE_SIZE") // 1024
+        self._last_ticks: tp.Dict[int, int] = {}
+        self._last_time = 0.0
+        self._start = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"sampler-{pid}", daemon=True
+        )
+
+    def sample(self) -> None:
+        """Take a single sample of the process tree."""
+        now = time.monotonic()
+        rss = cpu_ticks = threads = read_bytes = write_bytes = 0
+        ticks: tp.Dict[int, int] = {}
+        for pid in process_tree(self.pid):
+            stat = read_stat(pid)
+            if stat is None:
+                continue
+            ticks[pid] = stat.cpu_ticks
+            # Processes we see for the first time only contribute with the
+            # time they spent since the last sample, i.e., all of it.
+            cpu_ticks += stat.cpu_ticks - self._last_ticks.get(pid, 0)
+            threads += stat.threads
+            rss += stat.rss_pages * self._kib_per_page
+            pid_read, pid_write = read_io(pid)
+            read_bytes += pid_read
+            write_bytes += pid_write
+
+        elapsed = now - self._last_time if self._last_ticks else 0
+        cpu = 0
+        if elapsed > 0:
+            cpu = round(100 * cpu_ticks / self._ticks_per_s / elapsed)
+        self._last_ticks = ticks
+        self._last_time = now
+
+        values = {
+            "time": round((now - self._start) * 1000),
+            "rss": rss,
+            "cpu": cpu,
+            "threads": threads,
+            "read_bytes": read_bytes,
+            "write_bytes": write_bytes
+        }
+        for name, value in values.items():
+            self.series[name].append(value)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sample()
+            except Exception:  # pylint: disable=broad-except
+                LOG.exception("Sampling pid %d failed, giving up.", self.pid)
+                return
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> None:
+        """Start sampling in the background."""
+        self._start = time.monotonic()
+        self._thread.start()
+
+    def stop(self) -> Series:
+        """Stop sampling and return all series."""
+        self._stop.set()
+        self._thread.join()
+        return self.series
@@ -29,12 +29,15 @@ import uuid
 
 import sqlalchemy as sa
 from sqlalchemy import (
+    BigInteger,
     Column,
     DateTime,
     Enum,
     ForeignKey,
     ForeignKeyConstraint,
+    Index,
     Integer,
+    LargeBinary,
     String,
     create_engine,
 )
@@ -278,12 +281,51 @@ class Metric(BASE):
         return "{0} - {1}".format(self.name, self.value)
 
 
+class MetricSummary(BASE):
+    """
+    Store the statistics of a metric over all runs of a run group.
+
+    Benchbuild computes them when a run group ends, see
+    `benchbuild.utils.db.summarize_run_group`. Reports over many run groups
+    read these rows instead of aggregating the metrics table.
+    """
+
+    __tablename__ = 'metric_summary'
+    __table_args__ = (
+        Index(
+            "ix_metric_summary_project", "project_group", "project_name",
+            "name"
+        ),
+        Index("ix_metric_summary_experiment", "experiment_group", "name"),
+    )
+
+    run_group = Column(
+        GUID(as_uuid=True),
+        ForeignKey("rungroup.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True
+    )
+    name = Column(String, primary_key=True)
+    experiment_group = Column(GUID(as_uuid=True))
+    project_name = Column(String)
+    project_group = Column(String)
+    count = Column(Integer)
+    min = Column(Float)
+    max = Column(Float)
+    mean = Column(Float)
+    median = Column(Float)
+    stddev = Column(Float)
+
+    def __repr__(self):
+        return "{0} - {1} ({2} runs)".format(self.name, self.mean, self.count)
+
+
 class RunLog(BASE):
     """
     Store log information for every run.
 
     Properties like, start time, finish time, exit code, stderr, stdout
-    are stored here.
+    are stored here. The configuration of a run is stored in `RunConfig`,
+    only older versions of benchbuild set `config`.
     """
 
     __tablename__ = 'log'
@@ -322,6 +364,70 @@ class Metadata(BASE):
     value = Column(String)
 
 
+class TimeSeries(BASE):
+    """
+    Store a series of samples taken during a run.
+
+    The samples are integers, delta-encoded and compressed, see
+    `benchbuild.utils.sampler.encode`.
+    """
+
+    __tablename__ = 'timeseries'
+
+    run_id = Column(
+        Integer,
+        ForeignKey("run.id", onupdate="CASCADE", ondelete="CASCADE"),
+        index=True,
+        primary_key=True
+    )
+    name = Column(String, primary_key=True)
+    unit = Column(String)
+    samples = Column(Integer)
+    data = Column(LargeBinary)
+
+    def values(self) -> tp.List[int]:
+        """Decode the samples."""
+        # pylint: disable=import-outside-toplevel
+        from benchbuild.utils.sampler import decode
+        return decode(self.data)
+
+
+class PerfStack(BASE):
+    """
+    Store a folded call stack recorded with perf.
+
+    Every stack is stored once and shared by all profiles that sampled it,
+    see `benchbuild.utils.perf.stack_id`.
+    """
+
+    __tablename__ = 'perf_stacks'
+    __table_args__ = {"info": {"write_once": True}}
+
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    frames = Column(String)
+
+
+class PerfProfile(BASE):
+    """
+    Store a perf profile of a run.
+
+    The profile holds the number of samples per `PerfStack`, compressed
+    with `benchbuild.utils.perf.pack`.
+    """
+
+    __tablename__ = 'perf_profiles'
+
+    run_id = Column(
+        Integer,
+        ForeignKey("run.id", onupdate="CASCADE", ondelete="CASCADE"),
+        index=True,
+        primary_key=True
+    )
+    event = Column(String, primary_key=True)
+    samples = Column(Integer)
+    data = Column(LargeBinary)
+
+
 class Config(BASE):
     """
     Store customized information about a run.
@@ -342,6 +448,143 @@ class Config(BASE):
     value = Column(String)
 
 
+class ConfigSnapshot(BASE):
+    """
+    Store every distinct configuration of benchbuild once.
+
+    A snapshot is a set of (name, value) pairs, one for each exported
+    setting. Its id is the SHA-256 of its pairs, see
+    `benchbuild.utils.db.config_snapshot`. Runs refer to the snapshot
+    they were executed with in `RunConfig`.
+    """
+
+    __tablename__ = 'config_snapshot'
+    __table_args__ = {"info": {"write_once": True}}
+
+    id = Column(String(64), primary_key=True)
+    name = Column(String, primary_key=True)
+    value = Column(String)
+
+
+class RunConfig(BASE):
+    """Store the configuration snapshot a run was executed with."""
+
+    __tablename__ = 'run_config'
+
+    run_id = Column(
+        Integer,
+        ForeignKey("run.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True
+    )
+    snapshot_id = Column(String(64), index=True)
+
+
+class Blob(BASE):
+    """
+    Store the description of a payload in the blob store.
+
+    The body lives in the blob store (see `benchbuild.utils.blobs`), we
+    keep only its digest, its size and a short preview.
+    """
+
+    __tablename__ = 'blob'
+    __table_args__ = {"info": {"write_once": True}}
+
+    digest = Column(String(64), primary_key=True)
+    size = Column(BigInteger)
+    preview = Column(String)
+
+
+class RunBlob(BASE):
+    """
+    Store which payloads of a run live in the blob store.
+
+    The name is the column the payload belongs to, e.g., stdout.
+    """
+
+    __tablename__ = 'run_blob'
+
+    run_id = Column(
+        Integer,
+        ForeignKey("run.id", onupdate="CASCADE", ondelete="CASCADE"),
+        index=True,
+        primary_key=True
+    )
+    name = Column(String, primary_key=True)
+    digest = Column(String(64), index=True)
+
+
+def _dialect_insert(table: sa.Table,
+                    dialect: tp.Any) -> tp.Optional[sa.sql.Insert]:
+    # pylint: disable=import-outside-toplevel
+    if dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table)
+    if dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table)
+    return None
+
+
+def insert(
+    table: sa.Table,
+    dialect: tp.Any,
+    skip_existing: tp.Optional[bool] = None
+) -> sa.sql.Insert:
+    """
+    Create an INSERT statement for a table.
+
+    Tables marked as `write_once` hold rows that never change once they
+    exist, e.g., content-addressed ones. Their INSERT skips existing rows
+    on PostgreSQL and SQLite.
+
+    Args:
+        table: The table we insert into.
+        dialect: The dialect of the database we insert into.
+        skip_existing: Skip existing rows, defaults to whether the table
+            is marked as `write_once`.
+    """
+    if skip_existing is None:
+        skip_existing = table.info.get("write_once", False)
+    if not skip_existing:
+        return table.insert()
+
+    stmt = _dialect_insert(table, dialect)
+    if stmt is None:
+        return table.insert()
+    return stmt.on_conflict_do_nothing()
+
+
+def upsert(
+    table: sa.Table, dialect: tp.Any, columns: tp.Iterable[str]
+) -> tp.Optional[sa.sql.Insert]:
+    """
+    Create an INSERT statement that updates existing rows of a table.
+
+    Args:
+        table: The table we insert into.
+        dialect: The dialect of the database we insert into.
+        columns: The columns we update, if the row exists already.
+
+    Returns:
+        The statement, or None, if the dialect supports no ON CONFLICT
+        clause, i.e., neither PostgreSQL nor SQLite.
+    """
+    stmt = _dialect_insert(table, dialect)
+    if stmt is None:
+        return None
+
+    keys = [column.name for column in table.primary_key]
+    updates = {
+        column: stmt.excluded[column]
+        for column in columns
+        if column not in keys
+    }
+    if not updates:
+        return stmt.on_conflict_do_nothing(index_elements=keys)
+    return stmt.on_conflict_do_update(index_elements=keys, set_=updates)
+
+
 def needed_schema(connection, meta):
     try:
         meta.create_all(connection, checkfirst=False)
@@ -406,11 +649,31 @@ class SessionManager:
         }
     )
     def __init__(self):
+        # pylint: disable=import-outside-toplevel
+        from benchbuild.utils import spool
+
         self.__test_mode = bool(settings.CFG['db']['rollback'])
-        self.engine = create_engine(str(settings.CFG["db"]["connect_string"]))
+        spool_path = settings.CFG["db"]["spool"].value
+        if spool_path:
+            self.engine = spool.create_engine(str(spool_path))
+        else:
+            self.engine = create_engine(
+                str(settings.CFG["db"]["connect_string"])
+            )
 
         if not (self.connect_engine() and self.configure_engine()):
-            sys.exit(-3)
+            if spool_path or not settings.CFG["db"]["spool_on_failure"]:
+                sys.exit(-3)
+
+            spool_path = spool.default_path()
+            LOG.warning(
+                "Spooling to %s, merge it with 'benchbuild db sync' later.",
+                spool_path
+            )
+            spool.activate(spool_path)
+            self.engine = spool.create_engine(spool_path)
+            if not (self.connect_engine() and self.configure_engine()):
+                sys.exit(-3)
 
         self.__transaction = None
         if self.__test_mode:
@@ -419,6 +682,9 @@ class SessionManager:
 
         if needed_schema(self.connection, BASE.metadata):
             LOG.debug("Initialized new db schema.")
+        if not self.__test_mode:
+            # Otherwise sessions join this transaction and never commit.
+            self.connection.commit()
 
     def get(self):
         return sessionmaker(bind=self.connection)
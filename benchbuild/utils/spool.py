@@ -0,0 +1,182 @@
+"""
+Spool database rows to a local SQLite file, if the database is unreachable.
+
+Compute nodes often cannot reach the central database. Instead of giving
+up on the measurements of a whole run, benchbuild writes them to a spool:
+a node-local SQLite file in WAL mode with the schema of `schema.BASE`.
+
+A spool is used, if `CFG["db"]["spool"]` (BB_DB_SPOOL) names one, or, with
+`CFG["db"]["spool_on_failure"]` (BB_DB_SPOOL_ON_FAILURE), as soon as we fail
+to connect to `CFG["db"]["connect_string"]`. In the latter case, we publish
+the path of the spool to all processes we start, so that they spool right
+away instead of waiting for the database again. Spooling on failure is off
+by default: an unreachable database aborts the run, unless asked otherwise.
+
+Later, `benchbuild db sync` merges the spool into the central database in a
+single transaction (see `sync`). Runs receive new ids in the central
+database, we remap the rows that refer to them. Payloads of the blob store
+(see `benchbuild.utils.blobs`) are not part of the spool.
+
+Example:
+```bash
+  > BB_DB_SPOOL=/scratch/bb.sqlite benchbuild run -E raw ...
+  > benchbuild db sync /scratch/bb.sqlite
+```
+"""
+import logging
+import os
+import socket
+import typing as tp
+
+import sqlalchemy as sa
+
+from benchbuild.settings import CFG
+from benchbuild.utils import schema
+
+LOG = logging.getLogger(__name__)
+
+
+def default_path() -> str:
+    """The spool we fall back to, one per node."""
+    return os.path.join(
+        str(CFG["tmp_dir"]), f"spool-{socket.gethostname()}.sqlite"
+    )
+
+
+def connect_string(path: str) -> str:
+    return f"sqlite:///{os.path.abspath(path)}"
+
+
+def _configure(dbapi_connection: tp.Any, connection_record: tp.Any) -> None:
+    del connection_record
+    cursor = dbapi_connection.cursor()
+    # Wrapped processes write concurrently, WAL lets them read meanwhile.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def create_engine(path: str) -> sa.engine.Engine:
+    """
+    Create the engine of a spool.
+
+    Args:
+        path: Path of the SQLite file, created if it does not exist.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    engine = sa.create_engine(connect_string(path))
+    sa.event.listen(engine, "connect", _configure)
+    return engine
+
+
+def activate(path: str) -> None:
+    """Spool all rows of this process and of all processes it starts."""
+    CFG["db"]["spool"] = path
+    os.environ["BB_DB_SPOOL"] = path
+
+
+def _run_references(table: sa.Table) -> tp.List[str]:
+    run_id = schema.Run.__table__.c.id
+    return [
+        column.name
+        for column in table.columns
+        if any(fk.column is run_id for fk in column.foreign_keys)
+    ]
+
+
+def _chunks(result: sa.engine.Result,
+            chunk_size: int) -> tp.Iterator[tp.List[tp.Dict[str, tp.Any]]]:
+    for chunk in result.mappings().partitions(chunk_size):
+        yield [dict(row) for row in chunk]
+
+
+def _remap(
+    table: sa.Table, rows: tp.List[tp.Dict[str, tp.Any]],
+    references: tp.List[str], run_ids: tp.Dict[int, int]
+) -> tp.List[tp.Dict[str, tp.Any]]:
+    remapped = []
+    for row in rows:
+        unknown = [
+            row[column]
+            for column in references
+            if row[column] is not None and row[column] not in run_ids
+        ]
+        if unknown:
+            LOG.warning(
+                "Skipping a row of %s, the spool lacks run %s", table,
+                unknown[0]
+            )
+            continue
+        for column in references:
+            if row[column] is not None:
+                row[column] = run_ids[row[column]]
+        remapped.append(row)
+    return remapped
+
+
+def sync(
+    path: str,
+    engine: sa.engine.Engine,
+    chunk_size: int = 1000
+) -> tp.Dict[str, int]:
+    """
+    Merge a spool into a database.
+
+    All rows are written in a single transaction. Rows with natural keys,
+    e.g., experiments, run groups and projects, and the rows of write-once
+    tables are skipped, if the database holds them already. Runs receive
+    new ids, all rows that refer to a run are remapped. Rows of runs the
+    spool does not hold are skipped.
+
+    Args:
+        path: Path of the spool.
+        engine: The database we merge into.
+        chunk_size: Number of rows we read and write at once.
+
+    Returns:
+        The number of rows we read from each table of the spool.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No such spool: {path}")
+
+    run_table = schema.Run.__table__
+    run_ids: tp.Dict[int, int] = {}
+    counts: tp.Dict[str, int] = {}
+
+    spool = create_engine(path)
+    try:
+        spooled = set(sa.inspect(spool).get_table_names())
+        with spool.connect() as source, engine.begin() as target:
+            schema.BASE.metadata.create_all(target, checkfirst=True)
+            for table in schema.BASE.metadata.sorted_tables:
+                if table.name not in spooled:
+                    continue
+
+                references = _run_references(table)
+                counts[table.name] = 0
+                result = source.execute(sa.select(table))
+                for rows in _chunks(result, chunk_size):
+                    counts[table.name] += len(rows)
+                    if table is run_table:
+                        old_ids = [row.pop("id") for row in rows]
+                        new_ids = target.execute(
+                            table.insert().returning(
+                                table.c.id, sort_by_parameter_order=True
+                            ), rows
+                        ).scalars().all()
+                        run_ids.update(zip(old_ids, new_ids))
+                        continue
+
+                    rows = _remap(table, rows, references, run_ids)
+                    if not rows:
+                        continue
+                    insert = schema.insert(
+                        table, target.dialect, skip_existing=not references
+                    )
+                    target.execute(insert, rows)
+                LOG.debug("Synced %d rows of %s", counts[table.name], table)
+    finally:
+        spool.dispose()
+    return counts
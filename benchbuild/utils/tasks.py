@@ -1,10 +1,66 @@
 """
 The task module distributes benchbuild's excution plans over processes.
+
+An execution plan is a list of `actions.Experiment` steps. Instead of
+executing one experiment after another, we flatten the plan into a graph
+of `PlanNode`s:
+
+    * Every child of an experiment becomes a node. The steps inside a
+      `RequireAll` chain stay together in a single node, because they
+      depend on each other.
+    * `CleanExtra` acts as a final barrier. It requires every other node
+      of the plan, because it removes paths that might still be in use by
+      any other experiment.
+    * The closing `Echo` of an experiment requires all nodes of the same
+      experiment.
+
+Lazy experiments plan their children while the plan executes: the
+`PlanSchedule` pulls a new child whenever only a few nodes are ready to
+run. Memory stays bounded by the number of planned, but unfinished nodes.
+
+Nodes are submitted as soon as all of their requirements are done, a
+worker is free and the node fits into the machine's `ResourceBudget`.
+Results are streamed back in order of completion. Whenever a node starts,
+the sources of the next projects are fetched in the background (see
+`benchbuild.utils.prefetch`).
+
+While nodes run in parallel, the executor serves a machine-wide pool of CPU
+tokens (see `benchbuild.utils.jobserver`) sized to the core budget. Our
+compiler wrappers and `SetThreadLimit` draw from it, so the parallel builds
+of all nodes together do not oversubscribe the machine. A node itself does
+not hold a token while it runs, because the tokens are needed by the
+processes it spawns.
+
+With a database, the executor also serves a collector (see
+`benchbuild.utils.collector`), which writes the results of all wrapped
+binaries and compiler wrappers on a single connection.
 """
+import collections
+import contextlib
+import itertools
+import logging
+import os
+import queue
+import sys
+import traceback
 import typing as tp
 
+import attr
+
 import benchbuild.utils.actions as actns
 from benchbuild import Experiment, Project
+from benchbuild.settings import CFG
+from benchbuild.utils import (
+    build_cache,
+    collector,
+    jobserver,
+    journal,
+    prefetch,
+)
+from benchbuild.utils import requirements as reqs
+from benchbuild.utils.settings import available_cpu_count
+
+LOG = logging.getLogger(__name__)
 
 ExperimentT = tp.Type[Experiment]
 ProjectT = tp.Type[Project]
@@ -15,6 +71,616 @@ Actions = tp.Sequence[actns.Step]
 StepResults = tp.List[actns.StepResult]
 
 
+@attr.s(eq=False)
+class PlanNode:
+    """
+    A single schedulable unit of an execution plan.
+
+    Attributes:
+        step: The step we execute for this node.
+        experiment: The experiment action this node belongs to, if any.
+        requires: All nodes that have to be completed before this node.
+        required_by: All nodes that wait for this node.
+    """
+    step: actns.Step = attr.ib()
+    experiment: tp.Optional[actns.Experiment] = attr.ib(default=None)
+    requires: tp.Set['PlanNode'] = attr.ib(default=attr.Factory(set))
+    required_by: tp.Set['PlanNode'] = attr.ib(default=attr.Factory(set))
+
+    def require(self, other: 'PlanNode') -> None:
+        """Add an edge from other to this node."""
+        self.requires.add(other)
+        other.required_by.add(self)
+
+
+PlanGraph = tp.List[PlanNode]
+NodeResult = tp.Tuple[actns.Step, actns.StepResult]
+
+
+def _is_closing(exp_action: actns.Experiment, step: actns.Step) -> bool:
+    return isinstance(step, actns.Echo) and step is exp_action.actions[-1]
+
+
+@attr.s(eq=False)
+class _Planning:
+    """
+    An experiment that still plans children.
+
+    Attributes:
+        action: The experiment.
+        segment: The segment the experiment belongs to.
+        closing: The node of the experiment's closing `Echo`.
+        held: All nodes that wait for the experiment to finish planning.
+    """
+    action: actns.Experiment = attr.ib()
+    segment: '_Segment' = attr.ib()
+    closing: PlanNode = attr.ib()
+    held: PlanGraph = attr.ib(default=attr.Factory(list))
+
+
+@attr.s(eq=False)
+class _Segment:
+    """
+    All experiments between two top-level steps that are not experiments.
+
+    Attributes:
+        fence: The top-level step before this segment.
+        next_fence: The top-level step after this segment.
+        planning: All experiments of this segment that still plan children.
+        members: All unfinished nodes, except barriers and closing nodes.
+        barriers: All unfinished `CleanExtra` nodes.
+        closings: All unfinished closing nodes.
+    """
+    fence: tp.Optional[PlanNode] = attr.ib(default=None)
+    next_fence: tp.Optional[PlanNode] = attr.ib(default=None)
+    planning: tp.List[_Planning] = attr.ib(default=attr.Factory(list))
+    members: tp.Set[PlanNode] = attr.ib(default=attr.Factory(set))
+    barriers: tp.Set[PlanNode] = attr.ib(default=attr.Factory(set))
+    closings: tp.Set[PlanNode] = attr.ib(default=attr.Factory(set))
+
+    def unfinished(self) -> tp.Set[PlanNode]:
+        return self.members | self.barriers | self.closings
+
+
+class PlanSchedule:
+    """
+    The dependency graph of an execution plan, grown while we execute it.
+
+    Lazy experiments (see `actions.Experiment.pull`) plan their children on
+    demand. `pull` adds the next child to the graph. Nodes that depend on
+    the children of an experiment, i.e., barriers, the closing node and the
+    next top-level step, are held back until the experiment finished
+    planning.
+
+    Finished nodes are forgotten, so the schedule only keeps the nodes that
+    are planned, but not finished yet.
+
+    Args:
+        plan: The plan we want to execute.
+
+    Attributes:
+        ready: All nodes whose requirements are done.
+        missing: The number of unfinished requirements of every node.
+        created: All nodes created since the last call of `take_created`.
+    """
+
+    def __init__(self, plan: Actions) -> None:
+        self.ready: tp.Deque[PlanNode] = collections.deque()
+        self.missing: tp.Dict[PlanNode, int] = {}
+        self.created: PlanGraph = []
+        self._segments: tp.List[_Segment] = []
+        self._segment_of: tp.Dict[PlanNode, _Segment] = {}
+        self._building = True
+
+        segment = _Segment()
+        self._segments.append(segment)
+        for action in plan:
+            if not isinstance(action, actns.Experiment):
+                fence = self._new(action, segment)
+                self._require(fence, segment.fence)
+                for other in segment.unfinished():
+                    self._require(fence, other)
+                for planning in segment.planning:
+                    self._hold(fence, planning)
+                segment.next_fence = fence
+                self.created.append(fence)
+
+                segment = _Segment(fence=fence)
+                self._segments.append(segment)
+                continue
+
+            closing = self._new(action.actions[-1], segment, action)
+            self._require(closing, segment.fence)
+            planning = _Planning(action, segment, closing)
+            self._hold(closing, planning)
+            for barrier in segment.barriers:
+                self._hold(barrier, planning)
+            segment.planning.append(planning)
+
+            for child in action.actions[:-1]:
+                self._add(planning, child)
+            if not action.is_lazy:
+                self._stop_planning(planning)
+            segment.closings.add(closing)
+            self.created.append(closing)
+
+        self._building = False
+        self.ready.extend(n for n in self.created if self.missing[n] == 0)
+
+    def _new(
+        self,
+        step: actns.Step,
+        segment: _Segment,
+        experiment: tp.Optional[actns.Experiment] = None
+    ) -> PlanNode:
+        node = PlanNode(step, experiment=experiment)
+        self.missing[node] = 0
+        self._segment_of[node] = segment
+        return node
+
+    def _require(self, node: PlanNode, other: tp.Optional[PlanNode]) -> None:
+        if other is None or other not in self.missing:
+            return
+        if other not in node.requires:
+            node.require(other)
+            self.missing[node] += 1
+
+    def _hold(self, node: PlanNode, planning: _Planning) -> None:
+        planning.held.append(node)
+        self.missing[node] += 1
+
+    def _release(self, node: PlanNode) -> None:
+        self.missing[node] -= 1
+        if self.missing[node] == 0 and not self._building:
+            self.ready.append(node)
+
+    def _add(self, planning: _Planning, step: actns.Step) -> PlanNode:
+        segment = planning.segment
+        node = self._new(step, segment, planning.action)
+        self._require(node, segment.fence)
+        if isinstance(step, actns.CleanExtra):
+            for member in segment.members:
+                self._require(node, member)
+            for other in segment.planning:
+                self._hold(node, other)
+            segment.barriers.add(node)
+        else:
+            for barrier in segment.barriers:
+                self._require(barrier, node)
+            segment.members.add(node)
+
+        self._require(planning.closing, node)
+        if segment.next_fence is not None:
+            self._require(segment.next_fence, node)
+        self.created.append(node)
+        if self.missing[node] == 0 and not self._building:
+            self.ready.append(node)
+        return node
+
+    def _stop_planning(self, planning: _Planning) -> None:
+        planning.segment.planning.remove(planning)
+        for node in planning.held:
+            self._release(node)
+        planning.held.clear()
+
+    def pull(self) -> bool:
+        """
+        Plan the next child of the first lazy experiment we may start.
+
+        Returns:
+            False, if there is nothing we could plan right now.
+        """
+        while self._segments:
+            segment = self._segments[0]
+            if segment.fence is not None and segment.fence in self.missing:
+                return False
+            if not segment.planning:
+                self._segments.pop(0)
+                continue
+
+            planning = segment.planning[0]
+            child = planning.action.pull()
+            if child is None:
+                self._stop_planning(planning)
+            else:
+                self._add(planning, child)
+            return True
+        return False
+
+    def finish(self, node: PlanNode) -> None:
+        """
+        Mark a node as done and release all nodes that wait for it.
+
+        Args:
+            node: The node that has been executed.
+        """
+        del self.missing[node]
+        segment = self._segment_of.pop(node)
+        segment.members.discard(node)
+        segment.barriers.discard(node)
+        segment.closings.discard(node)
+
+        for waiting in node.required_by:
+            waiting.requires.discard(node)
+            self._release(waiting)
+        node.required_by.clear()
+
+    def take_created(self) -> PlanGraph:
+        """Return all nodes created since the last call."""
+        created, self.created = self.created, []
+        return created
+
+
+def plan_graph(plan: Actions) -> PlanGraph:
+    """
+    Convert an execution plan into a dependency graph.
+
+    Top-level steps that are not experiments keep their sequential
+    semantics: they require all nodes created before them and all nodes
+    created after them require them.
+
+    Lazy experiments of the plan are expanded.
+
+    Args:
+        plan: The plan we want to execute.
+
+    Returns:
+        All nodes of the graph, in plan order.
+    """
+    for action in plan:
+        if isinstance(action, actns.Experiment):
+            action.expand()
+    return PlanSchedule(plan).created
+
+
+@attr.s(frozen=True)
+class Resources:
+    """
+    Resources a node occupies on the local machine while it runs.
+
+    Attributes:
+        cores: The number of cores.
+        memory: The amount of memory in bytes.
+        exclusive: The node has to run alone.
+    """
+    cores: int = attr.ib(default=0)
+    memory: int = attr.ib(default=0)
+    exclusive: bool = attr.ib(default=False)
+
+
+def resources_of(node: PlanNode) -> Resources:
+    """
+    Read the local resource demand of a node.
+
+    The demand is derived from the `REQUIREMENTS` of the node's project and
+    experiment. `SlurmCoresPerSocket` is taken as the number of cores,
+    `SlurmMem` as the amount of memory and `SlurmExclusive` forces the node
+    to run alone. A project without any requirements occupies a single core.
+    Nodes without a project, e.g., `Echo`, do not occupy anything.
+
+    Args:
+        node: The node we want the resources for.
+    """
+    project = actns.project_of(node.step)
+    if project is None:
+        return Resources()
+
+    requirements = list(type(project).REQUIREMENTS)
+    if node.experiment is not None:
+        requirements = reqs.merge_slurm_options(
+            requirements, list(node.experiment.experiment.REQUIREMENTS)
+        )
+
+    cores = 1
+    memory = 0
+    exclusive = False
+    for requirement in requirements:
+        if isinstance(requirement, reqs.SlurmCoresPerSocket):
+            cores = requirement.cores
+        elif isinstance(requirement, reqs.SlurmMem):
+            memory = requirement.mem_req
+        elif isinstance(requirement, reqs.SlurmExclusive):
+            exclusive = True
+
+    return Resources(cores=cores, memory=memory, exclusive=exclusive)
+
+
+def _default_cores() -> int:
+    cores = int(CFG["resources"]["cores"])
+    return cores if cores > 0 else available_cpu_count()
+
+
+def _default_memory() -> int:
+    memory = CFG["resources"]["memory"].value
+    if memory:
+        return reqs.SlurmMem(str(memory)).mem_req
+
+    import psutil  # pylint: disable=import-outside-toplevel
+    return int(psutil.virtual_memory().total)
+
+
+@attr.s
+class ResourceBudget:
+    """
+    Track the resources of the local machine that are in use.
+
+    Demands larger than the budget are clamped to the budget, i.e., they
+    can run as soon as the machine is idle.
+
+    Attributes:
+        cores: The number of cores we may use.
+        memory: The amount of memory in bytes we may use.
+    """
+    cores: int = attr.ib(default=attr.Factory(_default_cores))
+    memory: int = attr.ib(default=attr.Factory(_default_memory))
+
+    used_cores: int = attr.ib(init=False, default=0)
+    used_memory: int = attr.ib(init=False, default=0)
+    exclusive: bool = attr.ib(init=False, default=False)
+    running: int = attr.ib(init=False, default=0)
+
+    def clamp(self, demand: Resources) -> Resources:
+        return Resources(
+            cores=min(demand.cores, self.cores),
+            memory=min(demand.memory, self.memory),
+            exclusive=demand.exclusive
+        )
+
+    def fits(self, demand: Resources) -> bool:
+        """Check, if the demand can be satisfied right now."""
+        if self.exclusive:
+            return False
+        if demand.exclusive:
+            return self.running == 0
+
+        demand = self.clamp(demand)
+        return (
+            self.used_cores + demand.cores <= self.cores and
+            self.used_memory + demand.memory <= self.memory
+        )
+
+    def acquire(self, demand: Resources) -> None:
+        demand = self.clamp(demand)
+        self.used_cores += demand.cores
+        self.used_memory += demand.memory
+        self.exclusive = self.exclusive or demand.exclusive
+        self.running += 1
+
+    def release(self, demand: Resources) -> None:
+        demand = self.clamp(demand)
+        self.used_cores -= demand.cores
+        self.used_memory -= demand.memory
+        if demand.exclusive:
+            self.exclusive = False
+        self.running -= 1
+
+
+def _next_fitting(
+    ready: tp.Deque[PlanNode], budget: ResourceBudget,
+    demands: tp.Mapping[PlanNode, Resources]
+) -> tp.Optional[PlanNode]:
+    """
+    Take the first ready node that fits into the budget.
+
+    An exclusive node at the head of the queue drains the machine: nothing
+    else is admitted until it could run.
+    """
+    for node in ready:
+        demand = demands[node]
+        if budget.fits(demand):
+            ready.remove(node)
+            return node
+        if demand.exclusive:
+            return None
+    return None
+
+
+StepTy = tp.TypeVar("StepTy", bound=actns.Step)
+
+
+def _steps_of(steps: Actions, kind: tp.Type[StepTy]) -> tp.Iterator[StepTy]:
+    for step in steps:
+        if isinstance(step, kind):
+            yield step
+        elif isinstance(step, actns.MultiStep):
+            yield from _steps_of(step.actions, kind)
+
+
+def run_node(step: actns.Step) -> actns.StepResult:
+    """
+    Execute a single node of the plan graph.
+
+    Any exception is logged and turned into a failed result. This keeps
+    one broken node from tearing down the whole executor.
+
+    Args:
+        step: The step we want to execute.
+    """
+    try:
+        return step()
+    except Exception:  # pylint: disable=broad-except
+        LOG.error("Step terminates because we got an exception:")
+        e_type, e_value, e_traceb = sys.exc_info()
+        lines = traceback.format_exception(e_type, e_value, e_traceb)
+        LOG.error("".join(lines))
+    return actns.StepResult.ERROR
+
+
+class _InlinePool:
+    """Execute nodes synchronously in the calling process."""
+
+    def __enter__(self) -> '_InlinePool':
+        return self
+
+    def __exit__(self, *args: tp.Any) -> None:
+        pass
+
+    def apply_async(
+        self, func: tp.Callable[..., actns.StepResult], args: tp.Tuple[tp.Any,
+                                                                       ...],
+        callback: tp.Callable[[actns.StepResult], None],
+        error_callback: tp.Callable[[BaseException], None]
+    ) -> None:
+        del error_callback
+        callback(func(*args))
+
+
+def _make_pool(num_processes: int) -> tp.Any:
+    if num_processes <= 1:
+        return _InlinePool()
+
+    # pylint: disable=import-outside-toplevel
+    import pathos.multiprocessing as mp
+    return mp.Pool(num_processes)
+
+
+def _interleaving(plan: Actions) -> tp.Dict[int, tp.List[actns.Experiment]]:
+    """Map every interleaving step to the experiments of its variants."""
+    experiments = [a for a in plan if isinstance(a, actns.Experiment)]
+    return {
+        id(step): [
+            exp for exp in experiments
+            if any(v.experiment is exp.experiment for v in step.actions)
+        ]
+        for step in plan
+        if isinstance(step, actns.InterleavedWorkloads)
+    }
+
+
+def stream_plan(
+    plan: Actions,
+    num_processes: tp.Optional[int] = None,
+    budget: tp.Optional[ResourceBudget] = None
+) -> tp.Generator[NodeResult, None, None]:
+    """
+    Execute the plan and stream the results as soon as they are available.
+
+    Lazy experiments are planned just in time: we keep a small window of
+    ready nodes ahead of the running ones.
+
+    Args:
+        plan: The plan we want to execute.
+        num_processes: The number of nodes we execute concurrently.
+            Defaults to the 'parallel_processes' setting.
+        budget: The resources of the local machine we may use.
+            Defaults to the 'resources' settings.
+
+    Yields:
+        Pairs of executed step and its result, in order of completion.
+    """
+    if num_processes is None:
+        num_processes = int(CFG["parallel_processes"])
+    if budget is None:
+        budget = ResourceBudget()
+
+    schedule = PlanSchedule(plan)
+    window = 2 * max(num_processes, 1) + int(CFG["prefetch"]["lookahead"])
+    demands: tp.Dict[PlanNode, Resources] = {}
+    done: 'queue.Queue[tp.Tuple[PlanNode, actns.StepResult]]' = queue.Queue()
+
+    exp_results: tp.Dict[actns.Experiment,
+                         StepResults] = collections.defaultdict(list)
+    exp_open: tp.List[actns.Experiment] = []
+    exp_closed: tp.List[actns.Experiment] = []
+
+    # Experiments end after the interleaved workloads of their projects.
+    interleaving = _interleaving(plan)
+    exp_waiting: tp.Counter[actns.Experiment] = collections.Counter(
+        itertools.chain(*interleaving.values())
+    )
+    moved = {
+        id(chain)
+        for step in plan if isinstance(step, actns.InterleavedWorkloads)
+        for chain in step.chains
+    }
+
+    def plan_ahead(prefetcher: prefetch.Prefetcher) -> None:
+        while len(schedule.ready) < window and schedule.pull():
+            pass
+
+        for node in schedule.take_created():
+            demands[node] = resources_of(node)
+            for env in _steps_of([node.step], actns.ProjectEnvironment):
+                prefetcher.add(env.project)
+
+    def submit(
+        pool: tp.Any, prefetcher: prefetch.Prefetcher, node: PlanNode
+    ) -> None:
+        exp = node.experiment
+        if exp is not None and exp not in exp_open:
+            exp.begin()
+            exp_open.append(exp)
+
+        for env in _steps_of([node.step], actns.ProjectEnvironment):
+            env.prefetched = prefetcher.is_fetched(env.project)
+            prefetcher.advance(env.project)
+
+        def on_result(result: actns.StepResult) -> None:
+            done.put((node, result))
+
+        def on_error(error: BaseException) -> None:
+            LOG.error("Step failed in worker: %s", str(error))
+            done.put((node, actns.StepResult.ERROR))
+
+        pool.apply_async(
+            run_node, (node.step,),
+            callback=on_result,
+            error_callback=on_error
+        )
+
+    tokens: tp.ContextManager[tp.Any] = contextlib.nullcontext()
+    if num_processes > 1:
+        tokens = jobserver.serve(budget.cores)
+
+    running = 0
+    try:
+        with tokens, collector.serve(), _make_pool(num_processes) as pool, \
+                prefetch.Prefetcher() as prefetcher:
+            while True:
+                plan_ahead(prefetcher)
+                ready = schedule.ready
+                while ready and running < max(num_processes, 1):
+                    if (node := _next_fitting(ready, budget, demands)) is None:
+                        break
+                    budget.acquire(demands[node])
+                    submit(pool, prefetcher, node)
+                    running += 1
+
+                if not running:
+                    break
+
+                node, result = done.get()
+                budget.release(demands.pop(node))
+                running -= 1
+                node.step.status = result
+                schedule.finish(node)
+
+                exp = node.experiment
+                if exp is not None and isinstance(node.step, actns.RequireAll) \
+                        and id(node.step) not in moved:
+                    if (project := actns.project_of(node.step)) is not None:
+                        journal.record(exp.experiment, project, result)
+
+                if exp is not None:
+                    exp_results[exp].append(result)
+                    if _is_closing(exp, node.step):
+                        exp_closed.append(exp)
+                for waiting in interleaving.pop(id(node.step), []):
+                    exp_results[waiting].append(result)
+                    exp_waiting[waiting] -= 1
+                for closed in [e for e in exp_closed if not exp_waiting[e]]:
+                    exp_closed.remove(closed)
+                    exp_open.remove(closed)
+                    closed.end(exp_results.pop(closed))
+
+                yield node.step, result
+    except KeyboardInterrupt:
+        LOG.info("Execution plan aborting by user request")
+    finally:
+        for exp in exp_open:
+            exp.end(exp_results[exp] + [actns.StepResult.ERROR])
+
+
 def execute_plan(plan: Actions) -> StepResults:
     """"Execute the plan.
 
@@ -24,17 +690,191 @@ def execute_plan(plan: Actions) -> StepResults:
     Returns:
         A list failed of StepResults.
     """
-    results = [action() for action in plan]
-    return [result for result in results if actns.step_has_failed(result)]
+    return [
+        result for _, result in stream_plan(plan)
+        if actns.step_has_failed(result)
+    ]
+
 
+def _unfinished(exp: Experiment,
+                children: tp.Iterable[actns.Step]) -> tp.Iterator[actns.Step]:
+    for child in children:
+        project = actns.project_of(child)
+        if isinstance(child, actns.RequireAll) and project is not None:
+            if journal.is_completed(exp, project):
+                LOG.info("Skipping finished chain: %s", project.id)
+                continue
+        yield child
 
-def generate_plan(exps: ExperimentTs, prjs: ProjectTs) -> Actions:
+
+def resume_plan(plan: Actions) -> Actions:
+    """
+    Drop all project chains the journal marks as finished.
+
+    Args:
+        plan: The plan of the resumed run.
+
+    Returns:
+        The plan without the finished chains.
+    """
+    for action in plan:
+        if not isinstance(action, actns.Experiment):
+            continue
+
+        exp = action.experiment
+        if action.pending is not None:
+            action.pending = _unfinished(exp, action.pending)
+        action.actions = list(_unfinished(exp, action.actions))
+    return plan
+
+
+def _shared_root() -> str:
+    shared_root = os.path.join(
+        str(CFG["build_dir"]), ".benchbuild-shared-builds"
+    )
+    cleanup_paths = CFG["cleanup_paths"].value
+    if shared_root not in cleanup_paths:
+        CFG["cleanup_paths"] = cleanup_paths + [shared_root]
+    return shared_root
+
+
+def _share_all(children: tp.Iterator[actns.Step],
+               shared_root: str) -> tp.Iterator[actns.Step]:
+    for child in children:
+        for step in _steps_of([child], actns.Compile):
+            step.shared_builds = shared_root
+        yield child
+
+
+def share_builds(plan: Actions) -> int:
+    """
+    Let identical builds of different experiments share a single compile.
+
+    Sharing is off, unless `CFG["build_cache"]["share"]` is set. Compile
+    steps are grouped by their build configuration (see
+    `benchbuild.utils.build_cache.key_of`). Every group with more than one
+    step gets a shared build cache below the build directory. Whichever step
+    of a group runs first compiles, the others restore its build, if it is
+    portable (see `build_cache.is_portable`). The shared cache is removed
+    by `CleanExtra`.
+
+    Lazy experiments do not know their compile steps in advance, so we
+    cannot tell which builds are identical. Only with
+    `CFG["build_cache"]["share_lazy"]`, every compile step of a plan with
+    lazy experiments and more than one experiment goes through the shared
+    build cache, whether another experiment reuses it or not.
+
+    Args:
+        plan: The plan we want to execute.
+
+    Returns:
+        The number of compile steps that are known to restore a shared build.
+    """
+    if not CFG["build_cache"]["share"]:
+        return 0
+
+    experiments = [a for a in plan if isinstance(a, actns.Experiment)]
+    if any(exp.is_lazy for exp in experiments):
+        if len(experiments) > 1 and CFG["build_cache"]["share_lazy"]:
+            shared_root = _shared_root()
+            for step in _steps_of(plan, actns.Compile):
+                step.shared_builds = shared_root
+            for exp in experiments:
+                if exp.pending is not None:
+                    exp.pending = _share_all(exp.pending, shared_root)
+        return 0
+
+    groups: tp.Dict[str, tp.List[actns.Compile]] = collections.defaultdict(
+        list
+    )
+    for step in _steps_of(plan, actns.Compile):
+        groups[build_cache.digest_of(step.project)].append(step)
+
+    shared = 0
+    for steps in groups.values():
+        if len(steps) < 2:
+            continue
+        shared_root = _shared_root()
+        for step in steps:
+            step.shared_builds = shared_root
+        shared += len(steps) - 1
+
+    if shared:
+        LOG.info("Sharing builds saves %d compile steps.", shared)
+    return shared
+
+
+def interleave_workloads(plan: tp.MutableSequence[actns.Step]) -> int:
+    """
+    Run the workloads of all variants of a project in turns.
+
+    Variants are the `RunWorkloads` of the same project in different
+    experiments or revisions. We take them out of their project chains and
+    append an `InterleavedWorkloads` step per project to the plan. The
+    `Clean` steps that follow them move to the end of the plan, so the
+    builds of all variants stay available until the interleaving is done.
+    The interleaving journals the chains and `stream_plan` ends their
+    experiments only after it, not when the stripped chains finish.
+
+    This needs a fully planned plan, lazy experiments are left untouched.
+
+    Args:
+        plan: The plan we modify in place.
+
+    Returns:
+        The number of interleaved projects.
+    """
+    variants: tp.Dict[str, tp.List[tp.Tuple[actns.RequireAll, int]]] = {}
+    for exp_action in plan:
+        if not isinstance(exp_action, actns.Experiment) or \
+                exp_action.is_lazy:
+            continue
+        for chain in _steps_of(exp_action.actions, actns.RequireAll):
+            for idx, step in enumerate(chain.actions):
+                if isinstance(step, actns.RunWorkloads):
+                    key = f"{step.project.group}/{step.project.name}"
+                    variants.setdefault(key, []).append((chain, idx))
+                    break
+
+    interleaved = []
+    deferred = []
+    for members in variants.values():
+        if len(members) < 2:
+            continue
+        run_workloads = []
+        chains = []
+        for chain, idx in members:
+            run_workloads.append(chain.actions[idx])
+            chains.append(chain)
+            rest = chain.actions[idx + 1:]
+            chain.actions = chain.actions[:idx] + [
+                step for step in rest if not isinstance(step, actns.Clean)
+            ]
+            deferred.extend(
+                step for step in rest if isinstance(step, actns.Clean)
+            )
+        interleaved.append(actns.InterleavedWorkloads(run_workloads, chains))
+
+    plan.extend(interleaved)
+    if deferred:
+        plan.append(actns.Any(actions=deferred))
+    return len(interleaved)
+
+
+def generate_plan(
+    exps: ExperimentTs, prjs: ProjectTs, lazy: bool = False
+) -> Actions:
     """
     Generate an execution plan for the given experimetns and projects.
 
+    Experiments that compile a project in the same way share a single build
+    (see `share_builds`).
+
     Args:
         exps: list of experiments.
         prjs: list of projects to populate each experiment with.
+        lazy: Plan the actions of each experiment on demand, while the
+            plan is executed (see `Experiment.iter_actions`).
 
     Returns:
         a list of experiment actions suitable for execution.
@@ -42,5 +882,26 @@ def generate_plan(exps: ExperimentTs, prjs: ProjectTs) -> Actions:
     actions = []
     for exp_cls in exps:
         exp = exp_cls(projects=prjs)
-        actions.append(actns.Experiment(exp, actions=exp.actions()))
+        exp_actions = exp.iter_actions() if lazy else exp.actions()
+        actions.append(actns.Experiment(exp, actions=exp_actions))
+    share_builds(actions)
     return actions
+
+
+def estimate_num_actions(plan: Actions) -> int:
+    """
+    Estimate the number of actions in a plan with lazy experiments.
+
+    Args:
+        plan: The plan we want to execute.
+
+    Returns:
+        The exact number of actions for plans without lazy experiments,
+        an estimate otherwise (see `Experiment.estimate_num_actions`).
+    """
+    num_actions = 0
+    for action in plan:
+        num_actions += len(action)
+        if isinstance(action, actns.Experiment) and action.is_lazy:
+            num_actions += action.experiment.estimate_num_actions()
+    return num_actions
@@ -0,0 +1,369 @@
+"""
+Write-behind queue for the database.
+
+Tracked executions produce many small rows: logs, metrics, configs and
+status updates. Writing each of them in its own round-trip dominates short
+workloads on a remote database. The `BatchWriter` collects them instead
+and writes them in bulk, with one executemany INSERT or UPDATE per table,
+from a background thread.
+
+The writer quacks like the parts of a SQLAlchemy session that our
+`persist_*` functions use, so they can write to it unchanged:
+
+    * `add`/`add_all` queue an INSERT for new objects and an UPDATE of the
+      changed columns for objects that already exist in the database.
+    * `execute(insert(table), rows)` queues the rows.
+    * `query` writes all queued rows first, then queries.
+    * `commit` is a no-op, rows are written in the background.
+
+Queued rows are written when the queue reaches `batch_size`, every
+`interval` seconds, at the end of a run group, on SIGTERM and at exit.
+
+Forked children do not inherit the queue: the rows belong to the parent,
+which writes them. The child starts over with fresh locks and without a
+background thread, so it never waits for a lock that a thread of the
+parent held while forking.
+"""
+import atexit
+import collections
+import contextlib
+import logging
+import os
+import threading
+import typing as tp
+import weakref
+
+import sqlalchemy as sa
+
+from benchbuild import signals
+from benchbuild.settings import CFG
+
+LOG = logging.getLogger(__name__)
+
+Row = tp.Dict[str, tp.Any]
+
+
+def _columns(state: tp.Any) -> tp.List[tp.Tuple[str, str]]:
+    return [(prop.key, prop.columns[0].key)
+            for prop in state.mapper.column_attrs]
+
+
+def values(obj: tp.Any) -> Row:
+    """The column values of a new ORM object, without the unset ones."""
+    state = sa.inspect(obj)
+    return {
+        column: state.dict[attr]
+        for attr, column in _columns(state)
+        if state.dict.get(attr) is not None
+    }
+
+
+def _uses_threads(engine: sa.engine.Engine) -> bool:
+    """Check, if a second connection sees the same database."""
+    if bool(CFG["db"]["rollback"]):
+        return False
+    url = engine.url
+    return not (
+        url.get_backend_name() == "sqlite" and
+        url.database in (None, "", ":memory:")
+    )
+
+
+class BatchWriter:
+    """
+    Collect rows and write them in bulk.
+
+    All settings default to `CFG["db"]`.
+
+    Args:
+        engine: The engine we write with.
+        batch_size: Write as soon as this many rows are queued.
+        interval: Write queued rows after this many seconds.
+        threaded: Write from a background thread on a connection of our
+            own. Without it, we write only on `flush`, on the connection of
+            the shared `schema.Session`. Defaults to threaded, unless the
+            database is in-memory or rolled back.
+    """
+
+    def __init__(
+        self,
+        engine: sa.engine.Engine,
+        batch_size: tp.Optional[int] = None,
+        interval: tp.Optional[float] = None,
+        threaded: tp.Optional[bool] = None
+    ) -> None:
+        cfg = CFG["db"]
+        self.engine = engine
+        self.batch_size = int(
+            batch_size if batch_size is not None else cfg["batch_size"].value
+        )
+        self.interval = float(
+            interval if interval is not None else cfg["flush_interval"].value
+        )
+        self.threaded = _uses_threads(engine) if threaded is None else threaded
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._inserts: tp.Dict[sa.Table, tp.List[Row]] = \
+            collections.defaultdict(list)
+        self._updates: tp.List[tp.Tuple[sa.Table, Row]] = []
+        self._queued = 0
+        self._error: tp.Optional[BaseException] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: tp.Optional[threading.Thread] = None
+
+        signals.handlers.register(self.flush)
+        self._handles_signals = True
+        _WRITERS.add(self)
+
+    def __len__(self) -> int:
+        return self._queued
+
+    def _forked(self) -> None:
+        """Forget everything we inherited from the parent process."""
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._inserts = collections.defaultdict(list)
+        self._updates = []
+        self._queued = 0
+        self._error = None
+        self._wake = threading.Event()
+        self._thread = None
+        if self._handles_signals:
+            signals.handlers.deregister(self.flush)
+            self._handles_signals = False
+        if self.engine is not None:
+            # Pooled connections belong to the parent.
+            self.engine.dispose(close=False)
+
+    def _queue_insert(self, table: sa.Table, rows: tp.Iterable[Row]) -> None:
+        rows = list(rows)
+        with self._lock:
+            self._inserts[table].extend(rows)
+            self._queued += len(rows)
+        self._queued_rows()
+
+    def _queue_update(self, table: sa.Table, row: Row) -> None:
+        with self._lock:
+            self._updates.append((table, row))
+            self._queued += 1
+        self._queued_rows()
+
+    def _queued_rows(self) -> None:
+        if not self.threaded:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="db-writer", daemon=True
+            )
+            self._thread.start()
+        if self._queued >= self.batch_size:
+            self._wake.set()
+
+    def add(self, obj: tp.Any) -> None:
+        """Queue an ORM object, like `Session.add`."""
+        state = sa.inspect(obj)
+        table = state.mapper.local_table
+        if state.key is None:
+            self._queue_insert(table, [values(obj)])
+            return
+
+        # Only what changed since it was loaded, plus the primary key.
+        keys = {column.key for column in table.primary_key}
+        row = {
+            column: state.dict[attr]
+            for attr, column in _columns(state)
+            if attr in state.dict and
+            (column in keys or state.attrs[attr].history.has_changes())
+        }
+        self._queue_update(table, row)
+
+    def put(
+        self, inserts: tp.Dict[sa.Table, tp.List[Row]],
+        updates: tp.List[tp.Tuple[sa.Table, Row]]
+    ) -> None:
+        """Queue rows that another writer collected."""
+        for table, rows in inserts.items():
+            self._queue_insert(table, rows)
+        for table, row in updates:
+            self._queue_update(table, row)
+
+    def add_all(self, objs: tp.Iterable[tp.Any]) -> None:
+        """Queue ORM objects, like `Session.add_all`."""
+        for obj in objs:
+            self.add(obj)
+
+    def execute(self, statement: tp.Any, params: tp.Any = None) -> tp.Any:
+        """
+        Queue the rows of a bulk INSERT, execute everything else.
+
+        Everything but a bulk INSERT is executed right away on the shared
+        `schema.Session`, after all queued rows are written.
+        """
+        if isinstance(statement, sa.sql.Insert) and isinstance(params, list):
+            self._queue_insert(statement.table, params)
+            return None
+        return self.__session().execute(statement, params)
+
+    def query(self, *entities: tp.Any, **kwargs: tp.Any) -> tp.Any:
+        """Write all queued rows and query the shared `schema.Session`."""
+        return self.__session().query(*entities, **kwargs)
+
+    def commit(self) -> None:
+        """Nothing to do, we write in the background."""
+
+    def __session(self) -> tp.Any:
+        # pylint: disable=import-outside-toplevel
+        from benchbuild.utils import schema
+
+        self.flush()
+        return schema.Session()
+
+    def _take(self) -> tp.Tuple[tp.Dict[sa.Table, tp.List[Row]], tp.List[
+        tp.Tuple[sa.Table, Row]]]:
+        with self._lock:
+            inserts, updates = self._inserts, self._updates
+            self._inserts = collections.defaultdict(list)
+            self._updates = []
+            self._queued = 0
+        return inserts, updates
+
+    def _write(
+        self, connection: tp.Any, inserts: tp.Dict[sa.Table, tp.List[Row]],
+        updates: tp.List[tp.Tuple[sa.Table, Row]]
+    ) -> None:
+        # pylint: disable=import-outside-toplevel
+        from benchbuild.utils import schema
+
+        # Parents first, i.e., runs before the rows that reference them.
+        order = {
+            table: idx
+            for metadata in {table.metadata for table in inserts}
+            for idx, table in enumerate(metadata.sorted_tables)
+        }
+        for table in sorted(inserts, key=order.__getitem__):
+            # executemany needs the same columns in every row.
+            by_columns: tp.Dict[tp.FrozenSet[str], tp.List[Row]] = \
+                collections.defaultdict(list)
+            for row in inserts[table]:
+                by_columns[frozenset(row)].append(row)
+            statement = schema.insert(table, connection.dialect)
+            for rows in by_columns.values():
+                connection.execute(statement, rows)
+
+        by_table: tp.Dict[tp.Tuple[sa.Table, tp.FrozenSet[str]],
+                          tp.List[Row]] = collections.defaultdict(list)
+        for table, row in updates:
+            by_table[(table, frozenset(row))].append(row)
+        for (table, columns), rows in by_table.items():
+            keys = [column.name for column in table.primary_key]
+            values = sorted(columns - set(keys))
+            statement = table.update().where(
+                sa.and_(
+                    *(table.c[key] == sa.bindparam(f"k_{key}") for key in keys)
+                )
+            ).values({value: sa.bindparam(f"v_{value}") for value in values})
+            connection.execute(
+                statement, [{
+                    **{f"k_{key}": row[key] for key in keys},
+                    **{f"v_{value}": row[value] for value in values}
+                } for row in rows]
+            )
+
+    def flush(self) -> None:
+        """
+        Write all queued rows now.
+
+        Raises the error of the background thread, if writing failed there.
+        """
+        with self._write_lock:
+            error, self._error = self._error, None
+            if error is not None:
+                raise error
+            self._flush()
+
+    @contextlib.contextmanager
+    def connection(self) -> tp.Iterator[tp.Any]:
+        """
+        Get the connection we write with, inside a transaction.
+
+        Nothing else writes while we hold it.
+        """
+        with self._write_lock:
+            if self.threaded:
+                with self.engine.begin() as connection:
+                    yield connection
+            else:
+                # pylint: disable=import-outside-toplevel
+                from benchbuild.utils import schema
+                session = schema.Session()
+                yield session.connection()
+                session.commit()
+
+    def _send(
+        self, inserts: tp.Dict[sa.Table, tp.List[Row]],
+        updates: tp.List[tp.Tuple[sa.Table, Row]]
+    ) -> None:
+        with self.connection() as connection:
+            self._write(connection, inserts, updates)
+
+    def _flush(self) -> None:
+        with self._write_lock:
+            inserts, updates = self._take()
+            if not (inserts or updates):
+                return
+            self._send(inserts, updates)
+            LOG.debug(
+                "Wrote %d rows to the database.",
+                sum(map(len, inserts.values())) + len(updates)
+            )
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self._flush()
+            except Exception as ex:  # pylint: disable=broad-except
+                LOG.error("Writing to the database failed: %s", ex)
+                self._error = ex
+
+    def close(self) -> None:
+        """Write all queued rows and stop the background thread."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._handles_signals:
+            signals.handlers.deregister(self.flush)
+            self._handles_signals = False
+
+
+_WRITERS: "weakref.WeakSet[BatchWriter]" = weakref.WeakSet()
+__WRITER: tp.Optional[BatchWriter] = None
+
+
+def _after_fork_in_child() -> None:
+    # pylint: disable=global-statement
+    global __WRITER
+    __WRITER = None
+    for batch in list(_WRITERS):
+        batch._forked()  # pylint: disable=protected-access
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def writer() -> BatchWriter:
+    """The writer of this process, we create it on first use."""
+    # pylint: disable=global-statement
+    global __WRITER
+    if __WRITER is None:
+        # pylint: disable=import-outside-toplevel
+        from benchbuild.utils import schema
+        __WRITER = BatchWriter(schema.Session().get_bind().engine)
+        atexit.register(__WRITER.close)
+    return __WRITER
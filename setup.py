@@ -30,9 +30,9 @@ setup(
     include_package_data=True,
     setup_requires=["pytest-runner", "setuptools_scm"],
     install_requires=[
-        "Jinja2>=3", "PyYAML>=6", "attrs>=22", "dill>=0", "pathos>=0.3",
-        "parse>=1", "plumbum>=1", "psutil>=5", "psycopg2-binary>=2",
-        "pygit2>=1", "pygtrie>=2", "pyparsing>=3", "rich>=15",
+        "Jinja2>=3", "PyYAML>=6", "attrs>=22", "dill>=0", "numpy>=1",
+        "pathos>=0.3", "parse>=1", "plumbum>=1", "psutil>=5",
+        "psycopg2-binary>=2", "pygit2>=1", "pygtrie>=2", "pyparsing>=3", "rich>=15",
         "SQLAlchemy>=2", "typing-extensions>=4", "virtualenv>=20",
         "schema>=0", "result>=0"
     ],
@@ -6,6 +6,7 @@ from benchbuild.command import (
     PathToken,
     RootRenderer,
     cleanup,
+    conflicts,
 )
 from benchbuild.projects.test.test import TestProject
 
@@ -94,3 +95,25 @@ def test_rollback_consumes(tmp_path):
         expected_path.unlink()
         assert not expected_path.exists()
     assert expected_path.exists()
+
+
+def test_conflicts(tmp_path):
+    out = TT / str(tmp_path / "out")
+    prj = TestProject()
+
+    def p_cmd(**kwargs):
+        return ProjectCommand(prj, Command(TT / "bin" / "true", **kwargs))
+
+    producer = p_cmd(creates=[out / "result.txt"])
+    consumer = p_cmd(consumes=[out / "result.txt"])
+    dir_consumer = p_cmd(consumes=[out])
+    reader = p_cmd(consumes=[out / "result.txt"])
+    other = p_cmd(creates=[TT / str(tmp_path / "other.txt")])
+
+    assert conflicts(producer, consumer)
+    assert conflicts(consumer, producer)
+    assert conflicts(producer, dir_consumer)
+    assert conflicts(producer, producer)
+    assert not conflicts(consumer, reader)
+    assert not conflicts(producer, other)
+    assert not conflicts(producer, p_cmd())
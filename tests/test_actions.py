@@ -1,6 +1,7 @@
 """
 Test the actions module.
 """
+import asyncio
 import copy
 import importlib
 import sys
@@ -13,6 +14,7 @@ from plumbum import ProcessExecutionError
 from benchbuild.environments.domain.declarative import ContainerImage
 from benchbuild.experiment import Experiment
 from benchbuild.project import __add_single_filter__, Project
+from benchbuild.settings import CFG
 from benchbuild.source import nosource, HTTP
 from benchbuild.source.base import RevisionStr
 from benchbuild.utils import actions as a
@@ -199,3 +201,70 @@ def test_SetProjectVersion_raises_error_when_no_revision_is_found() -> None:
         ValueError, match='Revisions (.+) not found in any available source.'
     ):
         spv = SetProjectVersion(prj, RevisionStr('does-not-exist'))
+
+
+class AsyncWorkload:
+
+    running = 0
+    peak = 0
+
+    def __init__(self, name: str, fail: bool = False) -> None:
+        self.name = name
+        self.fail = fail
+        self.prepared = False
+
+    def prepare(self) -> None:
+        self.prepared = True
+
+    def __call__(self) -> None:
+        raise AssertionError("must not run synchronously")
+
+    async def run_async(self) -> None:
+        assert self.prepared
+        AsyncWorkload.running += 1
+        AsyncWorkload.peak = max(AsyncWorkload.peak, AsyncWorkload.running)
+        await asyncio.sleep(0.01)
+        AsyncWorkload.running -= 1
+        if self.fail:
+            raise ProcessExecutionError([self.name], 1, "", "")
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class ConcurrentExperiment(TestExperiment):
+    NAME = 'concurrent'
+    CONCURRENT_WORKLOADS = True
+
+
+def _run_workloads(workloads: tp.List[AsyncWorkload]) -> a.RunWorkloads:
+    ep = EmptyProject()
+    actn = a.RunWorkloads(ep, ConcurrentExperiment(projects=[EmptyProject]))
+    actn.actions = [a.RunWorkload(ep, w) for w in workloads]
+    return actn
+
+
+@pytest.fixture
+def two_workload_jobs() -> tp.Iterator[None]:
+    CFG["workloads"]["jobs"] = 2
+    yield
+    CFG["workloads"]["jobs"] = 0
+
+
+def test_RunWorkloads_runs_concurrently(two_workload_jobs) -> None:
+    AsyncWorkload.peak = 0
+
+    actn = _run_workloads([AsyncWorkload(str(i)) for i in range(6)])
+
+    assert actn() == a.StepResult.OK
+    assert AsyncWorkload.peak == 2
+
+
+def test_RunWorkloads_reraises_concurrent_failures(two_workload_jobs) -> None:
+
+    actn = _run_workloads([AsyncWorkload("ok"), AsyncWorkload("bad", True)])
+
+    with pytest.raises(ProcessExecutionError):
+        actn()
+    assert [w.status for w in actn.actions
+           ] == [a.StepResult.OK, a.StepResult.ERROR]
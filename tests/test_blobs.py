@@ -0,0 +1,85 @@
+"""Test the blob store for large payloads of runs."""
+import types
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from benchbuild.settings import CFG
+from benchbuild.utils import blobs, db, schema, writer
+
+
+@pytest.fixture
+def location(tmp_path):
+    old_location = CFG["blobs"]["location"].value
+    CFG["blobs"]["location"] = str(tmp_path / "blobs")
+    yield tmp_path / "blobs"
+    CFG["blobs"]["location"] = old_location
+
+
+@pytest.fixture
+def engine(tmp_path):
+    db_engine = sa.create_engine(f"sqlite:///{tmp_path / 'bb.db'}")
+    schema.BASE.metadata.create_all(db_engine)
+    yield db_engine
+    db_engine.dispose()
+
+
+def test_blobs_are_stored_once(location):
+    store = blobs.LocalBlobStore(str(location), compression="gzip")
+    first = store.put(b"x" * 10000)
+
+    assert store.put(b"x" * 10000) == first
+    assert first == blobs.digest(b"x" * 10000)
+    assert store.get(first) == b"x" * 10000
+    assert len(list(location.glob("*/*"))) == 1
+    assert list(location.glob("*/*"))[0].stat().st_size < 10000
+
+
+def test_missing_blobs(location):
+    store = blobs.LocalBlobStore(str(location), compression="gzip")
+    assert blobs.digest(b"") not in store
+    with pytest.raises(KeyError):
+        store.get(blobs.digest(b""))
+
+
+def test_default_location(tmp_path):
+    old_values = (CFG["blobs"]["location"].value, CFG["build_dir"].value)
+    CFG["blobs"]["location"] = None
+    CFG["build_dir"] = str(tmp_path)
+    try:
+        assert blobs.location() == str(tmp_path / ".benchbuild-blobs")
+        assert blobs.store().location == blobs.location()
+    finally:
+        CFG["blobs"]["location"], CFG["build_dir"] = old_values
+
+
+def test_unknown_store(monkeypatch):
+    monkeypatch.delitem(blobs.STORES, "local")
+    with pytest.raises(ValueError):
+        blobs.store()
+
+
+def test_small_payloads_stay_inline(location, engine):
+    with sessionmaker(bind=engine)() as session:
+        run = types.SimpleNamespace(id=1)
+        assert db.offload(run, session, "stdout", "ok") == "ok"
+        assert db.offload(run, session, "stdout", None) is None
+        assert session.query(schema.RunBlob).count() == 0
+    assert not location.exists()
+
+
+def test_large_payloads_are_offloaded(location, engine):
+    stdout = "line\n" * 10000
+    for run_id in (1, 2):
+        batch = writer.BatchWriter(engine, batch_size=10**6, interval=3600)
+        run = types.SimpleNamespace(id=run_id)
+        assert db.offload(run, batch, "stdout", stdout) is None
+        batch.close()
+
+    with sessionmaker(bind=engine)() as session:
+        blob = session.query(schema.Blob).one()
+        assert (blob.size, blob.preview) == (len(stdout), stdout[:256])
+        assert session.query(schema.RunBlob).count() == 2
+        assert db.fetch_blob(session, 2, "stdout") == stdout
+        assert db.fetch_blob(session, 2, "stderr") is None
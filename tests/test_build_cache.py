@@ -0,0 +1,214 @@
+"""
+Test the build cache of the compile step.
+"""
+import typing as tp
+
+import pytest
+from plumbum import local
+
+from benchbuild.environments.domain.declarative import ContainerImage
+from benchbuild.experiment import Experiment
+from benchbuild.project import Project
+from benchbuild.settings import CFG
+from benchbuild.source import nosource
+from benchbuild.utils import actions as a
+from benchbuild.utils import build_cache, tasks, wrapping
+
+
+class CountingProject(Project):
+    NAME = "test_build_cache"
+    DOMAIN = "debug"
+    GROUP = "debug"
+    SOURCE = [nosource()]
+    CONTAINER = ContainerImage().from_('benchbuild:alpine')
+
+    compiled = 0
+
+    def compile(self):
+        CountingProject.compiled += 1
+        (local.path(self.builddir) / "a.out").write("binary")
+
+
+class StatefulProject(CountingProject):
+    NAME = "test_build_cache_stateful"
+
+    def compile(self):
+        super().compile()
+        self.binary = local.path(self.builddir) / "a.out"
+
+
+class WrappingProject(CountingProject):
+    NAME = "test_build_cache_wrapping"
+
+    def compile(self):
+        super().compile()
+        wrapping.persist(self, suffix=".project")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    CountingProject.compiled = 0
+    CFG["build_cache"]["enabled"] = True
+    CFG["build_cache"]["path"] = str(tmp_path / "cache")
+    yield tmp_path
+    CFG["build_cache"]["enabled"] = False
+    CFG["build_cache"]["path"] = None
+
+
+def compile_in(project: Project) -> None:
+    project.prepare()
+    assert a.Compile(project)() == a.StepResult.OK
+
+
+def test_identical_builds_compile_once(cache):
+    first = CountingProject(builddir=cache / "first")
+    second = CountingProject(builddir=cache / "second")
+
+    compile_in(first)
+    compile_in(second)
+
+    assert CountingProject.compiled == 1
+    assert (local.path(second.builddir) / "a.out").read() == "binary"
+
+
+def test_restored_build_is_a_copy(cache):
+    first = CountingProject(builddir=cache / "first")
+    second = CountingProject(builddir=cache / "second")
+
+    compile_in(first)
+    compile_in(second)
+    (local.path(second.builddir) / "a.out").write("changed")
+
+    third = CountingProject(builddir=cache / "third")
+    compile_in(third)
+    assert (local.path(third.builddir) / "a.out").read() == "binary"
+
+
+def test_different_flags_compile_again(cache):
+    first = CountingProject(builddir=cache / "first")
+    second = CountingProject(builddir=cache / "second", cflags=["-O3"])
+
+    compile_in(first)
+    compile_in(second)
+
+    assert CountingProject.compiled == 2
+    assert build_cache.digest_of(first) != build_cache.digest_of(second)
+
+
+@pytest.mark.parametrize("project_cls", [StatefulProject, WrappingProject])
+def test_builds_with_state_are_not_cached(cache, project_cls):
+    first = project_cls(builddir=cache / "first")
+    second = project_cls(builddir=cache / "second")
+
+    compile_in(first)
+    compile_in(second)
+
+    assert CountingProject.compiled == 2
+    assert not list((cache / "cache").glob(build_cache.digest_of(first)))
+
+
+def test_disabled_cache_always_compiles(cache):
+    CFG["build_cache"]["enabled"] = False
+
+    compile_in(CountingProject(builddir=cache / "first"))
+    compile_in(CountingProject(builddir=cache / "second"))
+
+    assert CountingProject.compiled == 2
+    assert not (cache / "cache").exists()
+
+
+class CompilingExperiment(Experiment):
+    NAME = "test_build_cache"
+
+    def actions_for_project(self,
+                            project: Project) -> tp.MutableSequence[a.Step]:
+        return [a.Compile(project)]
+
+
+class OtherCompilingExperiment(CompilingExperiment):
+    NAME = "test_build_cache_other"
+
+
+class OptimizingExperiment(CompilingExperiment):
+    NAME = "test_build_cache_optimizing"
+
+    def actions_for_project(self,
+                            project: Project) -> tp.MutableSequence[a.Step]:
+        project.cflags = ["-O3"]
+        return [a.Compile(project)]
+
+
+def compile_steps(plan: tp.Sequence[a.Step]) -> tp.List[a.Compile]:
+    return [
+        step for exp in plan for chain in exp.actions
+        if isinstance(chain, a.RequireAll) for step in chain.actions
+        if isinstance(step, a.Compile)
+    ]
+
+
+@pytest.fixture
+def build_dir(tmp_path):
+    CountingProject.compiled = 0
+    old_build_dir = CFG["build_dir"].value
+    old_cleanup = CFG["cleanup_paths"].value
+    CFG["build_dir"] = str(tmp_path)
+    yield tmp_path
+    CFG["build_dir"] = old_build_dir
+    CFG["cleanup_paths"] = old_cleanup
+
+
+@pytest.fixture
+def sharing(build_dir):
+    CFG["build_cache"]["share"] = True
+    yield build_dir
+    CFG["build_cache"]["share"] = False
+
+
+def test_experiments_share_identical_builds(sharing):
+    plan = tasks.generate_plan([
+        CompilingExperiment, OtherCompilingExperiment, OptimizingExperiment
+    ], [CountingProject])
+
+    compiles = compile_steps(plan)
+    assert [bool(c.shared_builds) for c in compiles] == [True, True, False]
+
+    tasks.execute_plan(plan)
+    assert CountingProject.compiled == 2
+    assert not (sharing / ".benchbuild-shared-builds").exists()
+
+
+@pytest.mark.parametrize("project_cls", [StatefulProject, WrappingProject])
+def test_builds_with_state_are_not_shared(sharing, project_cls):
+    plan = tasks.generate_plan([
+        CompilingExperiment, OtherCompilingExperiment
+    ], [project_cls])
+    assert all(c.shared_builds for c in compile_steps(plan))
+
+    tasks.execute_plan(plan)
+    assert CountingProject.compiled == 2
+
+
+def test_sharing_is_opt_in(build_dir):
+    plan = tasks.generate_plan([
+        CompilingExperiment, OtherCompilingExperiment
+    ], [CountingProject])
+
+    assert tasks.share_builds([]) == 0
+    assert not any(c.shared_builds for c in compile_steps(plan))
+
+
+def test_lazy_plans_share_only_on_request(sharing):
+    experiments = [CompilingExperiment, OtherCompilingExperiment]
+    plan = tasks.generate_plan(experiments, [CountingProject], lazy=True)
+    for exp in plan:
+        exp.expand()
+    assert not any(c.shared_builds for c in compile_steps(plan))
+
+    CFG["build_cache"]["share_lazy"] = True
+    try:
+        plan = tasks.generate_plan(experiments, [CountingProject], lazy=True)
+    finally:
+        CFG["build_cache"]["share_lazy"] = False
+    for exp in plan:
+        exp.expand()
+    assert all(c.shared_builds for c in compile_steps(plan))
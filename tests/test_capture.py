@@ -0,0 +1,112 @@
+"""Test the bounded-memory capture of stdout/stderr."""
+import io
+import os
+
+from plumbum import local
+
+from benchbuild.utils import capture, run
+
+
+def test_memory_capture_keeps_head_and_tail():
+    stream = capture.StreamCapture(head=6, tail=6)
+    stream.write(b"hello ")
+    stream.write(b"world\n")
+    out = stream.close()
+
+    assert out.path is None
+    assert not out.truncated
+    assert str(out) == "hello world\n"
+    assert list(out.lines()) == ["hello world\n"]
+
+    stream = capture.StreamCapture(head=2, tail=2)
+    stream.write(b"hello ")
+    stream.write(b"world\n")
+    out = stream.close()
+
+    assert (out.head, out.tail, out.size) == (b"he", b"d\n", 12)
+    assert str(out) == "he\n[... 8 bytes omitted ...]\nd\n"
+
+
+def test_echo_joins_split_characters():
+    echo = io.StringIO()
+    stream = capture.StreamCapture(echo=echo)
+    data = "grüße €\n".encode()
+    for i in range(len(data)):
+        stream.write(data[i:i + 1])
+    stream.write(b"\xe2")
+    stream.close()
+
+    assert echo.getvalue() == "grüße €\n\ufffd"
+
+
+def test_file_capture_keeps_head_and_tail(tmp_path):
+    path = str(tmp_path / "bin.stdout")
+    echo = io.StringIO()
+    stream = capture.StreamCapture(
+        path, echo=echo, head=4, tail=3, compression="gzip"
+    )
+    for i in range(100):
+        stream.write(f"{i}\n".encode())
+    out = stream.close()
+
+    expected = "".join(f"{i}\n" for i in range(100))
+    assert echo.getvalue() == expected
+    assert out.truncated
+    assert out.size == len(expected)
+    assert out.head == b"0\n1\n"
+    assert out.tail == b"99\n"
+    assert str(out).startswith("0\n1\n\n[... ")
+    assert str(out).endswith(f"see {path} ...]\n99\n")
+    assert os.path.exists(path + ".gz")
+    assert "".join(out.lines()) == expected
+
+
+def test_small_output_is_not_truncated(tmp_path):
+    path = str(tmp_path / "bin.stderr")
+    stream = capture.StreamCapture(path, head=4, tail=4, compression="none")
+    stream.write(b"abcdef")
+    out = stream.close()
+
+    assert not out.truncated
+    assert str(out) == "abcdef"
+    assert capture.segments(path) == [path]
+
+
+def test_segments_rotate(tmp_path):
+    path = str(tmp_path / "bin.stdout")
+    stream = capture.StreamCapture(
+        path, head=0, tail=0, compression="gzip", segment_size=10, keep=2
+    )
+    for _ in range(5):
+        stream.write(b"0123456789")
+    stream.close()
+
+    assert capture.segments(path) == [path + ".3.gz", path + ".4.gz"]
+    assert list(capture.read_lines(path)) == ["01234567890123456789"]
+
+
+def test_stale_segments_are_removed(tmp_path):
+    path = str(tmp_path / "bin.stdout")
+    stream = capture.StreamCapture(
+        path, compression="none", segment_size=1, keep=0
+    )
+    stream.write(b"abc")
+    stream.close()
+    assert len(capture.segments(path)) == 3
+
+    stream = capture.StreamCapture(path, compression="none")
+    stream.write(b"x")
+    stream.close()
+    assert capture.segments(path) == [path]
+
+
+def test_tee_rusage_captures_to_disk(tmp_path):
+    prefix = str(tmp_path / "bin")
+    _, stdout, stderr, _ = run.tee_rusage(
+        local["sh"]["-c", "echo out; echo err >&2"], capture_to=prefix
+    )
+
+    assert str(stdout) == "out\n"
+    assert list(stderr.lines()) == ["err\n"]
+    assert stdout.path == prefix + ".stdout"
+    assert capture.segments(prefix + ".stderr")
@@ -0,0 +1,91 @@
+"""Test the collector for database rows of wrapped processes."""
+import threading
+import types
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from benchbuild.settings import CFG
+from benchbuild.utils import collector, db, schema, writer
+
+
+@pytest.fixture
+def engine(tmp_path):
+    db_engine = sa.create_engine(f"sqlite:///{tmp_path / 'bb.db'}")
+    schema.BASE.metadata.create_all(db_engine)
+    yield db_engine
+    db_engine.dispose()
+
+
+@pytest.fixture
+def served(tmp_path, engine):
+    batch = writer.BatchWriter(engine, batch_size=10**6, interval=3600)
+    server = collector.Collector(str(tmp_path / "socket"), batch)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = collector.Client(str(tmp_path / "socket"))
+    yield batch, client
+    client.close()
+    server.shutdown()
+    server.server_close()
+    batch.close()
+
+
+def new_run():
+    return schema.Run(
+        command="true",
+        status="running",
+        run_group=uuid.uuid4(),
+        experiment_group=uuid.uuid4()
+    )
+
+
+def test_rows_reach_the_database(served, engine):
+    batch, client = served
+    run = new_run()
+    run.id, = client.insert(run)
+    sa.orm.make_transient_to_detached(run)
+
+    remote = collector.RemoteWriter(client)
+    db.persist_time(run, remote, [(1.0, 0.5, 2.0)])
+    run.status = "completed"
+    remote.add(run)
+    assert len(remote) == 4
+    remote.flush()
+    assert len(batch) == 0
+
+    with sessionmaker(bind=engine)() as session:
+        assert session.query(schema.Metric).count() == 3
+        assert session.get(schema.Run, run.id).status == "completed"
+    remote.close()
+
+
+def test_projects_are_stored_once(served, engine):
+    _, client = served
+    project = types.SimpleNamespace(
+        name="p", group="g", domain="d", revision="1", src_uri="u"
+    )
+    client.call("persist_project", db.project_values(project))
+    project.revision = "2"
+    client.call("persist_project", db.project_values(project))
+
+    with sessionmaker(bind=engine)() as session:
+        assert session.query(schema.Project.version).all() == [("2",)]
+
+
+def test_errors_are_reported(served):
+    _, client = served
+    with pytest.raises(RuntimeError):
+        client.call("drop_database")
+    with pytest.raises(RuntimeError):
+        client.call("write", {"no_such_table": [{}]}, [])
+    assert client.call("flush") is None
+
+
+def test_nothing_is_served_without_a_database():
+    assert not CFG["db"]["enabled"]
+    with collector.serve() as path:
+        assert path is None
+        assert collector.current() is None
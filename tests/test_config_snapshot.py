@@ -0,0 +1,97 @@
+"""Test deduplicated snapshots of the configuration of runs."""
+import types
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from benchbuild.utils import db, schema, writer
+from benchbuild.utils.settings import Configuration
+
+
+@pytest.fixture
+def bb():
+    cfg = Configuration('bb')
+    cfg['jobs'] = 4
+    cfg['db'] = {"run_id": {"value": 1}, "enabled": {"value": True}}
+    yield cfg
+
+
+@pytest.fixture
+def engine(tmp_path):
+    db_engine = sa.create_engine(f"sqlite:///{tmp_path / 'bb.db'}")
+    schema.BASE.metadata.create_all(db_engine)
+    yield db_engine
+    db_engine.dispose()
+
+
+def test_snapshot_ids_follow_the_content(bb):
+    first, entries = db.config_snapshot(bb)
+    assert entries == {"BB_DB_ENABLED": "true", "BB_JOBS": "4"}
+
+    bb['db']['run_id'] = 2
+    assert db.config_snapshot(bb)[0] == first
+
+    bb['jobs'] = 8
+    assert db.config_snapshot(bb)[0] != first
+
+
+def test_runs_share_snapshots(bb, engine):
+    for run_id in (1, 2):
+        with sessionmaker(bind=engine)() as session:
+            db.persist_config_snapshot(
+                types.SimpleNamespace(id=run_id), session, bb
+            )
+            session.commit()
+
+    with sessionmaker(bind=engine)() as session:
+        assert session.query(schema.ConfigSnapshot).count() == 2
+        assert session.query(schema.RunConfig.snapshot_id).distinct().count() \
+            == 1
+
+
+def test_interleaved_runs_share_snapshots(bb, engine):
+    bb['interleave'] = {"pair": {"value": None}, "variant": {"value": None}}
+    with sessionmaker(bind=engine)() as session:
+        for run_id, (pair, variant) in enumerate([("p/0/w", "a"),
+                                                  ("p/0/w", "b"),
+                                                  ("p/1/w", "a")]):
+            bb['interleave']['pair'] = pair
+            bb['interleave']['variant'] = variant
+            db.persist_config_snapshot(
+                types.SimpleNamespace(id=run_id), session, bb
+            )
+        session.commit()
+
+        assert session.query(schema.RunConfig.snapshot_id).distinct().count() \
+            == 1
+
+
+def test_writers_share_snapshots(bb, engine):
+    for run_id in (1, 2):
+        batch = writer.BatchWriter(engine, batch_size=10**6, interval=3600)
+        db.persist_config_snapshot(types.SimpleNamespace(id=run_id), batch, bb)
+        batch.close()
+
+    with sessionmaker(bind=engine)() as session:
+        assert session.query(schema.ConfigSnapshot).count() == 2
+        assert session.query(schema.RunConfig).count() == 2
+
+
+def test_diff_snapshots(bb, engine):
+    with sessionmaker(bind=engine)() as session:
+        before = db.persist_config_snapshot(
+            types.SimpleNamespace(id=1), session, bb
+        )
+        bb['jobs'] = 8
+        bb['extra'] = "x"
+        after = db.persist_config_snapshot(
+            types.SimpleNamespace(id=2), session, bb
+        )
+        session.commit()
+
+        assert db.diff_config_snapshots(session, before, after) == {
+            "BB_EXTRA": (None, "x"),
+            "BB_JOBS": ("4", "8")
+        }
+        assert db.diff_config_snapshots(session, after, after) == {}
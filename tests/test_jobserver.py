@@ -0,0 +1,47 @@
+"""
+Test the job server token pool.
+"""
+from benchbuild.settings import CFG
+from benchbuild.utils import jobserver
+
+
+def test_tokens_without_server_are_granted():
+    assert jobserver.current() is None
+    with jobserver.tokens(8) as granted:
+        assert granted == 8
+
+
+def test_serve_publishes_fifo():
+    with jobserver.serve(2) as path:
+        assert str(CFG["jobserver"]["fifo"]) == path
+        assert jobserver.current() is not None
+    assert not CFG["jobserver"]["fifo"].value
+    assert jobserver.current() is None
+
+
+def test_tokens_are_limited_by_slots():
+    with jobserver.serve(3):
+        with jobserver.tokens(8) as granted:
+            assert granted == 3
+            assert not jobserver.current().acquire(block=False)
+
+        with jobserver.tokens(2) as first:
+            with jobserver.tokens(2) as second:
+                assert (first, second) == (2, 1)
+
+
+def test_tokens_are_returned():
+    with jobserver.serve(1):
+        server = jobserver.current()
+        with jobserver.token():
+            assert not server.acquire(block=False)
+        assert server.acquire(timeout=0.1)
+        server.release()
+        assert server.held == 0
+
+
+def test_serve_reuses_active_server():
+    with jobserver.serve(1) as outer:
+        with jobserver.serve(4) as inner:
+            assert inner == outer
+        assert jobserver.current() is not None
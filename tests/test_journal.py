@@ -0,0 +1,193 @@
+"""
+Test the resumable experiment journal.
+"""
+import typing as tp
+
+import pytest
+
+from benchbuild.environments.domain.declarative import ContainerImage
+from benchbuild.experiment import Experiment
+from benchbuild.project import Project
+from benchbuild.settings import CFG
+from benchbuild.source import nosource
+from benchbuild.utils import actions as a
+from benchbuild.utils import journal, tasks
+
+
+class JournalProject(Project):
+    NAME = "test_journal"
+    DOMAIN = "debug"
+    GROUP = "debug"
+    SOURCE = [nosource()]
+    CONTAINER = ContainerImage().from_('benchbuild:alpine')
+
+
+class OtherProject(JournalProject):
+    NAME = "test_journal_other"
+
+
+class JournalExperiment(Experiment):
+    NAME = "test_journal"
+
+    def actions_for_project(self,
+                            project: Project) -> tp.MutableSequence[a.Step]:
+        return []
+
+
+class FailAlways(a.ProjectStep):
+    NAME = "FAIL ALWAYS"
+    DESCRIPTION = "A Step that guarantees to fail."
+
+    def __call__(self) -> a.StepResult:
+        return a.StepResult.ERROR
+
+
+class PassAlways(a.ProjectStep):
+    NAME = "PASS ALWAYS"
+    DESCRIPTION = "A Step that guarantees to succeed."
+
+    def __call__(self) -> a.StepResult:
+        return a.StepResult.OK
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    CFG["journal"]["path"] = str(tmp_path / "journal")
+    yield tmp_path / "journal"
+    journal.stop()
+    CFG["journal"]["path"] = None
+
+
+def make_plan(exp: Experiment) -> tp.List[a.Step]:
+    first, second = JournalProject(), OtherProject()
+    actions: tp.List[a.Step] = [
+        a.RequireAll(actions=[PassAlways(first)]),
+        a.RequireAll(actions=[FailAlways(second)]),
+        a.CleanExtra()
+    ]
+    return [a.Experiment(exp, actions=actions)]
+
+
+def test_inactive_journal_records_nothing(journal_path):
+    exp = JournalExperiment(projects=[JournalProject, OtherProject])
+    tasks.execute_plan(make_plan(exp))
+
+    assert not journal_path.exists()
+
+
+def test_journal_records_chains(journal_path):
+    journal.start()
+    exp = JournalExperiment(projects=[JournalProject, OtherProject])
+    tasks.execute_plan(make_plan(exp))
+
+    entries = journal.read()
+    assert [e["result"] for e in entries] == ["OK", "ERROR"]
+    assert all(e["experiment"] == str(exp.id) for e in entries)
+
+
+def test_resume_skips_finished_chains(journal_path):
+    journal.start()
+    exp = JournalExperiment(projects=[JournalProject, OtherProject])
+    tasks.execute_plan(make_plan(exp))
+
+    CFG["experiments"] = {}
+    journal.start(resume=True)
+    resumed = JournalExperiment(projects=[JournalProject, OtherProject])
+    assert resumed.id == exp.id
+
+    plan = tasks.resume_plan(make_plan(resumed))
+    chains = [s for s in plan[0].actions if isinstance(s, a.RequireAll)]
+    assert len(chains) == 1
+    assert isinstance(chains[0].actions[0], FailAlways)
+
+
+def test_start_truncates_without_resume(journal_path):
+    journal.start()
+    exp = JournalExperiment(projects=[JournalProject, OtherProject])
+    tasks.execute_plan(make_plan(exp))
+
+    journal.start()
+    assert journal.read() == []
+
+
+class OtherExperiment(JournalExperiment):
+    NAME = "test_journal_other"
+
+
+class LogWorkload:
+
+    def __init__(self, name: str, variant: str, log: tp.List[str]) -> None:
+        self.name = name
+        self.variant = variant
+        self.log = log
+
+    def __call__(self) -> None:
+        self.log.append(f"{self.variant}/{self.name}")
+
+    def __str__(self) -> str:
+        return self.name
+
+
+def make_interleaved_plan(log: tp.List[str],
+                          resume: bool = False) -> tp.List[a.Step]:
+    plan: tp.List[a.Step] = []
+    for exp in (JournalExperiment(projects=[JournalProject]),
+                OtherExperiment(projects=[JournalProject])):
+        prj = JournalProject()
+        variant = a.RunWorkloads(prj, exp)
+        variant.actions = [
+            a.RunWorkload(prj, LogWorkload(name, exp.name, log))
+            for name in "xy"
+        ]
+        chain = a.RequireAll(actions=[PassAlways(prj), variant])
+        plan.append(a.Experiment(exp, actions=[chain]))
+    if resume:
+        plan = tasks.resume_plan(plan)
+    tasks.interleave_workloads(plan)
+    for step in plan:
+        if isinstance(step, a.InterleavedWorkloads):
+            step.rounds = 2
+    return plan
+
+
+def test_interleaved_workloads_are_journaled(journal_path, monkeypatch):
+    log: tp.List[str] = []
+    end = a.Experiment.end
+
+    def logged_end(self, results):
+        log.append("end")
+        return end(self, results)
+
+    monkeypatch.setattr(a.Experiment, "end", logged_end)
+    journal.start()
+    tasks.execute_plan(make_interleaved_plan(log))
+
+    assert len(log) == 10
+    assert log[-2:] == ["end", "end"]
+    entries = journal.read()
+    assert sorted(e["workload"] or "chain" for e in entries) == \
+        ["chain", "chain", "x", "x", "y", "y"]
+    assert [e["workload"] for e in entries][-2:] == [None, None]
+    assert all(e["result"] == "OK" for e in entries)
+
+    CFG["experiments"] = {}
+    journal.start(resume=True)
+    del log[:]
+    tasks.execute_plan(make_interleaved_plan(log, resume=True))
+    assert log == ["end", "end"]
+
+
+def test_interleaving_skips_finished_workloads(journal_path):
+    log: tp.List[str] = []
+    journal.start()
+    plan = make_interleaved_plan(log)
+    interleaved = plan[2]
+    variant = interleaved.actions[0]
+    journal.record(
+        variant.experiment, variant.project, a.StepResult.OK, workload="x"
+    )
+
+    journal.start(resume=True)
+    assert interleaved() == a.StepResult.OK
+    assert "test_journal/x" not in log
+    assert log.count("test_journal_other/x") == 2
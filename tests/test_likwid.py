@@ -0,0 +1,129 @@
+"""Test the likwid output parser."""
+import io
+import types
+
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from benchbuild import likwid
+from benchbuild.utils import db, schema
+
+SAMPLE = """\
+STRUCT,Info,3
+CPU name:,Intel(R) Xeon(R)
+CPU type:,Intel Skylake
+CPU clock:,2.10 GHz
+STRUCT,Region foo,4
+1,foo,foo
+Region Info,Core 0,Core 1,
+RDTSC Runtime [s],0.5,0.75,
+call count,1,,
+TABLE,Region foo,Group 1 Raw,2
+Event,Counter,Core 0,Core 1,
+INSTR_RETIRED_ANY,FIXC0,100,200,
+CPU_CLK_UNHALTED_CORE,FIXC1,nil,400,
+TABLE,Region foo,Group 1 Metric,1
+Metric,Core 0,Core 1,
+CPI,2.5,2,
+"""
+
+
+def test_parse_sample():
+    blocks = list(likwid.parse(io.StringIO(SAMPLE)))
+
+    assert [(b.region, b.metric) for b in blocks] == [
+        ("foo", "RDTSC Runtime [s]"), ("foo", "call count"),
+        ("foo", "INSTR_RETIRED_ANY"), ("foo", "CPU_CLK_UNHALTED_CORE"),
+        ("foo", "CPI")
+    ]
+    assert blocks[0].values.dtype == np.float64
+    assert blocks[0].cores.tolist() == ["Core 0", "Core 1"]
+    assert blocks[1].cores.tolist() == ["Core 0"]
+    assert blocks[3].cores.tolist() == ["Core 1"]
+    assert blocks[3].values.tolist() == [400.0]
+
+
+def test_measurements_are_columns():
+    result = likwid.measurements(likwid.parse(io.StringIO(SAMPLE)))
+
+    assert len(result) == 8
+    assert result.values.dtype == np.float64
+    assert result.names()[0] == "likwid.foo.RDTSC Runtime [s].Core 0"
+    assert float(result.values[result.metrics == "CPI"].sum()) == 4.5
+    assert len(likwid.measurements([])) == 0
+
+
+def test_perfcounters_converts_values(tmp_path):
+    path = tmp_path / "likwid.csv"
+    path.write_text(SAMPLE)
+
+    assert likwid.perfcounters(str(path))[0] == (
+        "foo", "RDTSC Runtime [s]", "Core 0", 0.5
+    )
+
+
+def test_persist_likwid():
+    engine = sa.create_engine("sqlite://")
+    schema.BASE.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        result = likwid.measurements(likwid.parse(io.StringIO(SAMPLE)))
+        db.persist_likwid(types.SimpleNamespace(id=1), session, result)
+
+        stored = dict(session.query(schema.Metric.name, schema.Metric.value))
+        assert len(stored) == len(result)
+        assert stored["likwid.foo.CPI.Core 1"] == 2.0
+
+
+def generated_sample(regions: int, cores: int, events: int) -> str:
+    """Likwid output of a machine with the given number of cores."""
+    core_names = ",".join(f"Core {core}" for core in range(cores))
+    lines = ["STRUCT,Info,1", "CPU name:,Fake"]
+    for region in range(regions):
+        lines += [
+            f"STRUCT,Region r{region},3,,", f"1,r{region},r{region}",
+            f"Region Info,{core_names},",
+            "RDTSC Runtime [s]," + ",".join(["0.5"] * cores) + ",",
+            f"TABLE,Region r{region},Group 1 Raw,{events}",
+            f"Event,Counter,{core_names},"
+        ]
+        lines += [
+            f"EVENT_{event},PMC{event}," +
+            ",".join(str(event * core) for core in range(cores)) + ","
+            for event in range(events)
+        ]
+        lines += [
+            f"TABLE,Region r{region},Group 1 Metric,{events}",
+            f"Metric,{core_names},"
+        ]
+        lines += [
+            f"Metric {event}," +
+            ",".join(f"{event}.{core}" for core in range(cores)) + ","
+            for event in range(events)
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def test_many_regions_and_cores():
+    regions, cores, events = 3, 4, 2
+    sample = generated_sample(regions, cores, events)
+
+    result = likwid.measurements(likwid.parse(io.StringIO(sample)))
+
+    expected = []
+    for region in range(regions):
+        name = f"r{region}"
+        expected += [(name, "RDTSC Runtime [s]", f"Core {core}", 0.5)
+                     for core in range(cores)]
+        expected += [(name, f"EVENT_{event}", f"Core {core}",
+                      float(event * core))
+                     for event in range(events)
+                     for core in range(cores)]
+        expected += [(name, f"Metric {event}", f"Core {core}",
+                      float(f"{event}.{core}"))
+                     for event in range(events)
+                     for core in range(cores)]
+    assert list(
+        zip(result.regions, result.metrics, result.cores,
+            result.values.tolist())
+    ) == expected
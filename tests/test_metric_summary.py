@@ -0,0 +1,156 @@
+"""Test the statistics of the metrics of run groups."""
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from benchbuild.extensions import base
+from benchbuild.extensions.time import RunWithTime
+from benchbuild.settings import CFG
+from benchbuild.utils import db, run, schema
+
+
+@pytest.fixture
+def session(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'bb.db'}")
+    schema.BASE.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db_session:
+        yield db_session
+    engine.dispose()
+
+
+def add_group(session, metrics):
+    experiment = uuid.uuid4()
+    group = schema.RunGroup(
+        id=uuid.uuid4(), experiment=experiment, status="running"
+    )
+    session.add(schema.Experiment(id=experiment, name="raw"))
+    session.merge(schema.Project(name="p", group_name="g"))
+    session.add(group)
+    for values in metrics:
+        db_run = schema.Run(
+            command="true",
+            project_name="p",
+            project_group="g",
+            experiment_group=experiment,
+            run_group=group.id,
+            status="completed"
+        )
+        session.add(db_run)
+        session.flush()
+        db.persist_metrics(db_run, session, values)
+    session.commit()
+    return group
+
+
+def test_statistics():
+    stats = db.metric_statistics(["b", "a", "b", "b", "a", "c"],
+                                 [3.0, 1.0, 1.0, 2.0, 2.0, 5.0])
+    assert stats["a"] == {
+        "count": 2,
+        "min": 1.0,
+        "max": 2.0,
+        "mean": 1.5,
+        "median": 1.5,
+        "stddev": pytest.approx(0.7071, abs=1e-4)
+    }
+    assert stats["b"]["median"] == 2.0
+    assert stats["b"]["stddev"] == 1.0
+    assert stats["c"]["stddev"] is None
+    assert db.metric_statistics([], []) == {}
+
+
+def test_groups_are_summarized_when_they_end(session):
+    group = add_group(
+        session, [{
+            "time.real_s": 1.0,
+            "time.user_s": 0.5
+        }, {
+            "time.real_s": 3.0,
+            "time.user_s": None
+        }]
+    )
+    other = add_group(session, [{"time.real_s": 100.0}])
+
+    run.end_run_group(group, session)
+    assert group.status == "completed"
+
+    summaries = {
+        summary.name: summary
+        for summary in session.query(schema.MetricSummary)
+    }
+    assert set(summaries) == {"time.real_s", "time.user_s"}
+    assert summaries["time.real_s"].run_group == group.id
+    assert summaries["time.real_s"].project_name == "p"
+    assert (summaries["time.real_s"].count,
+            summaries["time.real_s"].mean) == (2, 2.0)
+    assert summaries["time.user_s"].count == 1
+
+    db.persist_metrics(
+        session.query(schema.Run).filter_by(run_group=group.id).first(),
+        session, {"time.system_s": 0.1}
+    )
+    db.summarize_run_group(session, group.id)
+    db.summarize_run_group(session, other.id)
+    session.commit()
+    assert session.query(schema.MetricSummary) \
+        .filter_by(run_group=group.id).count() == 3
+    assert session.query(schema.MetricSummary).count() == 4
+
+
+class FakeRunInfo:
+
+    def __init__(self, db_run, real: float) -> None:
+        self.db_run = db_run
+        self.stderr = f"BENCHBUILD: 0.5-0.1-{real}\n"
+
+    def add_payload(self, name, payload) -> None:
+        del name, payload
+
+
+class FakeRun(base.Extension):
+    """Store a run for every execution, like a tracked binary does."""
+
+    def __init__(self, session, group, real_times) -> None:
+        super().__init__()
+        self.session = session
+        self.group = group
+        self.real_times = iter(real_times)
+
+    def __call__(self, *args, **kwargs):
+        db_run = schema.Run(
+            command="true",
+            project_name="p",
+            project_group="g",
+            experiment_group=self.group.experiment,
+            run_group=self.group.id,
+            status="completed"
+        )
+        self.session.add(db_run)
+        self.session.flush()
+        return [FakeRunInfo(db_run, next(self.real_times))]
+
+
+def test_warmups_and_outliers_are_not_summarized(session, monkeypatch):
+    group = add_group(session, [])
+    monkeypatch.setattr(db, "session", lambda: session)
+    CFG["db"]["enabled"] = True
+    try:
+        RunWithTime(
+            FakeRun(session, group, [50.0, 1.0, 1.2, 1.1, 9.0]),
+            warmups=1,
+            repeats=4,
+            outliers="mad",
+            backend="time"
+        )("true")
+    finally:
+        CFG["db"]["enabled"] = False
+
+    summaries = {
+        summary["name"]: summary
+        for summary in db.summarize_run_group(session, group.id)
+    }
+    assert set(summaries) == {"time.real_s", "time.user_s", "time.system_s"}
+    assert summaries["time.real_s"]["count"] == 3
+    assert summaries["time.real_s"]["max"] == 1.2
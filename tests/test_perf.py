@@ -0,0 +1,126 @@
+"""Test folded stacks of perf profiles."""
+import types
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from benchbuild.extensions import base
+from benchbuild.extensions import perf as perf_ext
+from benchbuild.utils import db, perf, schema
+
+PERF_SCRIPT = """\
+my prog 1234/1234 [001] 100.000001:     1001001 cycles:u:
+\t    7f00000010 kernel+0x10 (/opt/prog)
+\t    7f00000020 compute+0x2a (/opt/prog)
+\t    7f00000030 main+0x5 (/opt/prog)
+
+my prog 1234/1234 [001] 100.000002:     1001001 cycles:u:
+\t    7f00000010 kernel+0x14 (/opt/prog)
+\t    7f00000020 compute+0x2a (/opt/prog)
+\t    7f00000030 main+0x5 (/opt/prog)
+
+my prog 1234/1234 [001] 100.000003:     1001001 cycles:u:
+\t    7f00000040 [unknown] (/usr/lib/libc.so.6)
+\t    7f00000030 main+0x5 (/opt/prog)
+"""
+
+
+def test_collapse():
+    stacks = perf.collapse(PERF_SCRIPT.splitlines())
+
+    assert stacks == {
+        "my prog;main;compute;kernel": 2,
+        "my prog;main;[libc.so.6]": 1
+    }
+
+
+def test_folded_roundtrip():
+    stacks = {"a;b": 3, "a;c d": 1}
+    assert perf.parse_folded(perf.format_folded(stacks).splitlines()) == stacks
+
+
+def test_parse_stat():
+    lines = [
+        "# started on Mon Jan  1 00:00:00 2024\n", "\n",
+        "1234,,cycles:u,1000,100.00,,\n",
+        "<not supported>,,branch-misses:u,0,100.00,,\n",
+        "42,msec,task-clock:u,42,100.00,0.9,CPUs utilized\n"
+    ]
+    assert perf.parse_stat(lines) == {
+        "cycles:u": 1234.0,
+        "task-clock:u": 42.0
+    }
+
+
+def test_pack_roundtrip():
+    counts = {perf.stack_id("a;b"): 3, perf.stack_id("a;c"): 2**40}
+    assert perf.unpack(perf.pack(counts)) == counts
+    assert perf.stack_id("a;b") == perf.stack_id("a;b")
+    assert perf.stack_id("a;b") != perf.stack_id("a;c")
+
+
+def test_render():
+    svg = perf.render({"main;compute": 3, "main;io<x>": 1}, title="t")
+
+    assert svg.startswith("<svg")
+    assert "compute (3 samples, 75.00%)" in svg
+    assert "io&lt;x&gt;" in svg
+
+
+def test_render_diff_colors_growth():
+    before = {"main;a": 10, "main;b": 10}
+    after = {"main;a": 30, "main;b": 10}
+    svg = perf.render_diff(before, after)
+
+    grown = svg.split("<title>a (")[1].split("</g>")[0]
+    shrunk = svg.split("<title>b (")[1].split("</g>")[0]
+    assert 'fill="rgb(255,' in grown
+    assert 'fill="rgb(255,' not in shrunk
+
+
+@pytest.fixture
+def session():
+    engine = sa.create_engine("sqlite://")
+    schema.BASE.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db_session:
+        yield db_session
+
+
+def test_persist_shares_stacks(session):
+    first, second = types.SimpleNamespace(id=1), types.SimpleNamespace(id=2)
+    db.persist_folded_stacks(first, session, {"a;b": 3, "a;c": 1}, "cycles")
+    session.flush()
+    db.persist_folded_stacks(second, session, {"a;b": 1}, "cycles")
+    session.flush()
+
+    assert session.query(schema.PerfStack).count() == 2
+    assert db.fetch_folded_stacks(session, [1]) == {"a;b": 3, "a;c": 1}
+    assert db.fetch_folded_stacks(session, [1, 2]) == {"a;b": 4, "a;c": 1}
+    assert db.fetch_folded_stacks(session, [2], event="instructions") == {}
+
+
+class Recorder(base.Extension):
+
+    def __init__(self):
+        super().__init__()
+        self.commands = []
+
+    def __call__(self, binary_command, *args, **kwargs):
+        self.commands.append(binary_command)
+        return [types.SimpleNamespace()]
+
+
+def test_perf_wraps_the_command():
+    recorder = Recorder()
+    ext = perf_ext.RunWithPerf(recorder, mode="stat", events="cycles")
+    ext("binary")
+
+    argv = recorder.commands[0].formulate()
+    assert argv[1:4] == ["stat", "-x,", "-e"]
+    assert argv[-2:] == ["--", "binary"]
+
+
+def test_perf_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        perf_ext.RunWithPerf(mode="trace")
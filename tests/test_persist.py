@@ -0,0 +1,81 @@
+"""Test storing projects and experiments in the database."""
+import types
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.orm import sessionmaker
+
+from benchbuild.utils import db, schema
+
+
+@pytest.fixture
+def engine(tmp_path):
+    db_engine = sa.create_engine(f"sqlite:///{tmp_path / 'bb.db'}")
+    schema.BASE.metadata.create_all(db_engine)
+    yield db_engine
+    db_engine.dispose()
+
+
+@pytest.fixture
+def statements(engine, monkeypatch):
+    """Use a session of the engine and count the statements we execute."""
+    executed = []
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(schema, "Session", lambda: session)
+    monkeypatch.setattr(db, "_PERSISTED", {})
+    sa.event.listen(
+        engine, "before_cursor_execute",
+        lambda *args: executed.append(args[2])
+    )
+    yield executed
+    session.close()
+
+
+def new_project(revision):
+    return types.SimpleNamespace(
+        name="p", group="g", domain="d", revision=revision, src_uri="u"
+    )
+
+
+def test_projects_are_stored_once(engine, statements):
+    db.persist_project(new_project("1"))
+    stored = len(statements)
+    assert db.persist_project(new_project("1")) == (None, None)
+    assert len(statements) == stored
+
+    projects, _ = db.persist_project(new_project("2"))
+    assert projects.one().version == "2"
+    with sessionmaker(bind=engine)() as session:
+        assert session.query(schema.Project.version).all() == [("2",)]
+
+
+def test_experiments_are_stored_once(engine, statements):
+    experiment = types.SimpleNamespace(id=uuid.uuid4(), name="raw")
+    stored, session = db.persist_experiment(experiment)
+    stored.begin = stored.end = sa.func.now()
+    session.commit()
+    count = len(statements)
+
+    again, _ = db.persist_experiment(experiment)
+    assert again is stored
+    assert not [stmt for stmt in statements[count:] if "INSERT" in stmt]
+
+    experiment.name = "renamed"
+    renamed, _ = db.persist_experiment(experiment)
+    assert renamed.name == "renamed"
+    assert renamed.begin is not None
+    with sessionmaker(bind=engine)() as session:
+        assert session.query(schema.Experiment).count() == 1
+
+
+def test_upserts_of_other_dialects():
+    table = schema.Project.__table__
+    assert schema.upsert(table, mysql.dialect(), ["version"]) is None
+
+    stmt = schema.upsert(table, postgresql.dialect(), ["name", "version"])
+    assert str(stmt.compile(dialect=postgresql.dialect())).endswith(
+        "ON CONFLICT (name, group_name) "
+        "DO UPDATE SET version = excluded.version"
+    )
@@ -0,0 +1,92 @@
+"""
+Test the background prefetch of project sources.
+"""
+import typing as tp
+
+import plumbum as pb
+import pytest
+
+from benchbuild.environments.domain.declarative import ContainerImage
+from benchbuild.project import Project
+from benchbuild.settings import CFG
+from benchbuild.source import base, nosource
+from benchbuild.utils import prefetch
+
+
+class MarkerSource(base.FetchableSource):
+    """Fetching creates a marker file in benchbuild's cache."""
+
+    @property
+    def default(self) -> base.Variant:
+        return self.versions()[0]
+
+    def version(self, target_dir: str, version: str) -> pb.LocalPath:
+        return self.fetch()
+
+    def versions(self) -> tp.List[base.Variant]:
+        return [base.Variant(owner=self, version='1')]
+
+    def fetch(self) -> pb.LocalPath:
+        marker = pb.local.path(base.target_prefix()) / self.local
+        marker.write("fetched")
+        return marker
+
+
+class First(Project):
+    NAME = "test_prefetch_first"
+    DOMAIN = "debug"
+    GROUP = "debug"
+    SOURCE = [MarkerSource(local="first", remote="-")]
+    CONTAINER = ContainerImage().from_('benchbuild:alpine')
+
+
+class Second(First):
+    NAME = "test_prefetch_second"
+    SOURCE = [MarkerSource(local="second", remote="-")]
+
+
+class Third(First):
+    NAME = "test_prefetch_third"
+    SOURCE = [MarkerSource(local="third", remote="-")]
+
+
+class Empty(First):
+    NAME = "test_prefetch_empty"
+    SOURCE = [nosource()]
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    old_tmp_dir = CFG["tmp_dir"].value
+    CFG["tmp_dir"] = str(tmp_path)
+    yield tmp_path
+    CFG["tmp_dir"] = old_tmp_dir
+
+
+def test_prefetch_fetches_ahead(tmp_dir):
+    first, second, third = First(), Second(), Third()
+
+    with prefetch.Prefetcher([first, second, third],
+                             lookahead=1) as prefetcher:
+        prefetcher.advance(first)
+
+    assert not (tmp_dir / "first").exists()
+    assert (tmp_dir / "second").exists()
+    assert not (tmp_dir / "third").exists()
+    assert prefetcher.is_fetched(second)
+    assert not prefetcher.is_fetched(third)
+
+
+def test_prefetch_can_be_disabled(tmp_dir):
+    first, second = First(), Second()
+
+    with prefetch.Prefetcher([first, second], lookahead=0) as prefetcher:
+        prefetcher.advance(first)
+
+    assert not (tmp_dir / "second").exists()
+    assert not prefetcher.is_fetched(second)
+
+
+def test_sources_of_skips_nosource():
+    assert not prefetch.sources_of(Empty())
+    assert [v for _, v in prefetch.sources_of(First())] == ['1']
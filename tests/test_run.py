@@ -1,9 +1,15 @@
 """
 This Test will run through benchbuild's execution pipeline.
 """
+import asyncio
+import os
 import unittest
 
-from benchbuild.utils import cmd
+import pytest
+from plumbum import local
+from plumbum.commands import ProcessExecutionError
+
+from benchbuild.utils import cmd, run
 
 
 def shadow_commands(command):
@@ -49,3 +55,93 @@ class TestShadow(unittest.TestCase):
         self.assertEqual(mkdir.formulate(),
                          outside.formulate(),
                          msg="mkdir (before) is not the same as mkdir (after)")
+
+
+def test_watch_async_captures_output(tmp_path):
+    sh = local["sh"].with_env(BB_TEST_VALUE="42").with_cwd(str(tmp_path))
+
+    retcode, stdout, stderr = asyncio.run(
+        run.watch_async(sh)("-c", 'echo "$BB_TEST_VALUE $PWD"; echo err >&2')
+    )
+
+    assert retcode == 0
+    assert stdout == f"42 {tmp_path}\n"
+    assert stderr == "err\n"
+
+
+def test_watch_async_checks_retcode():
+    sh = local["sh"]
+
+    with pytest.raises(ProcessExecutionError):
+        asyncio.run(run.watch_async(sh)("-c", "exit 3"))
+    assert asyncio.run(run.watch_async(sh)("-c", "exit 3", retcode=3))[0] == 3
+    assert asyncio.run(run.watch_async(sh)("-c", "exit 3", retcode=None))[0] == 3
+
+
+def test_watch_async_handles_long_lines():
+    python = local["python3"]
+    script = 'import sys; sys.stdout.write("x" * 200000)'
+
+    results = run.run_concurrently(
+        [lambda: run.watch_async(python)("-c", script)], limit=1
+    )
+
+    assert results[0][1] == "x" * 200000
+
+
+def test_watch_async_kills_the_command_on_errors(tmp_path, monkeypatch):
+    pid_file = tmp_path / "pid"
+
+    async def failing_tee(stream, sink):
+        del stream, sink
+        while not pid_file.exists() or not pid_file.read_text():
+            await asyncio.sleep(0.01)
+        raise RuntimeError("tee failed")
+
+    monkeypatch.setattr(run, "_tee", failing_tee)
+    sh = run.watch_async(local["sh"])
+    with pytest.raises(RuntimeError):
+        asyncio.run(sh("-c", f"echo $$ > {pid_file}; exec sleep 30"))
+
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+
+def test_run_concurrently_respects_limit():
+    running = 0
+    peak = 0
+
+    async def job(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if i == 3:
+            raise ValueError(i)
+        return i
+
+    results = run.run_concurrently([lambda i=i: job(i) for i in range(8)],
+                                   limit=2)
+
+    assert peak == 2
+    assert results[:3] == [0, 1, 2]
+    assert isinstance(results[3], ValueError)
+    assert results[4:] == [4, 5, 6, 7]
+
+
+def test_run_concurrently_waits_for_earlier_jobs():
+    finished = []
+
+    async def job(i):
+        await asyncio.sleep(0.01 * (3 - i))
+        finished.append(i)
+        return i
+
+    results = run.run_concurrently([lambda i=i: job(i) for i in range(3)],
+                                   limit=3,
+                                   after=[[], [], [0]])
+
+    assert results == [0, 1, 2]
+    assert finished.index(2) > finished.index(0)
+    assert finished.index(1) < finished.index(0)
@@ -0,0 +1,74 @@
+"""Test the background resource sampler."""
+import os
+import sys
+import types
+import uuid
+
+from plumbum import local
+
+from benchbuild.extensions import base, resources
+from benchbuild.utils import run, sampler
+
+
+def test_encode_roundtrip():
+    values = [0, 100, 100, 250, -3, 2**40]
+    data = sampler.encode(values)
+
+    assert isinstance(data, bytes)
+    assert sampler.decode(data) == values
+    assert sampler.decode(sampler.encode([])) == []
+
+
+def test_encode_compresses_slow_series():
+    values = list(range(0, 100000, 100))
+    assert len(sampler.encode(values)) < len(values)
+
+
+def test_read_stat_of_ourselves():
+    stat = sampler.read_stat(os.getpid())
+
+    assert stat is not None
+    assert stat.ppid == os.getppid()
+    assert stat.threads >= 1
+    assert stat.rss_pages > 0
+    assert sampler.read_stat(2**22 + 1) is None
+
+
+def test_sampler_follows_the_process_tree():
+    proc = local["sh"].popen(["-c", "sleep 5 & sleep 5; wait"])
+    try:
+        resource_sampler = sampler.ResourceSampler(proc.pid, interval=0.01)
+        resource_sampler.start()
+        while len(resource_sampler.series["time"]) < 5:
+            resource_sampler._stop.wait(0.01)  # pylint: disable=protected-access
+        assert len(sampler.process_tree(proc.pid)) == 3
+    finally:
+        proc.kill()
+        proc.wait()
+    series = resource_sampler.stop()
+
+    assert set(series) == set(sampler.UNITS)
+    assert len({len(values) for values in series.values()}) == 1
+    assert series["time"] == sorted(series["time"])
+    assert max(series["rss"]) > 0
+    assert max(series["threads"]) >= 3
+
+
+class TrackedRun(base.Extension):
+
+    def __call__(self, binary_command, *args, **kwargs):
+        project = types.SimpleNamespace(run_uuid=uuid.uuid4())
+        with run.track_execution(binary_command, project, None) as run_info:
+            run_info()
+        return [run_info]
+
+
+def test_sample_resources_attaches_series(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", [str(tmp_path / "sleep")])
+    ext = resources.SampleResources(TrackedRun(), interval=0.01)
+    run_infos = ext(local["sleep"]["0.1"])
+
+    series = run_infos[0].payload["resources"]
+    assert len(series["time"]) >= 2
+    assert series["time"][0] < series["time"][-1]
+    assert not run._WATCHERS.get()  # pylint: disable=protected-access
@@ -0,0 +1,127 @@
+"""Test spooling to SQLite and merging spools into the database."""
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from benchbuild.settings import CFG
+from benchbuild.utils import schema, spool
+
+
+@pytest.fixture
+def target(tmp_path):
+    db_engine = sa.create_engine(f"sqlite:///{tmp_path / 'bb.db'}")
+    schema.BASE.metadata.create_all(db_engine)
+    yield db_engine
+    db_engine.dispose()
+
+
+@pytest.fixture
+def unreachable(tmp_path, monkeypatch):
+    names = ("spool", "rollback", "spool_on_failure", "connect_string")
+    old_values = {name: CFG["db"][name].value for name in names}
+    monkeypatch.setenv("BB_DB_SPOOL", "")
+    CFG["db"]["spool"] = None
+    CFG["db"]["rollback"] = False
+    CFG["db"]["spool_on_failure"] = True
+    CFG["db"]["connect_string"] = \
+        f"sqlite:///{tmp_path / 'missing' / 'bb.db'}"
+    monkeypatch.setattr(
+        spool, "default_path", lambda: str(tmp_path / "bb.sqlite")
+    )
+    yield tmp_path / "bb.sqlite"
+    for name, value in old_values.items():
+        CFG["db"][name] = value
+
+
+def spool_runs(path, experiment, count):
+    engine = spool.create_engine(str(path))
+    schema.BASE.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        session.merge(schema.Experiment(id=experiment, name="raw"))
+        session.merge(schema.Project(name="p", group_name="g"))
+        run_group = uuid.uuid4()
+        session.add(schema.RunGroup(id=run_group, experiment=experiment))
+        for i in range(count):
+            run = schema.Run(
+                command="true",
+                project_name="p",
+                project_group="g",
+                experiment_group=experiment,
+                run_group=run_group,
+                status="completed"
+            )
+            session.add(run)
+            session.flush()
+            session.add(schema.Metric(name="time", value=i, run_id=run.id))
+        session.commit()
+    engine.dispose()
+
+
+def test_spools_use_wal(tmp_path):
+    engine = spool.create_engine(str(tmp_path / "spool" / "bb.sqlite"))
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() \
+            == "wal"
+    engine.dispose()
+
+
+def test_sync_remaps_runs(tmp_path, target):
+    experiment = uuid.uuid4()
+    spool_runs(tmp_path / "node1.sqlite", experiment, 2)
+    spool_runs(tmp_path / "node2.sqlite", experiment, 3)
+
+    spool.sync(str(tmp_path / "node1.sqlite"), target)
+    counts = spool.sync(str(tmp_path / "node2.sqlite"), target, chunk_size=2)
+    assert counts["run"] == 3
+    assert counts["metrics"] == 3
+
+    with sessionmaker(bind=target)() as session:
+        assert session.query(schema.Experiment).count() == 1
+        assert session.query(schema.Project).count() == 1
+        assert session.query(schema.RunGroup).count() == 2
+        assert session.query(schema.Run).count() == 5
+        values = sorted(
+            (metric.run_id, metric.value)
+            for metric in session.query(schema.Metric)
+        )
+        assert values == [(1, 0), (2, 1), (3, 0), (4, 1), (5, 2)]
+
+
+def test_sync_skips_rows_of_unknown_runs(tmp_path, target):
+    engine = spool.create_engine(str(tmp_path / "node.sqlite"))
+    schema.BASE.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            schema.Metric.__table__.insert(), {
+                "name": "time",
+                "value": 1.0,
+                "run_id": 42
+            }
+        )
+    engine.dispose()
+
+    assert spool.sync(str(tmp_path / "node.sqlite"), target)["metrics"] == 1
+    with sessionmaker(bind=target)() as session:
+        assert session.query(schema.Metric).count() == 0
+
+
+def test_missing_spool(tmp_path, target):
+    with pytest.raises(FileNotFoundError):
+        spool.sync(str(tmp_path / "none.sqlite"), target)
+
+
+def test_unreachable_databases_are_spooled(unreachable):
+    manager = schema.SessionManager()
+    assert CFG["db"]["spool"].value == str(unreachable)
+    assert manager.engine.url.database == str(unreachable)
+    manager.connection.close()
+    manager.engine.dispose()
+
+
+def test_spooling_can_be_disabled(unreachable):
+    CFG["db"]["spool_on_failure"] = False
+    with pytest.raises(SystemExit):
+        schema.SessionManager()
+    assert not unreachable.exists()
@@ -0,0 +1,173 @@
+"""
+Test the adaptive repetitions of the Statistics extension.
+"""
+import itertools
+import types
+
+import pytest
+from plumbum import local
+
+from benchbuild import statistics as stats
+from benchbuild.utils import run
+
+
+@pytest.mark.parametrize(
+    "p, dof, expected", [
+        (0.975, 1, 12.706),
+        (0.975, 2, 4.303),
+        (0.975, 4, 2.776),
+        (0.975, 9, 2.262),
+        (0.995, 29, 2.756),
+        (0.025, 9, -2.262),
+    ]
+)
+def test_t_quantile(p, dof, expected):
+    assert stats.t_quantile(p, dof) == pytest.approx(expected, abs=2e-3)
+
+
+@pytest.mark.parametrize(
+    "p, dof, expected", [
+        (0.975, 3, 3.182446),
+        (0.995, 3, 5.840909),
+        (0.005, 4, -4.604095),
+        (0.9995, 10, 4.586894),
+    ]
+)
+def test_t_quantile_of_few_degrees_of_freedom(p, dof, expected):
+    assert stats.t_quantile(p, dof) == pytest.approx(expected, abs=1e-6)
+
+
+def test_confidence_interval():
+    mean, half_width = stats.confidence_interval([1.0, 2.0, 3.0], 0.95)
+
+    assert mean == pytest.approx(2.0)
+    assert half_width == pytest.approx(2.484, abs=1e-3)
+
+
+def test_relative_width_of_constant_samples():
+    assert stats.relative_width([5.0, 5.0, 5.0], 0.95) == 0.0
+    assert stats.relative_width([5.0], 0.95) == float("inf")
+
+
+def test_parse_metrics():
+    stderr = "noise\n" + stats.TIME_TAG + "1.5 1.25 2048\n"
+
+    assert stats.parse_metrics(stderr) == {
+        "wall": 1.5,
+        "user": 1.25,
+        "maxrss": 2048.0
+    }
+    assert stats.parse_metrics("noise") is None
+
+
+def make_statistics(**kwargs):
+    settings = {
+        "metric": "wall",
+        "confidence": 0.95,
+        "rel_width": 0.05,
+        "min_repeats": 3,
+        "max_repeats": 20,
+        "budget": 0,
+        "backend": "rusage"
+    }
+    settings.update(kwargs)
+    return stats.Statistics(None, None, **settings)
+
+
+def test_stable_runs_stop_early():
+    ext = make_statistics()
+
+    samples = ext.sample(lambda: 1.0)
+
+    assert len(samples) == 3
+
+
+def test_noisy_runs_repeat_until_max():
+    ext = make_statistics(max_repeats=7)
+    values = itertools.cycle([1.0, 10.0])
+
+    samples = ext.sample(lambda: next(values))
+
+    assert len(samples) == 7
+
+
+def test_missing_measurement_stops():
+    ext = make_statistics()
+
+    assert ext.sample(lambda: None) == []
+
+
+def test_unknown_metric():
+    with pytest.raises(ValueError):
+        make_statistics(metric="cycles")
+
+
+def fake_run_info(wall: float, maxrss: int):
+    return types.SimpleNamespace(
+        stderr=f"{stats.TIME_TAG}{wall} 1.0 {maxrss}\n",
+        rusage=run.ResourceUsage(wall, 1.0, 0.0, maxrss, 0, 0, 0, 0, 0, 0),
+        add_payload=lambda *args: None
+    )
+
+
+@pytest.mark.parametrize("backend", ["rusage", "time"])
+@pytest.mark.parametrize("metric, expected", [("wall", 3.0),
+                                              ("maxrss", 2048.0)])
+def test_runs_of_a_repetition_are_aggregated(backend, metric, expected):
+    ext = make_statistics(metric=metric, max_repeats=1, backend=backend)
+    commands = []
+    samples = []
+    ext.sample = lambda measure: samples.append(measure()) or samples
+    ext.call_next = lambda cmd, *args, **kwargs: commands.append(cmd) or [
+        fake_run_info(1.5, 1024), fake_run_info(1.5, 2048)
+    ]
+
+    true = local["true"]
+    ext(true)
+
+    assert samples == [expected]
+    assert (commands[0] is true) == (backend == "rusage")
+
+
+def test_missing_resource_usage():
+    ext = make_statistics(max_repeats=1)
+    samples = []
+    ext.sample = lambda measure: samples.append(measure()) or samples
+    ext.call_next = lambda *args, **kwargs: [
+        types.SimpleNamespace(rusage=None, add_payload=lambda *args: None)
+    ]
+
+    ext(local["true"])
+
+    assert samples == [None]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        make_statistics(backend="perf")
+
+
+def test_outliers_mad():
+    samples = [1.0, 1.1, 0.9, 1.0, 5.0]
+
+    assert stats.outliers(samples, "mad") == [False] * 4 + [True]
+    assert stats.outliers(samples, "none") == [False] * 5
+
+
+def test_outliers_iqr():
+    samples = [10.0, 11.0, 10.5, 10.2, 10.8, 30.0]
+
+    assert stats.outliers(samples, "iqr") == [False] * 5 + [True]
+
+
+def test_outliers_unknown_method():
+    with pytest.raises(ValueError):
+        stats.outliers([1.0, 2.0, 3.0], "zscore")
+
+
+def test_robust_summary():
+    summary = stats.robust_summary(list(range(1, 11)) + [100])
+
+    assert summary["median"] == 6.0
+    assert summary["trimmed_mean"] == pytest.approx(6.0)
+    assert summary["mad"] == 3.0
@@ -0,0 +1,322 @@
+"""
+Test the plan executor of the tasks module.
+"""
+import itertools
+import typing as tp
+
+import pytest
+
+from benchbuild.environments.domain.declarative import ContainerImage
+from benchbuild.experiment import Experiment
+from benchbuild.project import Project
+from benchbuild.source import nosource
+from benchbuild.utils import actions as a
+from benchbuild.utils import requirements as reqs
+from benchbuild.utils import tasks
+
+
+class EmptyProject(Project):
+    NAME = "test_empty"
+    DOMAIN = "debug"
+    GROUP = "debug"
+    SOURCE = [nosource()]
+    CONTAINER = ContainerImage().from_('benchbuild:alpine')
+
+
+class EmptyExperiment(Experiment):
+    NAME = "test_tasks"
+
+    def actions_for_project(self,
+                            project: Project) -> tp.MutableSequence[a.Step]:
+        return []
+
+
+class FailAlways(a.ProjectStep):
+    NAME = "FAIL ALWAYS"
+    DESCRIPTION = "A Step that guarantees to fail."
+
+    def __call__(self) -> a.StepResult:
+        return a.StepResult.ERROR
+
+
+class PassAlways(a.ProjectStep):
+    NAME = "PASS ALWAYS"
+    DESCRIPTION = "A Step that guarantees to succeed."
+
+    def __call__(self) -> a.StepResult:
+        return a.StepResult.OK
+
+
+class RaiseAlways(a.ProjectStep):
+    NAME = "RAISE ALWAYS"
+    DESCRIPTION = "A Step that raises an unexpected exception."
+
+    def __call__(self) -> a.StepResult:
+        raise RuntimeError("unexpected")
+
+
+def make_plan(*chains: tp.List[a.Step]) -> tp.List[a.Step]:
+    exp = EmptyExperiment(projects=[EmptyProject])
+    actions: tp.List[a.Step] = [a.RequireAll(actions=c) for c in chains]
+    actions.append(a.CleanExtra())
+    return [a.Experiment(exp, actions=actions)]
+
+
+def test_clean_extra_requires_all_chains():
+    prj = EmptyProject()
+    plan = make_plan([PassAlways(prj)], [PassAlways(prj)])
+    nodes = tasks.plan_graph(plan)
+
+    chains = [n for n in nodes if isinstance(n.step, a.RequireAll)]
+    barrier = [n for n in nodes if isinstance(n.step, a.CleanExtra)][0]
+
+    assert len(nodes) == 5
+    assert all(not chain.requires for chain in chains)
+    assert set(chains) <= barrier.requires
+
+
+def test_closing_echo_requires_barrier():
+    prj = EmptyProject()
+    plan = make_plan([PassAlways(prj)])
+    nodes = tasks.plan_graph(plan)
+
+    barrier = [n for n in nodes if isinstance(n.step, a.CleanExtra)][0]
+    assert barrier in nodes[-1].requires
+    assert nodes[-1].requires == set(nodes[:-1])
+
+
+def test_barrier_spans_experiments():
+    prj = EmptyProject()
+    plan = make_plan([PassAlways(prj)]) + make_plan([PassAlways(prj)])
+    nodes = tasks.plan_graph(plan)
+
+    chains = [n for n in nodes if isinstance(n.step, a.RequireAll)]
+    barriers = [n for n in nodes if isinstance(n.step, a.CleanExtra)]
+
+    assert len(barriers) == 2
+    for barrier in barriers:
+        assert set(chains) <= barrier.requires
+
+
+def test_plain_steps_are_sequential():
+    prj = EmptyProject()
+    first, second = PassAlways(prj), PassAlways(prj)
+    nodes = tasks.plan_graph([first, second])
+
+    assert nodes[1].requires == {nodes[0]}
+
+
+def test_stream_plan_runs_barrier_last():
+    prj = EmptyProject()
+    plan = make_plan([PassAlways(prj)], [PassAlways(prj)])
+
+    steps = [step for step, _ in tasks.stream_plan(plan, num_processes=1)]
+
+    assert isinstance(steps[-2], a.CleanExtra)
+    assert isinstance(steps[-1], a.Echo)
+    assert plan[0].status == a.StepResult.OK
+
+
+def test_execute_plan_reports_failed_chains():
+    prj = EmptyProject()
+    plan = make_plan([PassAlways(prj)], [FailAlways(prj)], [RaiseAlways(prj)])
+
+    failed = tasks.execute_plan(plan)
+
+    assert failed == [a.StepResult.ERROR, a.StepResult.ERROR]
+    assert plan[0].status == a.StepResult.ERROR
+
+
+@pytest.mark.parametrize("num_processes", [1, 2])
+def test_stream_plan_executes_every_node(num_processes):
+    prj = EmptyProject()
+    plan = make_plan(*[[PassAlways(prj)] for _ in range(4)])
+
+    results = list(tasks.stream_plan(plan, num_processes=num_processes))
+
+    assert len(results) == 7
+    assert all(result == a.StepResult.OK for _, result in results)
+
+
+class HungryProject(EmptyProject):
+    NAME = "test_hungry"
+    REQUIREMENTS = [reqs.SlurmCoresPerSocket(4), reqs.SlurmMem("2G")]
+
+
+class ExclusiveProject(EmptyProject):
+    NAME = "test_exclusive"
+    REQUIREMENTS = [reqs.SlurmExclusive()]
+
+
+def test_resources_of_reads_project_requirements():
+    plan = make_plan([PassAlways(HungryProject())],
+                     [PassAlways(EmptyProject())])
+    nodes = tasks.plan_graph(plan)
+
+    hungry, empty = [n for n in nodes if isinstance(n.step, a.RequireAll)]
+    assert tasks.resources_of(hungry) == tasks.Resources(4, 2 * 1024**3)
+    assert tasks.resources_of(empty) == tasks.Resources(1, 0)
+    assert tasks.resources_of(nodes[0]) == tasks.Resources()
+
+
+def test_budget_clamps_large_demands():
+    budget = tasks.ResourceBudget(cores=2, memory=1024)
+    demand = tasks.Resources(cores=8, memory=4096)
+
+    assert budget.fits(demand)
+    budget.acquire(demand)
+    assert not budget.fits(tasks.Resources(cores=1))
+    budget.release(demand)
+    assert budget.fits(tasks.Resources(cores=1))
+
+
+def test_budget_runs_exclusive_alone():
+    budget = tasks.ResourceBudget(cores=8, memory=1024)
+    exclusive = tasks.Resources(cores=1, exclusive=True)
+
+    budget.acquire(tasks.Resources(cores=1))
+    assert not budget.fits(exclusive)
+    budget.release(tasks.Resources(cores=1))
+
+    budget.acquire(exclusive)
+    assert not budget.fits(tasks.Resources())
+
+
+def test_stream_plan_respects_budget():
+    plan = make_plan(*[[PassAlways(HungryProject())] for _ in range(3)],
+                     [PassAlways(ExclusiveProject())])
+    budget = tasks.ResourceBudget(cores=4, memory=4 * 1024**3)
+
+    results = list(tasks.stream_plan(plan, num_processes=2, budget=budget))
+
+    assert len(results) == 7
+    assert budget.running == 0
+    assert budget.used_cores == 0
+
+
+def make_lazy_plan(chains: tp.Iterable[tp.List[a.Step]]) -> tp.List[a.Step]:
+    exp = EmptyExperiment(projects=[EmptyProject])
+    actions = (a.RequireAll(actions=c) for c in chains)
+    return [
+        a.Experiment(exp, actions=itertools.chain(actions, [a.CleanExtra()]))
+    ]
+
+
+def test_lazy_plan_pulls_on_demand():
+    prj = EmptyProject()
+    pulled = []
+
+    def chains():
+        for i in range(20):
+            pulled.append(i)
+            yield [PassAlways(prj)]
+
+    results = tasks.stream_plan(make_lazy_plan(chains()), num_processes=1)
+    next(results)
+    assert len(pulled) < 20
+
+    steps = [step for step, _ in results]
+    assert len(pulled) == 20
+    assert isinstance(steps[-2], a.CleanExtra)
+    assert isinstance(steps[-1], a.Echo)
+
+
+def test_lazy_plan_respects_fences():
+    prj = EmptyProject()
+    fence = PassAlways(prj)
+    plan = make_lazy_plan([[PassAlways(prj)] for _ in range(3)])
+    plan += [fence] + make_lazy_plan([[PassAlways(prj)] for _ in range(3)])
+
+    steps = [step for step, _ in tasks.stream_plan(plan, num_processes=2)]
+
+    assert len(steps) == 13
+    assert steps.index(fence) == 6
+
+
+def test_lazy_plan_estimates_num_actions():
+    eager = tasks.generate_plan([EmptyExperiment], [EmptyProject])
+    lazy = tasks.generate_plan([EmptyExperiment], [EmptyProject], lazy=True)
+
+    assert all(action.is_lazy for action in lazy)
+    assert tasks.estimate_num_actions(lazy) == sum(len(e) for e in eager)
+
+
+class OtherExperiment(EmptyExperiment):
+    NAME = "test_tasks_other"
+
+
+class RecordWorkload:
+
+    def __init__(self, name: str, log: tp.List[tp.Tuple[str, str]]) -> None:
+        self.name = name
+        self.log = log
+
+    def __call__(self) -> None:
+        from benchbuild.settings import CFG
+        self.log.append((str(CFG["interleave"]["variant"]), self.name))
+
+    def __str__(self) -> str:
+        return self.name
+
+
+def make_variant(
+    exp: Experiment, log: tp.List[tp.Tuple[str, str]], *names: str
+) -> a.RunWorkloads:
+    prj = EmptyProject()
+    variant = a.RunWorkloads(prj, exp)
+    variant.actions = [
+        a.RunWorkload(prj, RecordWorkload(name, log)) for name in names
+    ]
+    return variant
+
+
+def test_interleave_workloads_moves_runs_and_cleans():
+    log: tp.List[tp.Tuple[str, str]] = []
+    exp = EmptyExperiment(projects=[EmptyProject])
+    plan = [
+        a.Experiment(
+            exp,
+            actions=[
+                a.RequireAll(
+                    actions=[PassAlways(v.project), v,
+                             a.Clean(v.project)]
+                )
+            ]
+        ) for v in (make_variant(exp, log, "w"), make_variant(exp, log, "w"))
+    ]
+
+    assert tasks.interleave_workloads(plan) == 1
+
+    chains = list(tasks._steps_of(plan[:2], a.RequireAll))
+    assert all(len(chain.actions) == 1 for chain in chains)
+    assert isinstance(plan[2], a.InterleavedWorkloads)
+    assert len(plan[2].actions) == 2
+    assert all(isinstance(step, a.Clean) for step in plan[3].actions)
+
+
+@pytest.mark.parametrize("order", ["alternate", "random"])
+def test_interleaved_workloads_take_turns(order):
+    log: tp.List[tp.Tuple[str, str]] = []
+    first = make_variant(
+        EmptyExperiment(projects=[EmptyProject]), log, "x", "y"
+    )
+    second = make_variant(
+        OtherExperiment(projects=[EmptyProject]), log, "x", "y"
+    )
+    step = a.InterleavedWorkloads([first, second],
+                                  rounds=3,
+                                  order=order,
+                                  seed=1,
+                                  core=-1)
+
+    assert step() == a.StepResult.OK
+
+    labels = [step.label(first), step.label(second)]
+    assert labels[0] != labels[1]
+    assert len(log) == 12
+    for block in range(6):
+        pair = log[2 * block:2 * block + 2]
+        assert {variant for variant, _ in pair} == set(labels)
+        assert pair[0][1] == pair[1][1]
+    if order == "alternate":
+        assert [variant for variant, _ in log] == labels * 6
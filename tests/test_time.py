@@ -0,0 +1,135 @@
+"""
+Test repeated timing in the RunWithTime extension.
+"""
+import subprocess
+import sys
+import typing as tp
+
+import pytest
+from plumbum import local
+from plumbum.commands import ProcessExecutionError
+
+from benchbuild.extensions import base
+from benchbuild.extensions.time import RunWithTime
+from benchbuild.utils import run
+
+
+class FakeRunInfo:
+
+    def __init__(self, stderr: str) -> None:
+        self.stderr = stderr
+        self.payload: tp.Dict[str, tp.Any] = {}
+
+    def add_payload(self, name: str, payload: tp.Any) -> None:
+        self.payload[name] = payload
+
+
+class FakeRun(base.Extension):
+
+    def __init__(self, real_times: tp.List[float]) -> None:
+        super().__init__()
+        self.real_times = iter(real_times)
+
+    def __call__(self, *args, **kwargs):
+        real = next(self.real_times)
+        return [FakeRunInfo(f"BENCHBUILD: 0.5-0.1-{real}\n")]
+
+
+def test_warmups_are_discarded():
+    fake = FakeRun([9.0, 1.0, 1.1, 0.9, 1.0, 5.0])
+    ext = RunWithTime(
+        fake, warmups=1, repeats=5, outliers="mad", backend="time"
+    )
+
+    res = ext("true")
+
+    assert len(res) == 5
+    summary = res[-1].payload["time"]
+    assert summary["time.outliers"] == 1
+    assert summary["time.real_s"]["median"] == 1.0
+    assert summary["time.user_s"]["median"] == 0.5
+
+
+def test_single_run_has_no_summary():
+    ext = RunWithTime(FakeRun([1.0]), warmups=0, repeats=1, backend="time")
+
+    res = ext("true")
+
+    assert len(res) == 1
+    assert not res[0].payload
+
+
+def test_tee_rusage_measures_the_child():
+    sh = local["sh"]
+
+    retcode, stdout, stderr, usage = run.tee_rusage(
+        sh["-c", "echo out; echo err >&2; i=0; "
+           "while [ $i -lt 20000 ]; do i=$((i+1)); done"]
+    )
+
+    assert (retcode, str(stdout), str(stderr)) == (0, "out\n", "err\n")
+    assert usage.real_s > 0
+    assert usage.user_s + usage.system_s > 0
+    assert usage.maxrss_kb > 0
+    assert set(usage.as_metrics()) >= {
+        "time.user_s", "time.system_s", "time.real_s", "rusage.maxrss_kb",
+        "rusage.minflt", "rusage.majflt", "rusage.nvcsw", "rusage.nivcsw",
+        "rusage.inblock", "rusage.oublock"
+    }
+
+
+def test_tee_rusage_checks_retcode():
+    with pytest.raises(ProcessExecutionError):
+        run.tee_rusage(local["false"])
+    assert run.tee_rusage(local["false"], retcode=None)[0] == 1
+
+
+def test_tee_rusage_passes_stdin_on():
+    script = (
+        "from plumbum import local\n"
+        "from benchbuild.utils import run\n"
+        "run.tee_rusage(local['cat'])\n"
+    )
+
+    proc = subprocess.run([sys.executable, "-c", script],
+                          input=b"hello\n",
+                          capture_output=True,
+                          timeout=60,
+                          check=True)
+
+    assert proc.stdout.endswith(b"hello\n")
+
+
+class FakeRusageRun(base.Extension):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.commands: tp.List[tp.Any] = []
+
+    def __call__(self, binary_command, *args, **kwargs):
+        self.commands.append(binary_command)
+        run_info = FakeRunInfo("")
+        run_info.rusage = run.ResourceUsage(
+            real_s=1.0,
+            user_s=0.75,
+            system_s=0.25,
+            maxrss_kb=1024,
+            minflt=1,
+            majflt=0,
+            nvcsw=2,
+            nivcsw=3,
+            inblock=0,
+            oublock=8
+        )
+        return [run_info]
+
+
+def test_rusage_backend_does_not_wrap():
+    fake = FakeRusageRun()
+    ext = RunWithTime(fake, repeats=3, backend="rusage")
+
+    res = ext(local["true"])
+
+    assert len(res) == 3
+    assert all(str(cmd) == str(local["true"]) for cmd in fake.commands)
+    assert res[-1].payload["time"]["time.user_s"]["median"] == 0.75
@@ -0,0 +1,137 @@
+"""Test the write-behind queue for the database."""
+import datetime
+import os
+import signal
+import threading
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from benchbuild import signals
+from benchbuild.utils import db, schema, writer
+
+
+@pytest.fixture
+def engine(tmp_path):
+    db_engine = sa.create_engine(f"sqlite:///{tmp_path / 'bb.db'}")
+    schema.BASE.metadata.create_all(db_engine)
+    yield db_engine
+    db_engine.dispose()
+
+
+@pytest.fixture
+def run(engine):
+    with sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        db_run = schema.Run(
+            command="true",
+            status="running",
+            run_group=uuid.uuid4(),
+            experiment_group=uuid.uuid4()
+        )
+        session.add(db_run)
+        session.commit()
+        session.expunge(db_run)
+    return db_run
+
+
+def count(engine, table):
+    with engine.connect() as connection:
+        return connection.execute(
+            sa.select(sa.func.count()).select_from(table)
+        ).scalar()
+
+
+def test_rows_are_written_on_flush(engine, run):
+    batch = writer.BatchWriter(engine, batch_size=10**6, interval=3600)
+    db.persist_time(run, batch, [(1.0, 0.5, 2.0)])
+    batch.add(schema.RunLog(run_id=run.id, status=0, stdout="out"))
+    batch.execute(
+        sa.insert(schema.Config), [{
+            "run_id": run.id,
+            "name": "jobs",
+            "value": "4"
+        }]
+    )
+
+    assert len(batch) == 5
+    assert count(engine, schema.Metric.__table__) == 0
+
+    batch.close()
+    assert count(engine, schema.Metric.__table__) == 3
+    assert count(engine, schema.RunLog.__table__) == 1
+    assert count(engine, schema.Config.__table__) == 1
+
+
+def test_existing_rows_are_updated(engine, run):
+    batch = writer.BatchWriter(engine, batch_size=10**6, interval=3600)
+    run.status = "completed"
+    run.end = datetime.datetime(2024, 1, 1)
+    batch.add(run)
+    batch.close()
+
+    with sessionmaker(bind=engine)() as session:
+        stored = session.get(schema.Run, run.id)
+        assert (stored.status, stored.end, stored.command) == (
+            "completed", datetime.datetime(2024, 1, 1), "true"
+        )
+
+
+def test_full_batch_is_written_in_the_background(engine, run):
+    batch = writer.BatchWriter(engine, batch_size=3, interval=3600)
+    written = threading.Event()
+    flush = batch._flush  # pylint: disable=protected-access
+
+    def flush_and_notify():
+        flush()
+        written.set()
+
+    batch._flush = flush_and_notify  # pylint: disable=protected-access
+    db.persist_time(run, batch, [(1.0, 0.5, 2.0)])
+
+    assert written.wait(10)
+    assert count(engine, schema.Metric.__table__) == 3
+    batch.close()
+
+
+def test_background_errors_surface_on_flush(engine, run):
+    batch = writer.BatchWriter(engine, batch_size=10**6, interval=3600)
+    batch.add(schema.Metric(name="m", value=1.0, run_id=run.id))
+    batch.add(schema.Metric(name="m", value=2.0, run_id=run.id))
+    batch._wake.set()  # pylint: disable=protected-access
+
+    for _ in range(1000):
+        if batch._error is not None:  # pylint: disable=protected-access
+            break
+        threading.Event().wait(0.01)
+    with pytest.raises(sa.exc.IntegrityError):
+        batch.flush()
+    batch.close()
+
+
+def test_in_memory_databases_are_not_threaded():
+    batch = writer.BatchWriter(sa.create_engine("sqlite://"))
+    assert not batch.threaded
+    batch.close()
+
+
+def test_forked_children_start_over(engine, run):
+    batch = writer.BatchWriter(engine, batch_size=10**6, interval=3600)
+    db.persist_time(run, batch, [(1.0, 0.5, 2.0)])
+
+    # pylint: disable=protected-access
+    with batch._write_lock, batch._lock:
+        pid = os.fork()
+        if pid == 0:
+            signal.alarm(10)
+            ok = len(batch) == 0 and batch.flush not in \
+                signals.handlers.stored_procedures
+            batch.flush()
+            batch.close()
+            os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    batch.close()
+    assert count(engine, schema.Metric.__table__) == 3